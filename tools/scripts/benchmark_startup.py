@@ -0,0 +1,67 @@
+#!/usr/bin/env python3.10
+
+
+import os
+import sys
+import statistics
+import subprocess
+
+import click
+
+ROOT = os.path.join(os.path.dirname(__file__), "../../vision_control")
+
+# Imports the services like the first request to a worker does. GitLab is never reached in the background.
+STARTUP = """
+import time
+started = time.perf_counter()
+import django
+django.setup()
+import api.services
+print(time.perf_counter() - started)
+"""
+
+ENVIRONMENT = {
+    "DJANGO_SETTINGS_MODULE": "vision_control.settings.test",
+    "GITLAB_URL": "http://127.0.0.1:9",
+    "GITLAB_ACCESS_TOKEN": "token",
+    "GITLAB_DEFAULT_PROJECT": "1",
+    "GITLAB_SECRET_TOKEN": "benchmark",
+    "GIT_REVISION": "benchmark",
+    "HOOKS_WORKERS": "0",
+}
+
+
+def run(*args):
+    return subprocess.run(
+        [sys.executable, *args, "-c", STARTUP],
+        cwd=ROOT,
+        env=os.environ | ENVIRONMENT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+@click.command()
+@click.option("--repeat", default=5)
+@click.option("--top", default=15, help="Number of slowest imports to list.")
+def main(repeat, top):
+    """Measures how long a worker takes to import the services, and which imports take the longest."""
+    timings = [float(run().stdout.split()[-1]) for _ in range(repeat)]
+    click.echo(
+        f"Startup: {statistics.median(timings) * 1000:.0f} ms (median of {repeat})"
+    )
+
+    # Lines of -X importtime look like "import time: self [us] | cumulative | imported package".
+    imports = []
+    for line in run("-X", "importtime").stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            imports.append((int(fields[1]), fields[2].rstrip()))
+
+    for cumulative, module in sorted(imports, reverse=True)[:top]:
+        click.echo(f"{cumulative / 1000:8.1f} ms {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from hooks.models import Annotation
+
+import itertools
+
+from ..utils import unix_timestamp
+from ..grafana_json_datasource import MetricsQueryInvalidValueError
+
+
+def _values(data, key):
+    """Values of an optional filter, which can be given as a single value or a list."""
+    value = data.get(key)
+    if value is None or value == []:
+        return None
+
+    return value if isinstance(value, list) else [value]
+
+
+class AnnotationsAdapter:
+    """The purpose of this class is to answer annotation queries from the annotations kept by the hooks
+    (see hooks.models.Annotation), without involving GitLab or Grafana's own annotations."""
+
+    def __init__(self, limit: int = 1000):
+        self.limit = limit
+
+    def pipelines(self, data, interval):
+        """Annotations of the pipelines running at some point of interval, filtered by project, ref,
+        status and tags, which may each be a single value or a list."""
+        annotations = Annotation.objects.filter(
+            time__lte=interval.end, time_end__gte=interval.start
+        )
+
+        if projects := _values(data, "project"):
+            try:
+                annotations = annotations.filter(
+                    project_id__in=[int(project) for project in projects]
+                )
+            except (TypeError, ValueError):
+                raise MetricsQueryInvalidValueError("project", data["project"])
+        if refs := _values(data, "ref"):
+            annotations = annotations.filter(ref__in=refs)
+        if statuses := _values(data, "status"):
+            annotations = annotations.filter(status__in=statuses)
+
+        tags = set(_values(data, "tags") or [])
+        limit = data.get("limit", self.limit)
+        if not isinstance(limit, int) or limit < 0:
+            raise MetricsQueryInvalidValueError("limit", limit)
+
+        # Tags are lists in JSON, which are filtered here since not every database can query them.
+        matching = (
+            annotation
+            for annotation in annotations.order_by("-time").iterator()
+            if tags <= set(annotation.tags)
+        )
+
+        return [
+            {
+                "title": f"Pipeline #{annotation.pipeline_id}",
+                "time": unix_timestamp(annotation.time),
+                "timeEnd": unix_timestamp(annotation.time_end),
+                "tags": annotation.tags,
+                "text": annotation.text,
+            }
+            for annotation in itertools.islice(matching, limit)
+        ]
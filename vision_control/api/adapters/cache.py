@@ -0,0 +1,210 @@
+from django.core.cache import caches
+
+import time
+import hashlib
+from datetime import datetime, timezone
+
+
+class RangeCache:
+    """Caches records of a time range in fixed buckets of time.
+
+    A request for an interval is answered from the buckets that cover it. Only buckets missing from the cache
+    are fetched, with one call per run of consecutive missing buckets, and every fetched bucket that lies
+    entirely in the past is stored for later requests. The buckets are then stitched together and trimmed to
+    the requested interval.
+
+    In live tail mode, buckets that are still open are stored as well, together with the time up to which
+    they have been fetched. Later requests only fetch records newer than that high-water mark (minus overlap
+    seconds, to allow for records that show up a little late) and add them to the records already retained.
+    A dashboard refreshing "now" every few seconds then only fetches the last few seconds. This relies on
+    records never appearing with a time before the mark, so it can be turned off for a key, see get.
+
+    Records must have an id, which is used to drop records that appear in more than one bucket (for example
+    a pipeline that was updated again after its first bucket was cached). The newest occurrence is kept.
+
+    Keys can belong to a scope (for example the pipelines of a project), which can be invalidated when
+    something in it changes, see invalidate. Buckets reaching past the change are then fetched again
+    from the time of the change. If every change is reported this way (GitLab webhooks, with hooks
+    enabled), open buckets are no longer fetched again on every request, but only after a change.
+    """
+
+    def __init__(
+        self,
+        bucket: int = 3600,
+        ttl: int = 86400,
+        live_tail: bool = True,
+        overlap: int = 60,
+        cache: str = "default",
+        hooks: bool = False,
+    ):
+        self.bucket = bucket
+        self.ttl = ttl
+        self.live_tail = live_tail
+        self.overlap = overlap
+        self.hooks = hooks
+        self.cache = caches[cache]
+
+    def _digest(self, key):
+        return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def _name(self, key, start):
+        return f"range:{self._digest(key)}:{start}"
+
+    def invalidate(self, scope, since: float = None):
+        """Marks the records of a scope from since (unix time, now if not given) onwards as changed.
+
+        Changes are kept per bucket of since, with the earliest since and the latest time of the changes
+        in it. Buckets fetched after a change are not fetched again for it, so a change long ago does not
+        make later changes refetch everything since then. Changes older than ttl are dropped, since every
+        bucket still cached has been fetched after them."""
+        now = time.time()
+        since = now if since is None else since
+        name = f"range:changed:{self._digest(scope)}"
+
+        changes = {
+            bucket: change
+            for bucket, change in self.cache.get(name, {}).items()
+            if change[1] > now - self.ttl
+        }
+        bucket = int(since) // self.bucket * self.bucket
+        previous, _ = changes.get(bucket, (since, 0))
+        changes[bucket] = (min(previous, since), now)
+        self.cache.set(name, changes, self.ttl)
+
+    def _changes(self, scope):
+        """Returns the changes of a scope, as (since, time of the change) by bucket of since."""
+        if scope is None:
+            return {}
+
+        return self.cache.get(f"range:changed:{self._digest(scope)}", {})
+
+    def _runs(self, buckets):
+        """Groups bucket starts into runs of consecutive buckets."""
+        run = []
+
+        for start in buckets:
+            if run and start != run[-1] + self.bucket:
+                yield run
+                run = []
+
+            run.append(start)
+
+        if run:
+            yield run
+
+    def get(
+        self, key, interval, fetch, timestamp, scope=None, live_tail=None, limit=None
+    ):
+        """Returns the records of key within interval, newest first.
+
+        fetch(start, end) must return the records between two datetimes and timestamp(record) the unix
+        time (in seconds) that a record belongs to. scope is what the key belongs to, see invalidate.
+        live_tail overrides the live tail mode of the cache for this key.
+
+        With a limit, missing buckets are fetched newest first, and older buckets are no longer fetched
+        once the newer ones hold limit records. At least limit records are returned if there are as many.
+        """
+        live_tail = self.live_tail if live_tail is None else live_tail
+        start, end = interval.start.timestamp(), interval.end.timestamp()
+        first = int(start) // self.bucket * self.bucket
+        buckets = list(range(first, int(end) + 1, self.bucket))
+
+        names = {bucket: self._name(key, bucket) for bucket in buckets}
+        cached = self.cache.get_many(names.values())
+        changes = self._changes(scope).values()
+
+        # Every bucket has its records, the time up to which they have been fetched and when that was.
+        state = {
+            bucket: cached.get(names[bucket], ([], bucket, 0)) for bucket in buckets
+        }
+
+        now = time.time()
+        marks = {}
+
+        for bucket in buckets:
+            # States cached before fetch times were kept only have two fields.
+            _, mark, fetched = (*state[bucket], 0)[:3]
+
+            # Changes that reach into the bucket and happened after it was fetched.
+            since = min(
+                (
+                    since
+                    for since, changed in changes
+                    if changed > fetched and since < bucket + self.bucket
+                ),
+                default=None,
+            )
+
+            if names[bucket] not in cached:
+                marks[bucket] = bucket
+            elif since is not None:
+                marks[bucket] = max(min(mark, since), bucket)
+            elif not self.hooks and mark < min(bucket + self.bucket, now):
+                marks[bucket] = mark
+
+        runs = list(self._runs(sorted(marks)))
+        oldest = None
+
+        for run in reversed(runs) if limit is not None else runs:
+            newer = [bucket for bucket in buckets if bucket > run[-1]]
+            if (
+                limit is not None
+                and len(self._stitch(newer, state, start, end, timestamp)) >= limit
+            ):
+                oldest = run[-1] + self.bucket
+                break
+
+            mark = marks[run[0]]
+            if mark > run[0]:
+                mark = max(mark - self.overlap, run[0])
+
+            fetched = {bucket: [] for bucket in run}
+
+            for record in fetch(
+                datetime.fromtimestamp(mark, tz=timezone.utc),
+                datetime.fromtimestamp(run[-1] + self.bucket, tz=timezone.utc),
+            ):
+                bucket = int(timestamp(record)) // self.bucket * self.bucket
+                if bucket in fetched:
+                    fetched[bucket].append(record)
+
+            for bucket, records in fetched.items():
+                ids = {record.id for record in records}
+                retained = [
+                    record for record in state[bucket][0] if record.id not in ids
+                ]
+                state[bucket] = (
+                    records + retained,
+                    min(bucket + self.bucket, now),
+                    now,
+                )
+
+            self.cache.set_many(
+                {
+                    names[bucket]: state[bucket]
+                    for bucket in run
+                    if live_tail or bucket + self.bucket <= now
+                },
+                self.ttl,
+            )
+
+        if oldest is not None:
+            buckets = [bucket for bucket in buckets if bucket >= oldest]
+
+        return self._stitch(buckets, state, start, end, timestamp)
+
+    def _stitch(self, buckets, state, start, end, timestamp):
+        """Joins the records of buckets within start and end, newest first and without duplicates."""
+        result = []
+        seen = set()
+
+        for bucket in reversed(buckets):
+            for record in state[bucket][0]:
+                if record.id in seen:
+                    continue
+
+                seen.add(record.id)
+                if start <= timestamp(record) <= end:
+                    result.append(record)
+
+        return result
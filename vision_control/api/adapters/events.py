@@ -0,0 +1,173 @@
+from django.utils import timezone
+
+import logging
+from datetime import date
+
+log = logging.getLogger(__name__)
+
+from .. import models
+from ..utils import parse_hook_datetime
+
+
+class GitLabEvents:
+    """Keeps cached and mirrored GitLab data up to date from webhooks (see hooks.signals.gitlab_event).
+
+    Every kind of event has a handler, named after its object_kind. Handlers invalidate what the event
+    makes stale in the RangeCache and IdentityMap, and update the mirror in place for projects that are
+    mirrored, so that changes show up within seconds of happening.
+    """
+
+    KINDS = ("push", "tag_push", "pipeline", "issue", "merge_request", "milestone")
+
+    def __init__(self, cache=None, identities=None, mirror=None):
+        self.cache = cache
+        self.identities = identities
+        self.mirror = mirror
+
+    def __call__(self, sender, project_id, data, **kwargs):
+        if not project_id or sender not in self.KINDS:
+            return
+
+        log.debug(f"Handling {sender} event for project #{project_id}.")
+        getattr(self, sender)(project_id, data)
+
+    def _invalidate(self, entity, project_id, since=None):
+        if self.cache:
+            self.cache.invalidate((entity, project_id), since and since.timestamp())
+
+    def _store(self, entity, project_id, model, unique, rows):
+        if self.mirror and self.mirror.synced(project_id, entity):
+            self.mirror.store(model, unique, rows)
+
+    def push(self, project_id, data):
+        commits = [
+            models.Commit(
+                project_id=project_id,
+                sha=commit["id"],
+                time=parse_hook_datetime(commit["timestamp"]),
+                author=commit["author"]["name"],
+                message=commit["message"],
+            )
+            for commit in data.get("commits", [])
+        ]
+
+        # Commits can be pushed long after they were made, so everything since the oldest one is stale.
+        self._invalidate(
+            "commits", project_id, min((c.time for c in commits), default=None)
+        )
+
+        if self.identities:
+            self.identities.forget(("branches", project_id))
+
+        default_branch = (data.get("project") or {}).get("default_branch")
+        if data.get("ref") == f"refs/heads/{default_branch}":
+            self._store("commits", project_id, models.Commit, "sha", commits)
+
+    def tag_push(self, project_id, data):
+        # Tags are neither cached nor mirrored, but a new tag usually comes with new pipelines.
+        self._invalidate("pipelines", project_id)
+
+    def pipeline(self, project_id, data):
+        attributes = data["object_attributes"]
+        self._invalidate("pipelines", project_id)
+
+        web_url = (data.get("project") or {}).get("web_url")
+        self._store(
+            "pipelines",
+            project_id,
+            models.Pipeline,
+            "pipeline_id",
+            [
+                models.Pipeline(
+                    project_id=project_id,
+                    pipeline_id=attributes["id"],
+                    created=parse_hook_datetime(attributes["created_at"]),
+                    updated=timezone.now(),
+                    ref=attributes["ref"],
+                    status=attributes["status"],
+                    sha=attributes["sha"],
+                    # Like GitLabMirror, pipelines without a user get the author of their commit.
+                    user=(data.get("user") or {}).get("name")
+                    or ((data.get("commit") or {}).get("author") or {}).get("name"),
+                    url=f"{web_url}/-/pipelines/{attributes['id']}",
+                )
+            ],
+        )
+
+    def issue(self, project_id, data):
+        attributes = data["object_attributes"]
+        updated = parse_hook_datetime(attributes["updated_at"])
+        self._invalidate("issues", project_id, updated)
+
+        self._store(
+            "issues",
+            project_id,
+            models.Issue,
+            "issue_id",
+            [
+                models.Issue(
+                    project_id=project_id,
+                    issue_id=attributes["id"],
+                    title=attributes["title"],
+                    labels=[label["title"] for label in data.get("labels", [])],
+                    state=attributes["state"],
+                    updated=updated,
+                )
+            ],
+        )
+
+    def merge_request(self, project_id, data):
+        attributes = data["object_attributes"]
+        updated = parse_hook_datetime(attributes["updated_at"])
+        self._invalidate("merge_requests", project_id, updated)
+
+        # The event only names the user that triggered it, which is the author when it is opened.
+        existing = models.MergeRequest.objects.filter(
+            project_id=project_id, merge_request_id=attributes["id"]
+        ).first()
+        author = existing.author if existing else (data.get("user") or {}).get("name")
+
+        self._store(
+            "merge_requests",
+            project_id,
+            models.MergeRequest,
+            "merge_request_id",
+            [
+                models.MergeRequest(
+                    project_id=project_id,
+                    merge_request_id=attributes["id"],
+                    state=attributes["state"],
+                    source_branch=attributes["source_branch"],
+                    target_branch=attributes["target_branch"],
+                    author=author or "",
+                    created=parse_hook_datetime(attributes["created_at"]),
+                    updated=updated,
+                )
+            ],
+        )
+
+    def milestone(self, project_id, data):
+        attributes = data["object_attributes"]
+        due_date = attributes.get("due_date")
+
+        self._store(
+            "milestones",
+            project_id,
+            models.Milestone,
+            "milestone_id",
+            [
+                models.Milestone(
+                    project_id=project_id,
+                    milestone_id=attributes["id"],
+                    iid=attributes["iid"],
+                    title=attributes["title"],
+                    state=attributes["state"],
+                    description=attributes.get("description"),
+                    start_date=attributes.get("start_date"),
+                    due_date=due_date,
+                    expired=bool(due_date)
+                    and date.fromisoformat(due_date) < date.today(),
+                    updated=parse_hook_datetime(attributes["updated_at"]),
+                )
+            ],
+        )
@@ -1,296 +1,744 @@
 from django.conf import settings
+from django.core.cache import caches
 
+import itertools
+import threading
+import functools
+import contextvars
 from datetime import datetime
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .identity import IdentityMap
+from ..utils import unix_timestamp, parse_datetime
+from ..grafana_json_datasource import (
+    Table,
+    TimeSeries,
+    Aggregation,
+    TableColumn,
+    TableColumnType,
+)
+from ..grafana_json_datasource.exceptions import ProjectDoesNotExistError
 
-import emoji
-import gitlab.exceptions
 
-from ..utils import unix_timestamp
-from ..grafana_json_datasource import Table, TimeSeries, TableColumn, TableColumnType
-from ..grafana_json_datasource.exceptions import ProjectDoesNotExistError
+Commit = namedtuple("Commit", "id time author message")
+Pipeline = namedtuple("Pipeline", "id time updated ref status sha user url")
+Issue = namedtuple("Issue", "id title labels state updated")
+MergeRequest = namedtuple(
+    "MergeRequest", "id state source_branch target_branch author created updated"
+)
+Profile = namedtuple("Profile", "id name username avatar_url public_email active")
+Status = namedtuple("Status", "busy emoji message")
 
 
-class GitLabMetricsAdapter:
-    """The purpose of this class is to interpret Grafana metric queries and return the requested information from Gitlab."""
+def iterate(manager, concurrency: int = 1, **filters):
+    """Iterates over the objects of a GitLab list endpoint, one page at a time.
+
+    Only the pages currently being fetched or consumed are held in memory, so callers should project each
+    object into the few fields they need rather than keep the objects themselves.
+
+    With a concurrency above one, the number of pages is read from the X-Total-Pages header of the first
+    response and up to concurrency of the remaining pages are fetched at the same time, while still being
+    yielded in order. GitLab leaves that header out for lists of more than 10 000 objects, in which case
+    the pages are followed one after another through their Link headers.
+    """
+    objects = manager.list(iterator=True, **filters)
+    total_pages = getattr(objects, "total_pages", None)
+
+    if concurrency <= 1 or not total_pages or total_pages <= 1:
+        yield from objects
+        return
+
+    yield from itertools.islice(objects, objects.per_page)
+
+    pages = iter(range(2, total_pages + 1))
+
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="gitlab-pages"
+    ) as executor:
+        window = deque(
+            executor.submit(manager.list, page=page, **filters)
+            for page in itertools.islice(pages, concurrency)
+        )
+
+        while window:
+            page = window.popleft().result()
+
+            if (following := next(pages, None)) is not None:
+                window.append(executor.submit(manager.list, page=following, **filters))
+
+            yield from page
+
+
+def rows_needed(payload):
+    """Number of rows that the offset and limit of a payload need from the start of the records, or None
+    if all of them are needed."""
+    limit = payload.get("limit")
+    if limit is None or payload.get("sort"):
+        return None
+
+    return (payload.get("offset") or 0) + limit
+
+
+def head(payload, records):
+    """Cuts records to the rows requested by the offset and limit of a payload. Without sorting, the
+    rows that are returned are the first ones, so iterators stop fetching pages from GitLab early."""
+    needed = rows_needed(payload)
+    if needed is None:
+        return records
+
+    return itertools.islice(records, needed)
+
+
+def requested(payload, name):
+    """Whether a payload requests a column, either to be returned or to be sorted by."""
+    columns = payload.get("columns")
+    return (
+        not columns
+        or name in columns
+        or name == (payload.get("sort") or "").lstrip("-")
+    )
+
+
+def table(payload, columns, records) -> Table:
+    """Builds a table from records, given a list of columns and the functions that compute their values.
+
+    Only the columns requested by the payload are computed, and only for the rows it requests (see head).
+    The datasource sorts, selects and cuts the table it receives."""
+    columns = [
+        (column, value) for column, value in columns if requested(payload, column.name)
+    ]
+    records = list(head(payload, records))
+
+    return Table.from_columns(
+        [column for column, _ in columns],
+        [[value(record) for record in records] for _, value in columns],
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def render_emoji(name):
+    """Renders the name of a GitLab status emoji, such as 'coffee', as the emoji itself."""
+    import emoji
+
+    return emoji.emojize(f":{name}:", language="alias") if name else ""
+
+
+class CommitAuthors:
+    """Resolves the author names of commits.
+
+    Commits never change, so an author is kept for as long as the process lives (up to size commits,
+    least recently used first out). Authors that are not known yet are fetched concurrently.
+    """
+
+    def __init__(self, workers: int = 8, size: int = 100000):
+        self.size = size
+        self.authors = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="commit-authors"
+        )
 
-    def __init__(self, gitlab):
+    def resolve(self, project, shas) -> dict:
+        """Returns a dictionary from each sha to the name of the author of its commit, or None for commits
+        that GitLab no longer has."""
+        result = {}
+        missing = []
+
+        with self.lock:
+            for sha in set(shas):
+                if sha in self.authors:
+                    self.authors.move_to_end(sha)
+                    result[sha] = self.authors[sha]
+                else:
+                    missing.append(sha)
+
+        fetched = self.executor.map(functools.partial(self._author, project), missing)
+        fetched = dict(zip(missing, fetched))
+
+        with self.lock:
+            self.authors.update(fetched)
+            while len(self.authors) > self.size:
+                self.authors.popitem(last=False)
+
+        return result | fetched
+
+    def _author(self, project, sha):
+        """Name of the author of a commit, or None if GitLab no longer has the commit."""
+        from gitlab.exceptions import GitlabGetError
+
+        try:
+            return project.commits.get(sha).author_name
+        except GitlabGetError:
+            return None
+
+
+class GitLabUsers:
+    """Looks up the members of a group or project together with their profiles and statuses.
+
+    Profiles and statuses are fetched concurrently and cached separately, profiles for profile_ttl
+    seconds and the faster changing statuses for status_ttl seconds. Member lists are cached as long
+    as profiles.
+    """
+
+    def __init__(
+        self,
+        gitlab,
+        workers: int = 16,
+        profile_ttl: int = 3600,
+        status_ttl: int = 60,
+        cache: str = "default",
+        identities=None,
+    ):
         self.gitlab = gitlab
+        self.identities = identities or IdentityMap()
+        self.profile_ttl = profile_ttl
+        self.status_ttl = status_ttl
+        self.cache = caches[cache]
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="gitlab-users"
+        )
+
+    def members(self, group=None, project=None) -> list:
+        """Returns the ids of all members of a group, or of a project if no group is given."""
+        if group:
+            key, manager = f"users:members:group:{group}", self.gitlab.groups
+        else:
+            key, manager = f"users:members:project:{project}", self.gitlab.projects
+
+        members = self.cache.get(key)
+        if members is None:
+            source = manager.get(group or project, lazy=True)
+            members = [member.id for member in iterate(source.members_all)]
+            self.cache.set(key, members, self.profile_ttl)
+
+        return members
+
+    def _profile(self, user_id):
+        user = self.identities.get(
+            ("user", user_id), lambda: self.gitlab.users.get(user_id)
+        )
+        return Profile(
+            user.id,
+            user.name,
+            user.username,
+            user.avatar_url,
+            user.public_email,
+            user.state == "active",
+        )
+
+    def _status(self, user_id):
+        status = self.gitlab.users.get(user_id, lazy=True).status.get()
+        return Status(status.availability == "busy", status.emoji, status.message)
+
+    def _submit(self, kind, ids, fetch):
+        """Returns the cached values of ids, and futures fetching the ones that are not cached."""
+        cached = self.cache.get_many([f"users:{kind}:{user_id}" for user_id in ids])
+        found = {
+            user_id: cached[f"users:{kind}:{user_id}"]
+            for user_id in ids
+            if f"users:{kind}:{user_id}" in cached
+        }
+        pending = {
+            user_id: self.executor.submit(
+                contextvars.copy_context().run, fetch, user_id
+            )
+            for user_id in ids
+            if user_id not in found
+        }
+
+        return found, pending
+
+    def _wait(self, kind, found, pending, ttl):
+        fetched = {user_id: future.result() for user_id, future in pending.items()}
+        self.cache.set_many(
+            {f"users:{kind}:{user_id}": value for user_id, value in fetched.items()},
+            ttl,
+        )
+
+        return found | fetched
+
+    def get(self, ids):
+        """Returns the profile and status of every user, fetching profiles and statuses concurrently."""
+        profiles = self._submit("profile", ids, self._profile)
+        statuses = self._submit("status", ids, self._status)
+
+        profiles = self._wait("profile", *profiles, self.profile_ttl)
+        statuses = self._wait("status", *statuses, self.status_ttl)
+
+        return [(profiles[user_id], statuses[user_id]) for user_id in ids]
+
+
+class GitLabMetricsAdapter:
+    """The purpose of this class is to interpret Grafana metric queries and return the requested information from Gitlab.
+
+    If a RangeCache is given, commits, pipelines, issues and merge requests are cached in buckets of time so
+    that a changed time range only fetches the part that has not been fetched before.
+
+    Large lists of commits, pipelines, issues and merge requests are fetched page_concurrency pages at a
+    time, see iterate.
+
+    Pipelines are shown with the user that triggered them. When the GitLab API leaves that out, the author
+    of the commit is used instead, resolved through CommitAuthors.
+
+    Projects are looked up through an IdentityMap, so that targets of the same request share them.
+
+    If a GitLabMirror is given, projects that it has synced are answered from the local mirror instead of
+    GitLab. Commits are only mirrored for the default branch, so commits of other branches still come from
+    GitLab.
+    """
+
+    def __init__(
+        self,
+        gitlab,
+        cache=None,
+        authors=None,
+        directory=None,
+        page_concurrency=1,
+        identities=None,
+        mirror=None,
+    ):
+        self.gitlab = gitlab
+        self.page_concurrency = page_concurrency
+        self.cache = cache
+        self.mirror = mirror
+        self.identities = identities or IdentityMap()
+        self.authors = authors or CommitAuthors()
+        self.directory = directory or GitLabUsers(gitlab, identities=self.identities)
+
+    def _project(self, project_id):
+        return self.identities.get(
+            ("project", project_id), lambda: self.gitlab.projects.get(project_id)
+        )
+
+    def _mirrored(self, project_id, entity):
+        return self.mirror is not None and self.mirror.synced(project_id, entity)
+
+    def _range(self, key, interval, fetch, timestamp, live_tail=None, limit=None):
+        """Fetches the records of an interval, through the cache if there is one. Without a cache the
+        records are returned as an iterator, streamed from GitLab as they are consumed. With a cache, older
+        buckets are only fetched until limit records have been found. Keys start with the kind of records
+        and the project, which is the scope that webhooks invalidate."""
+        if self.cache:
+            return self.cache.get(
+                key,
+                interval,
+                fetch,
+                timestamp,
+                scope=key[:2],
+                live_tail=live_tail,
+                limit=limit,
+            )
+
+        return fetch(interval.start, interval.end)
 
     def commits(self, payload, interval):
+        return self.build_commits(self.fetch_commits(payload, interval), payload)
+
+    def fetch_commits(self, payload, interval) -> list:
+        """Fetches the commits of a project and branch. Tables and timeseries of commits are built from the
+        same commits (see build_commits), so that targets showing both can share one fetch."""
+        from gitlab.exceptions import GitlabGetError
+
         project_id = payload.get("project", settings.GITLAB_DEFAULT_PROJECT)
+        branch = payload.get("branch", None)
+        if not branch and self._mirrored(project_id, "commits"):
+            return self.mirror.commits(project_id, interval.start, interval.end)
+
         try:
-            project = self.gitlab.projects.get(project_id)
-        except gitlab.exceptions.GitlabGetError:
+            project = self._project(project_id)
+        except GitlabGetError:
             raise ProjectDoesNotExistError(project_id)
-        branch = payload.get("branch", None)
-        commits = project.commits.list(
-            ref_name=branch, all=True, since=interval.start, until=interval.end
+        return list(
+            self._range(
+                ("commits", project_id, branch),
+                interval,
+                lambda start, end: (
+                    Commit(
+                        commit.id,
+                        unix_timestamp(
+                            datetime.strptime(
+                                commit.committed_date, "%Y-%m-%dT%H:%M:%S.%f%z"
+                            )
+                        ),
+                        commit.author_name,
+                        commit.message,
+                    )
+                    for commit in iterate(
+                        project.commits,
+                        self.page_concurrency,
+                        ref_name=branch,
+                        since=start,
+                        until=end,
+                    )
+                ),
+                lambda commit: commit.time / 1000,
+                # Commits are listed by the date they were committed, which can be long before they were
+                # pushed, so the open bucket is fetched in full on every request.
+                live_tail=False,
+            )
         )
+
+    def build_commits(self, commits, payload, _=None):
         timeseries = payload.get("timeseries", False)
 
         if timeseries:
             return self._commits_timeseries(commits)
         else:
-            return self._commits_table(commits)
+            return self._commits_table(commits, payload)
 
-    def _commits_table(self, commits) -> Table:
-        return Table(
-            [
-                TableColumn("Time", TableColumnType.TIME),
-                TableColumn("Author", TableColumnType.STRING),
-                TableColumn("Message", TableColumnType.STRING),
-            ],
+    def _commits_table(self, commits, payload) -> Table:
+        return table(
+            payload,
             [
-                [
-                    unix_timestamp(
-                        datetime.strptime(
-                            commit.committed_date, "%Y-%m-%dT%H:%M:%S.%f%z"
-                        )
-                    ),
-                    commit.author_name,
-                    commit.message,
-                ]
-                for commit in commits
+                (TableColumn("Time", TableColumnType.TIME), lambda c: c.time),
+                (TableColumn("Author", TableColumnType.STRING), lambda c: c.author),
+                (TableColumn("Message", TableColumnType.STRING), lambda c: c.message),
             ],
+            commits,
         )
 
     def _commits_timeseries(self, commits) -> TimeSeries:
-        return TimeSeries(
-            [
-                [
-                    1,
-                    unix_timestamp(
-                        datetime.strptime(
-                            commit.committed_date, "%Y-%m-%dT%H:%M:%S.%f%z"
-                        )
-                    ),
-                ]
-                for commit in commits
-            ]
-        )
+        return TimeSeries([[1, commit.time] for commit in commits], Aggregation.SUM)
 
-    def users(self, *_):
-        # FIXME: Replace with a full query for all users.
-        # users = self.gitlab.users.list()
-        # We used LiU:s Gitlab while developing this and the query took to long to be able to list all users.
-        users = [
-            self.gitlab.users.get(1806),
-            self.gitlab.users.get(1872),
-            self.gitlab.users.get(1826),
-            self.gitlab.users.get(1902),
-            self.gitlab.users.get(2033),
-            self.gitlab.users.get(2011),
-            self.gitlab.users.get(1876),
-        ]
+    def users(self, payload, _=None):
+        """Lists the members of a group or project with their status. The group or project is taken from the
+        payload, or from GITLAB_USERS_GROUP and GITLAB_DEFAULT_PROJECT when the payload has neither."""
+        group = payload.get(
+            "group", None if "project" in payload else settings.GITLAB_USERS_GROUP
+        )
+        project = payload.get("project", settings.GITLAB_DEFAULT_PROJECT)
+        members = list(
+            head(payload, self.directory.members(group=group, project=project))
+        )
+        users = self.directory.get(members)
 
-        result = Table(
+        return table(
+            payload,
             [
-                TableColumn("id", TableColumnType.NUMERIC),
-                TableColumn("name", TableColumnType.STRING),
-                TableColumn("username", TableColumnType.STRING),
-                TableColumn("avatar_url", TableColumnType.STRING),
-                TableColumn("public_email", TableColumnType.STRING),
-                TableColumn("active", TableColumnType.BOOLEAN),
-                TableColumn("busy", TableColumnType.BOOLEAN),
-                TableColumn("status_emoji", TableColumnType.STRING),
-                TableColumn("status_message", TableColumnType.STRING),
+                (TableColumn("id", TableColumnType.NUMERIC), lambda u: u[0].id),
+                (TableColumn("name", TableColumnType.STRING), lambda u: u[0].name),
+                (
+                    TableColumn("username", TableColumnType.STRING),
+                    lambda u: u[0].username,
+                ),
+                (
+                    TableColumn("avatar_url", TableColumnType.STRING),
+                    lambda u: u[0].avatar_url,
+                ),
+                (
+                    TableColumn("public_email", TableColumnType.STRING),
+                    lambda u: u[0].public_email,
+                ),
+                (TableColumn("active", TableColumnType.BOOLEAN), lambda u: u[0].active),
+                (TableColumn("busy", TableColumnType.BOOLEAN), lambda u: u[1].busy),
+                (
+                    TableColumn("status_emoji", TableColumnType.STRING),
+                    lambda u: render_emoji(u[1].emoji),
+                ),
+                (
+                    TableColumn("status_message", TableColumnType.STRING),
+                    lambda u: u[1].message,
+                ),
             ],
-            [],
+            users,
         )
 
-        for user in users:
-            status = user.status.get()
-
-            if status.emoji:
-                status_emoji = (emoji.emojize(f":{status.emoji}:", language="alias"),)
-            else:
-                status_emoji = ""
-
-            result.rows.append(
-                [
-                    user.id,
-                    user.name,
-                    user.username,
-                    user.avatar_url,
-                    user.public_email,
-                    user.state == "active",
-                    status.availability == "busy",
-                    status_emoji,
-                    status.message,
-                ]
-            )
-
-        return result
-
     def pipelines(self, payload, interval):
-        project_id = payload.get("project", settings.GITLAB_DEFAULT_PROJECT)
+        from gitlab.exceptions import GitlabGetError
 
-        try:
-            project = self.gitlab.projects.get(project_id)
-        except gitlab.exceptions.GitlabGetError:
-            raise ProjectDoesNotExistError(project_id)
+        project_id = payload.get("project", settings.GITLAB_DEFAULT_PROJECT)
         branch = payload.get("branch", None)
-        pipelines = project.pipelines.list(
-            all=True,
-            updated_after=interval.start,
-            updated_before=interval.end,
-            ref=branch,
-        )
+        mirrored = self._mirrored(project_id, "pipelines")
 
-        return Table(
-            [
-                TableColumn("Time", TableColumnType.TIME),
-                TableColumn("Ref name", TableColumnType.STRING),
-                TableColumn("Status", TableColumnType.STRING),
-                TableColumn("ID", TableColumnType.NUMERIC),
-                TableColumn("Triggered by", TableColumnType.STRING),
-                TableColumn("URL", TableColumnType.STRING),
-            ],
+        if mirrored:
+            project = self.gitlab.projects.get(project_id, lazy=True)
+            records = self.mirror.pipelines(
+                project_id, branch, interval.start, interval.end
+            )
+        else:
+            try:
+                project = self._project(project_id)
+            except GitlabGetError:
+                raise ProjectDoesNotExistError(project_id)
+
+            records = self._range(
+                ("pipelines", project_id, branch),
+                interval,
+                lambda start, end: (
+                    Pipeline(
+                        pipeline.id,
+                        unix_timestamp(
+                            datetime.strptime(
+                                pipeline.created_at, "%Y-%m-%dT%H:%M:%S.%f%z"
+                            )
+                        ),
+                        pipeline.updated_at,
+                        pipeline.ref,
+                        pipeline.status,
+                        pipeline.sha,
+                        (getattr(pipeline, "user", None) or {}).get("name"),
+                        pipeline.web_url,
+                    )
+                    for pipeline in iterate(
+                        project.pipelines,
+                        self.page_concurrency,
+                        updated_after=start,
+                        updated_before=end,
+                        ref=branch,
+                    )
+                ),
+                lambda pipeline: parse_datetime(pipeline.updated).timestamp(),
+                limit=rows_needed(payload),
+            )
+
+        pipelines = list(head(payload, records))
+
+        # Mirrored pipelines already have the commit author as user when they have no user of their own.
+        authors = {}
+        if requested(payload, "Triggered by") and not mirrored:
+            authors = self.authors.resolve(
+                project, [pipeline.sha for pipeline in pipelines if not pipeline.user]
+            )
+
+        return table(
+            payload,
             [
-                [
-                    unix_timestamp(
-                        datetime.strptime(pipeline.created_at, "%Y-%m-%dT%H:%M:%S.%f%z")
-                    ),
-                    pipeline.ref,
-                    pipeline.status,
-                    pipeline.id,
-                    project.commits.get(pipeline.sha).author_name,
-                    pipeline.web_url,
-                ]
-                for pipeline in pipelines
+                (TableColumn("Time", TableColumnType.TIME), lambda p: p.time),
+                (TableColumn("Ref name", TableColumnType.STRING), lambda p: p.ref),
+                (TableColumn("Status", TableColumnType.STRING), lambda p: p.status),
+                (TableColumn("ID", TableColumnType.NUMERIC), lambda p: p.id),
+                (
+                    TableColumn("Triggered by", TableColumnType.STRING),
+                    lambda p: p.user or authors.get(p.sha),
+                ),
+                (TableColumn("URL", TableColumnType.STRING), lambda p: p.url),
             ],
+            pipelines,
         )
 
     def issues(self, payload, interval):
         project_id = payload.get("project", settings.GITLAB_DEFAULT_PROJECT)
-        project = self.gitlab.projects.get(project_id)
         state = payload.get("state")
         labels = payload.get("labels", [])
         all = payload.get("all", False)
 
-        issues = project.issues.list(
-            all=True,
-            labels=labels,
-            state=state,
-            updated_after=None if all else interval.start,
-            updated_before=None if all else interval.end,
-        )
+        if self._mirrored(project_id, "issues"):
+            issues = self.mirror.issues(
+                project_id,
+                state,
+                labels,
+                *(() if all else (interval.start, interval.end)),
+            )
+            return self._issues_table(issues, payload)
+
+        project = self._project(project_id)
+
+        def fetch(start, end, **filters):
+            return (
+                Issue(
+                    issue.id, issue.title, issue.labels, issue.state, issue.updated_at
+                )
+                for issue in iterate(
+                    project.issues,
+                    self.page_concurrency,
+                    updated_after=start,
+                    updated_before=end,
+                    **filters,
+                )
+            )
 
-        return Table(
-            [
-                TableColumn("ID", TableColumnType.NUMERIC),
-                TableColumn("title", TableColumnType.STRING),
-                TableColumn("labels", TableColumnType.STRING),
-                TableColumn("state", TableColumnType.STRING),
-                TableColumn("updated_at", TableColumnType.TIME),
-            ],
+        if all or not self.cache:
+            issues = fetch(
+                *((None, None) if all else (interval.start, interval.end)),
+                labels=labels,
+                state=state,
+            )
+        else:
+            # Issues change state and labels, which would leave them behind in the buckets of a filtered
+            # key. So every issue is cached, and the filters are applied afterwards.
+            issues = (
+                issue
+                for issue in self._range(
+                    ("issues", project_id),
+                    interval,
+                    fetch,
+                    lambda issue: parse_datetime(issue.updated).timestamp(),
+                )
+                if (not state or state == "all" or issue.state == state)
+                and set(labels) <= set(issue.labels)
+            )
+
+        return self._issues_table(issues, payload)
+
+    def _issues_table(self, issues, payload) -> Table:
+        return table(
+            payload,
             [
-                [issue.id, issue.title, issue.labels, issue.state, issue.updated_at]
-                for issue in issues
+                (TableColumn("ID", TableColumnType.NUMERIC), lambda i: i.id),
+                (TableColumn("title", TableColumnType.STRING), lambda i: i.title),
+                (TableColumn("labels", TableColumnType.STRING), lambda i: i.labels),
+                (TableColumn("state", TableColumnType.STRING), lambda i: i.state),
+                (TableColumn("updated_at", TableColumnType.TIME), lambda i: i.updated),
             ],
+            issues,
         )
 
     def merge_requests(self, payload, interval):
         project_id = payload.get("project", settings.GITLAB_DEFAULT_PROJECT)
         merge_request_status = payload.get("status", "all")
         branch = payload.get("branch", "main")
-        project = self.gitlab.projects.get(project_id)
-        merge_requests = project.mergerequests.list(
-            state=merge_request_status,
-            ref=branch,
-            updated_after=interval.start,
-            updated_before=interval.end,
-            all=True,
-        )
 
-        return Table(
-            [
-                TableColumn("Status", TableColumnType.STRING),
-                TableColumn("Source branch", TableColumnType.STRING),
-                TableColumn("Target branch", TableColumnType.STRING),
-                TableColumn("Author", TableColumnType.STRING),
-                TableColumn("Created at", TableColumnType.TIME),
-            ],
-            [
-                [
+        if self._mirrored(project_id, "merge_requests"):
+            merge_requests = self.mirror.merge_requests(
+                project_id, merge_request_status, interval.start, interval.end
+            )
+            return self._merge_requests_table(merge_requests, payload)
+
+        project = self._project(project_id)
+
+        def fetch(start, end, **filters):
+            return (
+                MergeRequest(
+                    merge_request.id,
                     merge_request.state,
                     merge_request.source_branch,
                     merge_request.target_branch,
                     merge_request.author["name"],
                     merge_request.created_at,
-                ]
-                for merge_request in merge_requests
+                    merge_request.updated_at,
+                )
+                for merge_request in iterate(
+                    project.mergerequests,
+                    self.page_concurrency,
+                    ref=branch,
+                    updated_after=start,
+                    updated_before=end,
+                    **filters,
+                )
+            )
+
+        if not self.cache:
+            merge_requests = fetch(
+                interval.start, interval.end, state=merge_request_status
+            )
+        else:
+            # Like issues, merge requests change state, so all of them are cached and filtered afterwards.
+            merge_requests = (
+                merge_request
+                for merge_request in self._range(
+                    ("merge_requests", project_id, branch),
+                    interval,
+                    fetch,
+                    lambda merge_request: parse_datetime(
+                        merge_request.updated
+                    ).timestamp(),
+                )
+                if merge_request_status in (None, "all")
+                or merge_request.state == merge_request_status
+            )
+
+        return self._merge_requests_table(merge_requests, payload)
+
+    def _merge_requests_table(self, merge_requests, payload) -> Table:
+        return table(
+            payload,
+            [
+                (TableColumn("Status", TableColumnType.STRING), lambda m: m.state),
+                (
+                    TableColumn("Source branch", TableColumnType.STRING),
+                    lambda m: m.source_branch,
+                ),
+                (
+                    TableColumn("Target branch", TableColumnType.STRING),
+                    lambda m: m.target_branch,
+                ),
+                (TableColumn("Author", TableColumnType.STRING), lambda m: m.author),
+                (TableColumn("Created at", TableColumnType.TIME), lambda m: m.created),
             ],
+            merge_requests,
         )
 
     def milestones(self, payload, _=None):
         """Extracts the milestones from a given project. Can be filtered by state, but otherwise gets all milestones for a project."""
         project_id = payload.get("project", settings.GITLAB_DEFAULT_PROJECT)
-        project = self.gitlab.projects.get(project_id)
 
         milestone_state = payload.get("state", None)
         if milestone_state == "All":
             milestone_state = None
 
-        milestone_list = project.milestones.list(
-            state=milestone_state,
-        )
+        if self._mirrored(project_id, "milestones"):
+            milestone_list = self.mirror.milestones(project_id, milestone_state)
+        else:
+            project = self._project(project_id)
+            milestone_list = iterate(project.milestones, state=milestone_state)
 
-        return Table(
+        return table(
+            payload,
             [
-                TableColumn("Title", TableColumnType.STRING),
-                TableColumn("ID", TableColumnType.NUMERIC),
-                TableColumn("Status", TableColumnType.STRING),
-                TableColumn("Description", TableColumnType.STRING),
-                TableColumn("Start date", TableColumnType.TIME),
-                TableColumn("Due date", TableColumnType.TIME),
-                TableColumn("Expired", TableColumnType.BOOLEAN),
-            ],
-            [
-                [
-                    milestone.title,
-                    milestone.iid,
-                    milestone.state,
-                    milestone.description,
-                    milestone.start_date,
-                    milestone.due_date,
-                    milestone.expired,
-                ]
-                for milestone in milestone_list
+                (TableColumn("Title", TableColumnType.STRING), lambda m: m.title),
+                (TableColumn("ID", TableColumnType.NUMERIC), lambda m: m.iid),
+                (TableColumn("Status", TableColumnType.STRING), lambda m: m.state),
+                (
+                    TableColumn("Description", TableColumnType.STRING),
+                    lambda m: m.description,
+                ),
+                (
+                    TableColumn("Start date", TableColumnType.TIME),
+                    lambda m: m.start_date,
+                ),
+                (TableColumn("Due date", TableColumnType.TIME), lambda m: m.due_date),
+                (TableColumn("Expired", TableColumnType.BOOLEAN), lambda m: m.expired),
             ],
+            milestone_list,
         )
 
 
 class GitLabVariablesAdapter:
-    def __init__(self, gitlab):
+    """Lists the options of Grafana variables. Projects and branches are looked up through an
+    IdentityMap, see GitLabMetricsAdapter."""
+
+    def __init__(self, gitlab, identities=None):
         self.gitlab = gitlab
+        self.identities = identities or IdentityMap()
+
+    def _project(self, project_id):
+        return self.identities.get(
+            ("project", project_id), lambda: self.gitlab.projects.get(project_id)
+        )
 
     def projects(self, _=None):
         projects = [
-            self.gitlab.projects.get(project_id)
-            for project_id in settings.GITLAB_PROJECT_IDS
+            self._project(project_id) for project_id in settings.GITLAB_PROJECT_IDS
         ]
 
         return {project.name: project.id for project in projects}
 
     def labels(self, data):
+        from gitlab.exceptions import GitlabGetError
+
         project_id = data.get("project", settings.GITLAB_DEFAULT_PROJECT)
 
         try:
-            project = self.gitlab.projects.get(project_id)
-        except gitlab.exceptions.GitlabGetError:
+            project = self._project(project_id)
+        except GitlabGetError:
             raise ProjectDoesNotExistError(project_id)
 
-        labels = project.labels.list()
+        labels = iterate(project.labels)
         return {label.name: label.name for label in labels}
 
     def branches(self, data):
+        from gitlab.exceptions import GitlabGetError
+
         project_id = data.get("project", settings.GITLAB_DEFAULT_PROJECT)
 
         try:
-            project = self.gitlab.projects.get(project_id)
-        except gitlab.exceptions.GitlabGetError:
+            project = self._project(project_id)
+        except GitlabGetError:
             raise ProjectDoesNotExistError(project_id)
 
-        branches = project.branches.list()
-        return {branch.name: branch.name for branch in branches}
+        branches = self.identities.get(
+            ("branches", project_id),
+            lambda: [branch.name for branch in iterate(project.branches)],
+        )
+        return {branch: branch for branch in branches}
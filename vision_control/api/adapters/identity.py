@@ -0,0 +1,74 @@
+import time
+import threading
+import contextlib
+from contextvars import ContextVar
+
+from ..grafana_json_datasource.coalescing import SingleFlight
+
+# Objects fetched during the current request, or None outside of a request.
+current = ContextVar("identities", default=None)
+
+
+class IdentityMap:
+    """Makes sure that each GitLab object (a project, the branches of a project, a user) is fetched at
+    most once per request, however many targets of the request use it.
+
+    Objects are remembered for the duration of a request, see request. Threads that work on a request must
+    run in a copy of its context, which the datasource does for every target. With a ttl, objects are also
+    shared between requests for ttl seconds.
+
+    Concurrent fetches of the same object are collapsed into one, see SingleFlight.
+    """
+
+    def __init__(self, ttl: int = 0):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.shared = {}
+        self.coalescer = SingleFlight()
+
+    @contextlib.contextmanager
+    def request(self):
+        """Remembers the objects fetched within the block, and forgets them afterwards."""
+        token = current.set({})
+        try:
+            yield
+        finally:
+            current.reset(token)
+
+    def _shared(self, key):
+        with self.lock:
+            expires, value = self.shared.get(key, (0, None))
+            if expires > time.monotonic():
+                return True, value
+
+        return False, None
+
+    def _share(self, key, value):
+        now = time.monotonic()
+        with self.lock:
+            self.shared = {
+                key: entry for key, entry in self.shared.items() if entry[0] > now
+            }
+            self.shared[key] = (now + self.ttl, value)
+
+    def forget(self, key):
+        """Forgets an object shared between requests, so that the next request fetches it again."""
+        with self.lock:
+            self.shared.pop(key, None)
+
+    def get(self, key, fetch):
+        """Returns the object of key, calling fetch() to fetch it if it is not known yet."""
+        objects = current.get()
+        if objects is not None and key in objects:
+            return objects[key]
+
+        found, value = self._shared(key) if self.ttl else (False, None)
+        if not found:
+            value = self.coalescer.do(key, fetch)
+            if self.ttl:
+                self._share(key, value)
+
+        if objects is not None:
+            objects[key] = value
+
+        return value
@@ -0,0 +1,286 @@
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+import logging
+from datetime import timedelta
+
+log = logging.getLogger(__name__)
+
+from .. import models
+from ..utils import unix_timestamp, parse_datetime
+from .gitlab import Issue, Commit, Pipeline, MergeRequest, CommitAuthors, iterate
+
+
+class GitLabMirror:
+    """Local mirror of the commits, pipelines, issues, merge requests and milestones of GitLab projects.
+
+    sync copies everything that changed in a project since the last sync into the models in api/models.py.
+    A high-water mark (SyncState) is kept per project and kind of entity, and only what was updated after
+    it (minus overlap seconds, for updates that show up late) is fetched again. Commits are mirrored for
+    the default branch of a project.
+
+    Commits have no update time, and GitLab lists them by the date they were committed, which can be long
+    before they were pushed (rebases, cherry-picks, commits pushed later). So the commits of the last
+    commit_window seconds are listed on every sync. Commits pushed even later than that are only mirrored
+    from push hooks (see GitLabEvents).
+
+    Pipelines that have no user (for example scheduled ones) are mirrored with the author of their commit
+    as user instead, so that answering them never needs GitLab. Authors are taken from the mirrored commits
+    when possible, and looked up with authors otherwise.
+
+    The other methods answer from the local tables with the same records as GitLabMetricsAdapter fetches
+    from GitLab, so the adapter can use them in place of GitLab once a project has been synced.
+    """
+
+    ENTITIES = ("commits", "pipelines", "issues", "merge_requests", "milestones")
+
+    def __init__(
+        self,
+        gitlab=None,
+        page_concurrency: int = 1,
+        overlap: int = 60,
+        commit_window: int = 86400,
+        authors=None,
+    ):
+        self.gitlab = gitlab
+        self.page_concurrency = page_concurrency
+        self.overlap = overlap
+        self.commit_window = commit_window
+        self.authors = authors or CommitAuthors()
+
+    def sync(self, project_id):
+        """Brings the mirror of a project up to date."""
+        project = self.gitlab.projects.get(project_id, lazy=True)
+
+        for entity in self.ENTITIES:
+            state, _ = models.SyncState.objects.get_or_create(
+                project_id=project_id, entity=entity
+            )
+            after = state.updated_after and state.updated_after - timedelta(
+                seconds=self.overlap
+            )
+            if after and entity == "commits":
+                after = min(
+                    after, timezone.now() - timedelta(seconds=self.commit_window)
+                )
+
+            model, unique, rows = getattr(self, f"_fetch_{entity}")(
+                project_id, project, after
+            )
+
+            with transaction.atomic():
+                self.store(model, unique, rows)
+
+                if rows:
+                    mark = max(
+                        row.time if entity == "commits" else row.updated for row in rows
+                    )
+                    state.updated_after = max(mark, state.updated_after or mark)
+
+                state.synced_at = timezone.now()
+                state.save()
+
+            log.debug(
+                f"Mirrored {len(rows)} {entity} of project #{project_id}, updated up to {state.updated_after}."
+            )
+
+    def store(self, model, unique, rows):
+        """Inserts rows into the mirror, or updates them if they are already mirrored. unique is the field
+        that identifies a row within a project."""
+        model.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["project_id", unique],
+            update_fields=[
+                field.name
+                for field in model._meta.concrete_fields
+                if field.name not in ("id", "project_id", unique)
+            ],
+        )
+
+    def _fetch_commits(self, project_id, project, after):
+        rows = [
+            models.Commit(
+                project_id=project_id,
+                sha=commit.id,
+                time=parse_datetime(commit.committed_date),
+                author=commit.author_name,
+                message=commit.message,
+            )
+            for commit in iterate(project.commits, self.page_concurrency, since=after)
+        ]
+        return models.Commit, "sha", rows
+
+    def _fetch_pipelines(self, project_id, project, after):
+        rows = [
+            models.Pipeline(
+                project_id=project_id,
+                pipeline_id=pipeline.id,
+                created=parse_datetime(pipeline.created_at),
+                updated=parse_datetime(pipeline.updated_at),
+                ref=pipeline.ref,
+                status=pipeline.status,
+                sha=pipeline.sha,
+                user=(getattr(pipeline, "user", None) or {}).get("name"),
+                url=pipeline.web_url,
+            )
+            for pipeline in iterate(
+                project.pipelines, self.page_concurrency, updated_after=after
+            )
+        ]
+
+        shas = {row.sha for row in rows if not row.user}
+        authors = dict(
+            models.Commit.objects.filter(
+                project_id=project_id, sha__in=shas
+            ).values_list("sha", "author")
+        )
+        authors |= self.authors.resolve(project, shas - authors.keys())
+        for row in rows:
+            row.user = row.user or authors[row.sha]
+
+        return models.Pipeline, "pipeline_id", rows
+
+    def _fetch_issues(self, project_id, project, after):
+        rows = [
+            models.Issue(
+                project_id=project_id,
+                issue_id=issue.id,
+                title=issue.title,
+                labels=issue.labels,
+                state=issue.state,
+                updated=parse_datetime(issue.updated_at),
+            )
+            for issue in iterate(
+                project.issues, self.page_concurrency, updated_after=after
+            )
+        ]
+        return models.Issue, "issue_id", rows
+
+    def _fetch_merge_requests(self, project_id, project, after):
+        rows = [
+            models.MergeRequest(
+                project_id=project_id,
+                merge_request_id=merge_request.id,
+                state=merge_request.state,
+                source_branch=merge_request.source_branch,
+                target_branch=merge_request.target_branch,
+                author=merge_request.author["name"],
+                created=parse_datetime(merge_request.created_at),
+                updated=parse_datetime(merge_request.updated_at),
+            )
+            for merge_request in iterate(
+                project.mergerequests,
+                self.page_concurrency,
+                updated_after=after,
+            )
+        ]
+        return models.MergeRequest, "merge_request_id", rows
+
+    def _fetch_milestones(self, project_id, project, after):
+        rows = [
+            models.Milestone(
+                project_id=project_id,
+                milestone_id=milestone.id,
+                iid=milestone.iid,
+                title=milestone.title,
+                state=milestone.state,
+                description=milestone.description,
+                start_date=milestone.start_date,
+                due_date=milestone.due_date,
+                expired=milestone.expired,
+                updated=parse_datetime(milestone.updated_at),
+            )
+            for milestone in iterate(
+                project.milestones, self.page_concurrency, updated_after=after
+            )
+        ]
+        return models.Milestone, "milestone_id", rows
+
+    def synced(self, project_id, entity) -> bool:
+        """Whether an entity of a project has been mirrored, so that it can be answered locally."""
+        return models.SyncState.objects.filter(
+            project_id=project_id, entity=entity, synced_at__isnull=False
+        ).exists()
+
+    def commits(self, project_id, start, end) -> list:
+        return [
+            Commit(
+                commit.sha, unix_timestamp(commit.time), commit.author, commit.message
+            )
+            for commit in models.Commit.objects.filter(
+                project_id=project_id, time__range=(start, end)
+            ).order_by("-time")
+        ]
+
+    def pipelines(self, project_id, branch, start, end) -> list:
+        """Pipelines of a project updated between start and end. Pipelines mirrored without a user get the
+        author of their commit, if it is mirrored."""
+        pipelines = models.Pipeline.objects.filter(
+            project_id=project_id, updated__range=(start, end)
+        ).annotate(
+            author=Subquery(
+                models.Commit.objects.filter(
+                    project_id=OuterRef("project_id"), sha=OuterRef("sha")
+                ).values("author")[:1]
+            )
+        )
+        if branch:
+            pipelines = pipelines.filter(ref=branch)
+
+        return [
+            Pipeline(
+                pipeline.pipeline_id,
+                unix_timestamp(pipeline.created),
+                pipeline.updated,
+                pipeline.ref,
+                pipeline.status,
+                pipeline.sha,
+                pipeline.user or pipeline.author,
+                pipeline.url,
+            )
+            for pipeline in pipelines.order_by("-updated")
+        ]
+
+    def issues(self, project_id, state, labels, start=None, end=None) -> list:
+        """Issues of a project with all of the given labels, updated between start and end if given."""
+        issues = models.Issue.objects.filter(project_id=project_id)
+        if state and state != "all":
+            issues = issues.filter(state=state)
+        if start and end:
+            issues = issues.filter(updated__range=(start, end))
+
+        return [
+            Issue(issue.issue_id, issue.title, issue.labels, issue.state, issue.updated)
+            for issue in issues.order_by("-updated")
+            if set(labels) <= set(issue.labels)
+        ]
+
+    def merge_requests(self, project_id, state, start, end) -> list:
+        merge_requests = models.MergeRequest.objects.filter(
+            project_id=project_id, updated__range=(start, end)
+        )
+        if state and state != "all":
+            merge_requests = merge_requests.filter(state=state)
+
+        return [
+            MergeRequest(
+                merge_request.merge_request_id,
+                merge_request.state,
+                merge_request.source_branch,
+                merge_request.target_branch,
+                merge_request.author,
+                merge_request.created,
+                merge_request.updated,
+            )
+            for merge_request in merge_requests.order_by("-updated")
+        ]
+
+    def milestones(self, project_id, state) -> list:
+        milestones = models.Milestone.objects.filter(project_id=project_id)
+        if state:
+            milestones = milestones.filter(state=state)
+
+        return list(milestones.order_by("-milestone_id"))
@@ -6,11 +6,51 @@ from ..grafana_json_datasource import Table, TableColumn, TableColumnType
 class VisionControlMetricsAdapter:
     """The purpose of this class is to expose Grafana metrics related to the middleware."""
 
-    def __init__(self):
-        pass
+    def __init__(self, datasource=None, hook_queue=None, grafana=None):
+        self.datasource = datasource
+        self.hook_queue = hook_queue
+        self.grafana_client = grafana
 
     def version(self, *_):
         return Table(
             [TableColumn("version", TableColumnType.STRING)],
             [[settings.GIT_REVISION]],
         )
+
+    def coalescing(self, *_):
+        """Number of callback calls made by the datasource and how many identical calls were collapsed into them."""
+        coalescer = self.datasource.coalescer
+
+        return Table(
+            [
+                TableColumn("Calls", TableColumnType.NUMERIC),
+                TableColumn("Collapsed", TableColumnType.NUMERIC),
+            ],
+            [[coalescer.calls, coalescer.collapsed]],
+        )
+
+    def hooks(self, *_):
+        """Number of queued webhook events, age in seconds of the oldest one and number of events given up on."""
+        stats = self.hook_queue.stats()
+
+        return Table(
+            [
+                TableColumn("Queued", TableColumnType.NUMERIC),
+                TableColumn("Age", TableColumnType.NUMERIC),
+                TableColumn("Failed", TableColumnType.NUMERIC),
+            ],
+            [[stats["depth"], stats["age"], stats["failed"]]],
+        )
+
+    def grafana(self, *_):
+        """Number of requests made to each endpoint of Grafana, how many failed and their latency."""
+        return Table(
+            [
+                TableColumn("Endpoint", TableColumnType.STRING),
+                TableColumn("Calls", TableColumnType.NUMERIC),
+                TableColumn("Errors", TableColumnType.NUMERIC),
+                TableColumn("Mean (ms)", TableColumnType.NUMERIC),
+                TableColumn("Max (ms)", TableColumnType.NUMERIC),
+            ],
+            self.grafana_client.stats(),
+        )
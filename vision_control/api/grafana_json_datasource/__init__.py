@@ -1,3 +1,4 @@
 from .types import *
 from .datasource import *
 from .exceptions import *
+from .encoder import *
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into a single call.
+
+    The first caller of a key runs the function while every caller arriving before it has
+    finished waits for, and receives, the same result. Once the call has finished the key is
+    forgotten, so nothing is cached beyond the lifetime of the call itself.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    def _join(self, key):
+        """Returns the future for a key and whether the caller is the one who must resolve it."""
+        with self.lock:
+            if future := self.flights.get(key):
+                self.collapsed += 1
+                return future, False
+
+            future = self.flights[key] = Future()
+            self.calls += 1
+            return future, True
+
+    def _leave(self, key):
+        with self.lock:
+            del self.flights[key]
+
+    def do(self, key, function, *args):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(function(*args))
+        except BaseException as err:
+            future.set_exception(err)
+        finally:
+            self._leave(key)
+
+        return future.result()
+
+    async def ado(self, key, function, *args):
+        """Asynchronous version of do, where function is a coroutine function."""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            future.set_result(await function(*args))
+        except BaseException as err:
+            future.set_exception(err)
+        finally:
+            self._leave(key)
+
+        return future.result()
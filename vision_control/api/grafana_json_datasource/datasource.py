@@ -1,11 +1,18 @@
 import json
+import math
+import asyncio
+import inspect
 import logging
-from datetime import datetime
+import functools
+import contextvars
+from datetime import datetime, timedelta
 from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 
 log = logging.getLogger(__name__)
 
-from .types import Table, TimeSeries
+from .types import Table, Metric, TimeSeries, TableColumnType
+from .coalescing import SingleFlight
 from ..utils import maybe_pluralize
 from .exceptions import (
     PayloadInvalidError,
@@ -21,6 +28,23 @@ from .exceptions import (
 )
 
 
+# Names of the field types of Grafana data frames.
+FIELD_TYPES = {
+    TableColumnType.BOOLEAN: "boolean",
+    TableColumnType.JSON: "other",
+    TableColumnType.NUMERIC: "number",
+    TableColumnType.STRING: "string",
+    TableColumnType.TIME: "time",
+}
+
+FORMATS = ("legacy", "frames")
+
+Interval = namedtuple("interval", "start end")
+
+# Most buckets a timeseries is resampled into when the query does not set maxDataPoints.
+MAX_DATA_POINTS = 11000
+
+
 class GrafanaJSONDatasource:
     """The purpose of this class is to serve as a layer that handles the data
     from a HTTP request. It contains two predefined dictionaries with metrics and variables.
@@ -38,12 +62,30 @@ class GrafanaJSONDatasource:
     what is a tag? : A tag is a search value.
 
     The major functions of this class mirrors the naming scheme of the endpoints required by the Grafana JSON Datasource plugin.
+
+    A scope can be given a pool of workers when its metrics are added. Targets belonging to such a scope
+    are then run concurrently, so a request with many targets only waits for the slowest of them.
+
+    Callbacks may be coroutine functions. They are awaited directly by aquery and avariable, while regular
+    callbacks are run on the worker pool of their scope so that they never block the event loop.
+
+    Identical targets that are in flight at the same time, for example when many browsers refresh the same
+    dashboard, share a single callback call. Targets are identical when they have the same metric, payload and
+    time range, where the time range is widened to multiples of alignment seconds before it is compared.
+    Callbacks are called with the time range of the request, so targets sharing a call get the result for the
+    time range of the first of them, which differs by less than alignment seconds.
     """
 
-    def __init__(self):
+    def __init__(self, alignment: int = 0, format: str = "legacy"):
         self.metric_callbacks = {}
         self.tag_callbacks = {}
         self.variable_callbacks = {}
+        self.annotation_callbacks = {}
+        self.executors = {}
+        self.async_executors = {}
+        self.alignment = alignment
+        self.format = format
+        self.coalescer = SingleFlight()
 
     @property
     def metrics(self):
@@ -55,16 +97,40 @@ class GrafanaJSONDatasource:
 
         return result
 
-    def add_metrics(self, scope: str, metrics: dict):
+    def add_metrics(
+        self, scope: str, metrics: dict, workers: int = None, async_workers: int = None
+    ):
+        """Adds metrics to a scope. If workers is given, targets in the scope are run concurrently
+        on a pool of at most that many threads. Otherwise they are run one after another.
+
+        The pool is shared by all requests that are served on the event loop, so async_workers can give
+        those their own, larger pool. Without it they use the pool of workers."""
         try:
             self.metric_callbacks[scope].update(metrics)
         except KeyError:
             self.metric_callbacks[scope] = metrics
 
+        if workers:
+            self._executor(self.executors, scope, workers, f"datasource-{scope}")
+
+        if async_workers:
+            self._executor(
+                self.async_executors, scope, async_workers, f"datasource-async-{scope}"
+            )
+
         log.debug(
             f"Added {len(metrics)} {maybe_pluralize(len(metrics), 'metric', 'metrics')} to scope {scope}."
         )
 
+    def _executor(self, executors, scope, workers, name):
+        """Replaces the worker pool of a scope."""
+        if executor := executors.get(scope):
+            executor.shutdown(wait=False)
+
+        executors[scope] = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=name
+        )
+
     def add_variables(self, scope: str, variables: dict):
         try:
             self.variable_callbacks[scope].update(variables)
@@ -80,10 +146,112 @@ class GrafanaJSONDatasource:
         depending on the data a callback is created from a specific target and can retrive corresponding data
         builds a time series or a table depending on the callback and appends to the result
         Returns a result in the form of time series and/or tables depending on data and how many querys existed
+
+        The targets are planned first, so that targets sharing an upstream fetch only fetch once, see _plan.
         """
-        result = []
         queries = data.get("targets", [])
+        interval = self._interval(data)
+
+        calls = [self._prepare(query) for query in queries]
+        plan, keys = self._plan(calls, interval)
+
+        futures = {
+            key: self._submit(key, scope, function, payload, interval)
+            for key, (scope, function, payload) in plan.items()
+        }
+
+        step = self._step(data, interval)
+
+        return [
+            self._build_result(
+                reference,
+                identifier,
+                self._shape(
+                    self._derive(callback, futures[key].result(), payload, interval),
+                    payload,
+                ),
+                interval,
+                step,
+                self._format(payload),
+            )
+            for (reference, identifier, _, callback, payload), key in zip(calls, keys)
+        ]
+
+    async def aquery(self, data):
+        """Asynchronous version of query. All targets are awaited concurrently."""
+        queries = data.get("targets", [])
+        interval = self._interval(data)
+
+        calls = [self._prepare(query) for query in queries]
+        plan, keys = self._plan(calls, interval)
+
+        responses = dict(
+            zip(
+                plan,
+                await asyncio.gather(
+                    *[
+                        self.coalescer.ado(
+                            key, self._call, scope, function, payload, interval
+                        )
+                        for key, (scope, function, payload) in plan.items()
+                    ]
+                ),
+            )
+        )
 
+        step = self._step(data, interval)
+
+        return [
+            self._build_result(
+                reference,
+                identifier,
+                self._shape(
+                    self._derive(callback, responses[key], payload, interval),
+                    payload,
+                ),
+                interval,
+                step,
+                self._format(payload),
+            )
+            for (reference, identifier, _, callback, payload), key in zip(calls, keys)
+        ]
+
+    def _plan(self, calls, interval):
+        """Plans the upstream calls of a query.
+
+        Targets whose callbacks are Metrics with the same fetch and the same upstream parameters (the payload
+        without the keys that only shape the result) share one fetch, and identical targets share one call.
+        Every target of a query has the same time range, so shared fetches never need to be widened.
+
+        Returns the calls to make by key, and the key of the call answering each target."""
+        plan, keys = {}, []
+        aligned = self._align(interval)
+
+        for _, identifier, scope, callback, payload in calls:
+            if isinstance(callback, Metric):
+                key = callback.fetch, callback.key(payload), aligned
+                function = callback.fetch
+            else:
+                key = self._key(identifier, payload, aligned)
+                function = callback
+
+            plan.setdefault(key, (scope, function, payload))
+            keys.append(key)
+
+        if len(plan) < len(keys):
+            log.debug(f"Planned {len(keys)} targets as {len(plan)} calls.")
+
+        return plan, keys
+
+    def _derive(self, callback, response, payload, interval):
+        """Builds the result of a target from the response of its call. Only Metrics need building."""
+        if isinstance(callback, Metric):
+            return callback.build(response, payload, interval)
+
+        return response
+
+    def _interval(self, data):
+        """Extracts the time range of a query."""
         try:
             time_range = data["range"]
         except KeyError:
@@ -99,50 +267,198 @@ class GrafanaJSONDatasource:
         except KeyError:
             raise MetricsDataInvalidValueError("range", "to")
 
-        interval = namedtuple("interval", "start end")(
-            datetime.strptime(time_start, "%Y-%m-%dT%H:%M:%S.%f%z"),
-            datetime.strptime(time_end, "%Y-%m-%dT%H:%M:%S.%f%z"),
-        )
+        start = datetime.strptime(time_start, "%Y-%m-%dT%H:%M:%S.%f%z")
+        end = datetime.strptime(time_end, "%Y-%m-%dT%H:%M:%S.%f%z")
 
-        for query in queries:
-            identifier = query.get("target")
-            if not identifier:
-                raise MetricsQueryKeyMissingError("target")
+        return Interval(start, end)
 
-            reference = query.get("refId")
-            if not reference:
-                raise MetricsQueryKeyMissingError("refId")
+    def _align(self, interval):
+        """Widens a time range to multiples of alignment seconds, so that it can be compared with the time
+        ranges of other queries sent at the same refresh."""
+        start, end = interval
 
-            try:
-                scope, metric = identifier.split("-")
-            except ValueError:
-                raise MetricsQueryInvalidValueError("target", identifier)
+        if self.alignment:
+            start -= timedelta(seconds=start.timestamp() % self.alignment)
+            if remainder := end.timestamp() % self.alignment:
+                end += timedelta(seconds=self.alignment - remainder)
 
-            metrics = self.metric_callbacks.get(scope)
-            if not metrics:
-                raise ScopeDoesNotExistError(f"'{scope}' is not a valid scope.")
+        return Interval(start, end)
 
-            callback = metrics.get(metric)
-            if not callback:
-                raise CallbackDoesNotExistError(scope, metric)
+    def _step(self, data, interval):
+        """Width in milliseconds of the buckets that timeseries are aggregated into. It is the larger of
+        Grafana's intervalMs and the width needed to stay within maxDataPoints, or None if neither is given.
+        Without maxDataPoints, timeseries stay within MAX_DATA_POINTS buckets."""
+        interval_ms = data.get("intervalMs")
+        max_data_points = data.get("maxDataPoints")
 
-            payload = query.get("payload", {})
-            if isinstance(payload, str):
-                payload = {}
+        if interval_ms is not None and (
+            not isinstance(interval_ms, int) or interval_ms < 0
+        ):
+            raise MetricsDataInvalidValueError("intervalMs", interval_ms)
 
-            try:
-                response_data = callback(payload, interval)
-            except (PayloadInvalidError, ProjectDoesNotExistError) as err:
-                raise err
+        if max_data_points is not None and (
+            not isinstance(max_data_points, int) or max_data_points < 0
+        ):
+            raise MetricsDataInvalidValueError("maxDataPoints", max_data_points)
 
-            result.append(self._build_result(reference, identifier, response_data))
+        if not interval_ms and not max_data_points:
+            return None
 
-        return result
+        duration = (interval.end - interval.start).total_seconds() * 1000
+        steps = [
+            interval_ms or 0,
+            math.ceil(duration / (max_data_points or MAX_DATA_POINTS)),
+        ]
+
+        return max(steps) or None
+
+    def _prepare(self, query):
+        """Validates a single query and resolves the callback that answers it."""
+        identifier = query.get("target")
+        if not identifier:
+            raise MetricsQueryKeyMissingError("target")
+
+        reference = query.get("refId")
+        if not reference:
+            raise MetricsQueryKeyMissingError("refId")
+
+        try:
+            scope, metric = identifier.split("-")
+        except ValueError:
+            raise MetricsQueryInvalidValueError("target", identifier)
+
+        metrics = self.metric_callbacks.get(scope)
+        if not metrics:
+            raise ScopeDoesNotExistError(f"'{scope}' is not a valid scope.")
+
+        callback = metrics.get(metric)
+        if not callback:
+            raise CallbackDoesNotExistError(scope, metric)
+
+        payload = query.get("payload", {})
+        if isinstance(payload, str):
+            payload = {}
+
+        self._format(payload)
+        self._options(payload)
+
+        return reference, identifier, scope, callback, payload
+
+    def _format(self, payload):
+        """Response format of a target, given by its payload or the default of the datasource."""
+        format = payload.get("format", self.format)
+        if format not in FORMATS:
+            raise MetricsQueryInvalidValueError("format", format)
+
+        return format
+
+    def _options(self, payload):
+        """Column projection, sorting and row limits of a target, given by its payload.
+
+        columns is a list of column names, sort the name of a column (prefixed with "-" to sort in
+        descending order), and offset and limit cut the rows that are returned."""
+        columns = payload.get("columns")
+        if columns is not None and not (
+            isinstance(columns, list) and all(isinstance(c, str) for c in columns)
+        ):
+            raise MetricsQueryInvalidValueError("columns", columns)
+
+        sort = payload.get("sort")
+        if sort is not None and not (isinstance(sort, str) and sort.lstrip("-")):
+            raise MetricsQueryInvalidValueError("sort", sort)
+
+        for key in ("offset", "limit"):
+            value = payload.get(key)
+            if value is not None and (type(value) is not int or value < 0):
+                raise MetricsQueryInvalidValueError(key, value)
+
+        return namedtuple("options", "columns sort descending offset limit")(
+            columns,
+            sort and sort.lstrip("-"),
+            bool(sort) and sort.startswith("-"),
+            payload.get("offset") or 0,
+            payload.get("limit"),
+        )
 
-    def _build_result(self, reference, identifier, data):
-        """Format response data from adapters how Grafana want it."""
+    def _shape(self, data, payload):
+        """Applies the column projection, sorting and row limits of a target to a table. Adapters may
+        already have done part of this, which is harmless to repeat."""
+        options = self._options(payload)
+        if not isinstance(data, Table):
+            return data
+
+        names = [column.name for column in data.columns]
+        for key, name in [("columns", name) for name in options.columns or []] + [
+            ("sort", options.sort)
+        ]:
+            if name and name not in names:
+                raise MetricsQueryInvalidValueError(key, name)
+
+        if options.sort:
+            data = data.sort(options.sort, options.descending)
+        if options.columns:
+            data = data.select(options.columns)
+        if options.offset or options.limit is not None:
+            data = data.slice(options.offset, options.limit)
+
+        return data
+
+    def _key(self, identifier, payload, interval):
+        """Key under which identical in-flight targets are coalesced."""
+        return identifier, json.dumps(payload, sort_keys=True, default=str), interval
+
+    def _submit(self, key, scope, callback, payload, interval) -> Future:
+        """Runs a callback on the worker pool of its scope, or directly if the scope has none.
+        Workers run in a copy of the context of the caller, so that context variables set for
+        the request are visible to the callback. Identical calls are coalesced by key."""
+        if executor := self.executors.get(scope):
+            return executor.submit(
+                contextvars.copy_context().run,
+                self.coalescer.do,
+                key,
+                callback,
+                payload,
+                interval,
+            )
+
+        future = Future()
+        future.set_result(self.coalescer.do(key, callback, payload, interval))
+        return future
+
+    async def _call(self, scope, callback, *args):
+        """Awaits a coroutine callback, or runs a regular callback on the async worker pool of its scope,
+        or its worker pool if it has none. Scopes without workers use the default executor of the event loop.
+        """
+        if inspect.iscoroutinefunction(callback):
+            return await callback(*args)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.async_executors.get(scope) or self.executors.get(scope),
+            functools.partial(contextvars.copy_context().run, callback, *args),
+        )
+
+    def _build_result(
+        self, reference, identifier, data, interval=None, step=None, format="legacy"
+    ):
+        """Format response data from adapters how Grafana want it.
+        Timeseries that can be aggregated are resampled into buckets of step milliseconds.
+
+        The legacy format has one list per row of a table or datapoint of a timeseries. The frames format
+        is a Grafana data frame instead, with a schema of the fields and one list of values per field."""
 
         match data:
+            case TimeSeries(aggregation=aggregation) if aggregation and step:
+                data = data.resample(
+                    int(interval.start.timestamp() * 1000),
+                    int(interval.end.timestamp() * 1000),
+                    step,
+                )
+                return self._build_result(reference, identifier, data, format=format)
+
+            case Table() | TimeSeries() if format == "frames":
+                return self._build_frame(reference, identifier, data)
+
             case Table(columns=columns, rows=rows):
                 log.debug(
                     f"Returning table with {len(rows)} {maybe_pluralize(len(rows), 'row', 'rows')}."
@@ -170,12 +486,93 @@ class GrafanaJSONDatasource:
 
         raise TypeError(f"'{type(data)} is not a valid response data type.'")
 
+    def _build_frame(self, reference, identifier, data):
+        """Formats a table or timeseries as a Grafana data frame."""
+        match data:
+            case Table(columns=columns):
+                fields = [
+                    {"name": column.name, "type": FIELD_TYPES[column.type]}
+                    for column in columns
+                ]
+                values = data.values
+            case TimeSeries():
+                fields = [
+                    {"name": "Time", "type": "time"},
+                    {"name": identifier, "type": "number"},
+                ]
+                values = [data.times, data.values]
+
+        log.debug(f"Returning data frame with {len(fields)} fields.")
+
+        return {
+            "schema": {"refId": reference, "name": identifier, "fields": fields},
+            "data": {"values": values},
+        }
+
+    def add_annotations(self, scope: str, annotations: dict):
+        try:
+            self.annotation_callbacks[scope].update(annotations)
+        except KeyError:
+            self.annotation_callbacks[scope] = annotations
+
+        log.debug(
+            f"Added {len(annotations)} {maybe_pluralize(len(annotations), 'annotation', 'annotations')} to scope {scope}."
+        )
+
+    def annotations(self, data):
+        """Returns the annotations of an annotation query within its time range."""
+        scope, callback, annotation_data, interval = self._annotation(data)
+        return callback(annotation_data, interval)
+
+    async def aannotations(self, data):
+        """Asynchronous version of annotations."""
+        scope, callback, annotation_data, interval = self._annotation(data)
+        return await self._call(scope, callback, annotation_data, interval)
+
+    def _annotation(self, data):
+        """Resolves the callback that answers an annotation query. The query of the annotation is a JSON
+        object with the scope and name of the annotations and optional data for the callback, like the
+        target of a variable."""
+        try:
+            query = json.loads(data["annotation"]["query"] or "{}")
+        except KeyError:
+            raise MetricsDataKeyMissingError("annotation.query")
+        except (TypeError, ValueError):
+            raise MetricsDataInvalidValueError("annotation", "query")
+
+        scope, annotation, annotation_data = (
+            query.get("scope"),
+            query.get("annotation"),
+            query.get("data", {}),
+        )
+        annotations = self.annotation_callbacks.get(scope)
+        if not annotations:
+            raise ScopeDoesNotExistError(f"'{scope}' is not a valid scope.")
+
+        callback = annotations.get(annotation)
+        if not callback:
+            raise CallbackDoesNotExistError(scope, annotation)
+
+        return scope, callback, annotation_data, self._interval(data)
+
     def search(self):
         """Returns all available metrics"""
         return self.metrics
 
     def variable(self, data):
         """Returns options for a variable"""
+        scope, callback, variable_data = self._variable(data)
+        result = callback(variable_data)
+        return [{"__text": key, "__value": value} for key, value in result.items()]
+
+    async def avariable(self, data):
+        """Asynchronous version of variable."""
+        scope, callback, variable_data = self._variable(data)
+        result = await self._call(scope, callback, variable_data)
+        return [{"__text": key, "__value": value} for key, value in result.items()]
+
+    def _variable(self, data):
+        """Resolves the callback that answers a variable query."""
         payload = data.get("payload")
         target = json.loads(payload.get("target"))
 
@@ -191,5 +588,5 @@ class GrafanaJSONDatasource:
         callback = variables.get(variable)
         if not callback:
             raise CallbackDoesNotExistError(scope, variable)
-        result = callback(variable_data)
-        return [{"__text": key, "__value": value} for key, value in result.items()]
+
+        return scope, callback, variable_data
@@ -0,0 +1,12 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+__all__ = ["encode"]
+
+
+def encode(results) -> bytes:
+    """Encodes query results as JSON, with compact separators."""
+    return json.dumps(results, separators=(",", ":"), cls=DjangoJSONEncoder).encode(
+        "utf-8"
+    )
@@ -1,3 +1,4 @@
+import json
 from enum import Enum
 
 
@@ -20,19 +21,167 @@ class TableColumn:
 
 
 class Table:
-    """Table of data."""
+    """Table of data.
+
+    A table keeps its data the way it was created: as rows, or as one list of values per column with
+    Table.from_columns. The rows are what the legacy format returns and the columns what data frames
+    return, and the other form is only built when it is needed.
+    """
 
     __match_args__ = ("columns", "rows")
 
     def __init__(self, columns: list[TableColumn], rows):
         self.columns = columns
-        self.rows = rows
+        self._rows = rows if isinstance(rows, list) else list(rows)
+        self._values = None
+
+    @classmethod
+    def from_columns(cls, columns: list[TableColumn], values: list):
+        """Creates a table from a list of values for each column."""
+        table = cls.__new__(cls)
+        table.columns = columns
+        table._rows = None
+        table._values = values
+        return table
+
+    @property
+    def rows(self) -> list:
+        if self._rows is None:
+            self._rows = [list(row) for row in zip(*self._values)]
+
+        return self._rows
+
+    @property
+    def values(self) -> list:
+        if self._values is None:
+            self._values = (
+                [list(values) for values in zip(*self._rows)]
+                if self._rows
+                else [[] for _ in self.columns]
+            )
+
+        return self._values
+
+    def _index(self, name):
+        return [column.name for column in self.columns].index(name)
+
+    def select(self, names: list[str]):
+        """Returns a table of the given columns, in the given order."""
+        indices = [self._index(name) for name in names]
+        columns = [self.columns[i] for i in indices]
+
+        if self._rows is None:
+            return Table.from_columns(columns, [self._values[i] for i in indices])
+
+        return Table(columns, [[row[i] for i in indices] for row in self._rows])
+
+    def sort(self, name: str, descending: bool = False):
+        """Returns a table sorted by a column. Empty values are placed last, or first when descending."""
+        index = self._index(name)
+        return Table(
+            self.columns,
+            sorted(
+                self.rows,
+                key=lambda row: (row[index] is None, row[index]),
+                reverse=descending,
+            ),
+        )
+
+    def slice(self, offset: int = 0, limit: int = None):
+        """Returns limit rows of the table, starting at offset."""
+        end = None if limit is None else offset + limit
+
+        if self._rows is None:
+            return Table.from_columns(
+                self.columns, [values[offset:end] for values in self._values]
+            )
+
+        return Table(self.columns, self._rows[offset:end])
+
+
+class Aggregation(Enum):
+    """Ways of combining the datapoints of a TimeSeries that fall into the same bucket of time."""
+
+    SUM = "sum"
+    MEAN = "mean"
 
 
 class TimeSeries:
-    """Timeseries of data."""
+    """Timeseries of data, as a list of [value, timestamp] datapoints.
+
+    A TimeSeries with an aggregation can be resampled into buckets of time by the datasource,
+    so that Grafana receives one datapoint per bucket instead of one per event.
+    """
+
+    __match_args__ = ("data",)
+
+    def __init__(self, data, aggregation: Aggregation = None):
+        self.data = data if isinstance(data, list) else list(data)
+        self.aggregation = aggregation
+
+    @property
+    def values(self) -> list:
+        return [value for value, _ in self.data]
+
+    @property
+    def times(self) -> list:
+        return [timestamp for _, timestamp in self.data]
+
+    def resample(self, start: int, end: int, step: int):
+        """Aggregates the datapoints into buckets of step milliseconds between start and end.
+
+        Buckets are aligned to multiples of step. Empty buckets are zero when summing and null when
+        averaging.
+        """
+        first = start // step * step
+        count = (end - first) // step + 1
+        sums = [0] * count
+        counts = [0] * count
+
+        for value, timestamp in self.data:
+            index = int(timestamp - first) // step
+            if 0 <= index < count:
+                sums[index] += value
+                counts[index] += 1
+
+        if self.aggregation is Aggregation.MEAN:
+            values = [
+                total / number if number else None
+                for total, number in zip(sums, counts)
+            ]
+        else:
+            values = sums
+
+        return TimeSeries(
+            [[value, first + index * step] for index, value in enumerate(values)],
+            self.aggregation,
+        )
+
+
+class Metric:
+    """A metric answered in two steps: fetch(payload, interval) fetches the data of a target from upstream and
+    build(data, payload, interval) turns it into a Table or TimeSeries.
+
+    Targets of one query that only differ in the keys shaping their result (shape_keys, and the keys that
+    the datasource handles itself) share a single fetch, and each of them builds its own result from it.
+    The fetched data is shared, so build must not modify it.
+    """
+
+    # Payload keys handled by the datasource, which never change what is fetched.
+    SHAPE_KEYS = ("format", "columns", "sort", "offset", "limit")
+
+    def __init__(self, fetch, build, shape_keys=()):
+        self.fetch = fetch
+        self.build = build
+        self.shape_keys = set(shape_keys) | set(self.SHAPE_KEYS)
 
-    __match_args__ = "data"
+    def key(self, payload):
+        """Upstream parameters of a payload. Targets with the same key can share a fetch."""
+        return json.dumps(
+            {k: v for k, v in payload.items() if k not in self.shape_keys},
+            sort_keys=True,
+            default=str,
+        )
 
-    def __init__(self, data):
-        self.data = data
+    def __call__(self, payload, interval):
+        return self.build(self.fetch(payload, interval), payload, interval)
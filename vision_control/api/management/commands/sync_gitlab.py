@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+import time
+import logging
+
+log = logging.getLogger(__name__)
+
+import gitlab as gitlab_api
+
+from ...adapters.gitlab import CommitAuthors
+from ...adapters.mirror import GitLabMirror
+
+
+class Command(BaseCommand):
+    help = "Keeps the local mirror of the projects in GITLAB_PROJECT_IDS up to date."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Sync once and exit instead of looping."
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.GITLAB_MIRROR_INTERVAL,
+            help="Seconds between syncs.",
+        )
+
+    def handle(self, *args, **options):
+        gitlab = gitlab_api.Gitlab(
+            url=settings.GITLAB_URL,
+            private_token=settings.GITLAB_ACCESS_TOKEN,
+            per_page=settings.GITLAB_PAGE_SIZE,
+        )
+        mirror = GitLabMirror(
+            gitlab,
+            page_concurrency=settings.GITLAB_PAGE_CONCURRENCY,
+            overlap=settings.GITLAB_MIRROR_OVERLAP,
+            commit_window=settings.GITLAB_MIRROR_COMMIT_WINDOW,
+            authors=CommitAuthors(workers=settings.GITLAB_AUTHOR_WORKERS),
+        )
+
+        while True:
+            for project_id in settings.GITLAB_PROJECT_IDS:
+                try:
+                    mirror.sync(project_id)
+                except gitlab_api.exceptions.GitlabError as err:
+                    log.warning(f"Syncing project #{project_id} failed: {err}")
+
+            log.info(f"Synced {len(settings.GITLAB_PROJECT_IDS)} projects.")
+
+            if options["once"]:
+                return
+
+            time.sleep(options["interval"])
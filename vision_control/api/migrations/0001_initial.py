@@ -0,0 +1,216 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Commit",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField()),
+                ("sha", models.CharField(max_length=64)),
+                ("time", models.DateTimeField()),
+                ("author", models.CharField(max_length=255)),
+                ("message", models.TextField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["project_id", "time"],
+                        name="api_commit_project_e4dcf2_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project_id", "sha"), name="unique_commit"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="Issue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField()),
+                ("issue_id", models.IntegerField()),
+                ("title", models.TextField()),
+                ("labels", models.JSONField(default=list)),
+                ("state", models.CharField(max_length=32)),
+                ("updated", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["project_id", "updated"],
+                        name="api_issue_project_4938fa_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project_id", "issue_id"), name="unique_issue"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="MergeRequest",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField()),
+                ("merge_request_id", models.IntegerField()),
+                ("state", models.CharField(max_length=32)),
+                ("source_branch", models.CharField(max_length=255)),
+                ("target_branch", models.CharField(max_length=255)),
+                ("author", models.CharField(max_length=255)),
+                ("created", models.DateTimeField()),
+                ("updated", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["project_id", "updated"],
+                        name="api_mergere_project_c9cdbb_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project_id", "merge_request_id"),
+                        name="unique_merge_request",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="Milestone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField()),
+                ("milestone_id", models.IntegerField()),
+                ("iid", models.IntegerField()),
+                ("title", models.CharField(max_length=255)),
+                ("state", models.CharField(max_length=32)),
+                ("description", models.TextField(null=True)),
+                ("start_date", models.DateField(null=True)),
+                ("due_date", models.DateField(null=True)),
+                ("expired", models.BooleanField(null=True)),
+                ("updated", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["project_id", "state"],
+                        name="api_milesto_project_d38a88_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project_id", "milestone_id"), name="unique_milestone"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="Pipeline",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField()),
+                ("pipeline_id", models.IntegerField()),
+                ("created", models.DateTimeField()),
+                ("updated", models.DateTimeField()),
+                ("ref", models.CharField(max_length=255)),
+                ("status", models.CharField(max_length=32)),
+                ("sha", models.CharField(max_length=64)),
+                ("user", models.CharField(max_length=255, null=True)),
+                ("url", models.URLField(max_length=500)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["project_id", "updated"],
+                        name="api_pipelin_project_2836d2_idx",
+                    ),
+                    models.Index(
+                        fields=["project_id", "ref", "updated"],
+                        name="api_pipelin_project_26bcf6_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project_id", "pipeline_id"), name="unique_pipeline"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField()),
+                ("entity", models.CharField(max_length=32)),
+                ("updated_after", models.DateTimeField(null=True)),
+                ("synced_at", models.DateTimeField(null=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project_id", "entity"), name="unique_sync_state"
+                    )
+                ],
+            },
+        ),
+    ]
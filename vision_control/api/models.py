@@ -1,3 +1,122 @@
 from django.db import models
 
-# Create your models here.
+
+class Commit(models.Model):
+    """Commit on the default branch of a project, mirrored from GitLab."""
+
+    project_id = models.IntegerField()
+    sha = models.CharField(max_length=64)
+    time = models.DateTimeField()
+    author = models.CharField(max_length=255)
+    message = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["project_id", "sha"], name="unique_commit")
+        ]
+        indexes = [models.Index(fields=["project_id", "time"])]
+
+
+class Pipeline(models.Model):
+    """Pipeline of a project, mirrored from GitLab."""
+
+    project_id = models.IntegerField()
+    pipeline_id = models.IntegerField()
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    ref = models.CharField(max_length=255)
+    status = models.CharField(max_length=32)
+    sha = models.CharField(max_length=64)
+    user = models.CharField(max_length=255, null=True)
+    url = models.URLField(max_length=500)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project_id", "pipeline_id"], name="unique_pipeline"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["project_id", "updated"]),
+            models.Index(fields=["project_id", "ref", "updated"]),
+        ]
+
+
+class Issue(models.Model):
+    """Issue of a project, mirrored from GitLab."""
+
+    project_id = models.IntegerField()
+    issue_id = models.IntegerField()
+    title = models.TextField()
+    labels = models.JSONField(default=list)
+    state = models.CharField(max_length=32)
+    updated = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project_id", "issue_id"], name="unique_issue"
+            )
+        ]
+        indexes = [models.Index(fields=["project_id", "updated"])]
+
+
+class MergeRequest(models.Model):
+    """Merge request of a project, mirrored from GitLab."""
+
+    project_id = models.IntegerField()
+    merge_request_id = models.IntegerField()
+    state = models.CharField(max_length=32)
+    source_branch = models.CharField(max_length=255)
+    target_branch = models.CharField(max_length=255)
+    author = models.CharField(max_length=255)
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project_id", "merge_request_id"], name="unique_merge_request"
+            )
+        ]
+        indexes = [models.Index(fields=["project_id", "updated"])]
+
+
+class Milestone(models.Model):
+    """Milestone of a project, mirrored from GitLab."""
+
+    project_id = models.IntegerField()
+    milestone_id = models.IntegerField()
+    iid = models.IntegerField()
+    title = models.CharField(max_length=255)
+    state = models.CharField(max_length=32)
+    description = models.TextField(null=True)
+    start_date = models.DateField(null=True)
+    due_date = models.DateField(null=True)
+    expired = models.BooleanField(null=True)
+    updated = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project_id", "milestone_id"], name="unique_milestone"
+            )
+        ]
+        indexes = [models.Index(fields=["project_id", "state"])]
+
+
+class SyncState(models.Model):
+    """High-water mark of the mirror of one kind of entity of a project: everything updated before
+    updated_after has been mirrored."""
+
+    project_id = models.IntegerField()
+    entity = models.CharField(max_length=32)
+    updated_after = models.DateTimeField(null=True)
+    synced_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project_id", "entity"], name="unique_sync_state"
+            )
+        ]
@@ -6,71 +6,164 @@ import logging
 log = logging.getLogger(__name__)
 
 import hooks
-import gitlab as gitlab_api
 
-from .adapters.gitlab import GitLabMetricsAdapter, GitLabVariablesAdapter
-from .adapters.vision_control import VisionControlMetricsAdapter
-from .grafana_json_datasource import GrafanaJSONDatasource
-
-gitlab = gitlab_api.Gitlab(
-    url=settings.GITLAB_URL, private_token=settings.GITLAB_ACCESS_TOKEN
+from hooks.queue import HookQueue
+from hooks.grafana import GrafanaClient
+from hooks.signals import gitlab_event
+
+from .startup import (
+    Lazy,
+    Startup,
+    Waiting,
+    serving,
+    gitlab_client,
+    configuration_errors,
 )
+from .adapters.cache import RangeCache
+from .adapters.events import GitLabEvents
+from .adapters.annotations import AnnotationsAdapter
+from .adapters.mirror import GitLabMirror
+from .adapters.identity import IdentityMap
+from .adapters.gitlab import (
+    GitLabUsers,
+    CommitAuthors,
+    GitLabMetricsAdapter,
+    GitLabVariablesAdapter,
+)
+from .adapters.vision_control import VisionControlMetricsAdapter
+from .grafana_json_datasource import Metric, GrafanaJSONDatasource
 
-if not settings.GITLAB_URL:
-    log.error(
-        "GITLAB_URL missing from environment. Make sure it is configured properly."
-    )
+if errors := configuration_errors():
+    for error in errors:
+        log.error(error)
     sys.exit(1)
 
-if not settings.GITLAB_ACCESS_TOKEN:
-    log.error(
-        "GITLAB_ACCESS_TOKEN missing from environment. Make sure it is configured properly."
-    )
-    sys.exit(1)
+gitlab = Lazy(gitlab_client)
 
-try:
-    gitlab.auth()
-except gitlab_api.exceptions.GitlabAuthenticationError as e:
-    log.error(
-        "Authentication to GitLab failed. Make sure GITLAB_URL and GITLAB_ACCESS_TOKEN are configured properly."
+
+def authenticate():
+    from gitlab.exceptions import GitlabGetError, GitlabAuthenticationError
+
+    try:
+        gitlab.auth()
+    except GitlabAuthenticationError as err:
+        raise RuntimeError(
+            "Authentication to GitLab failed. Make sure GITLAB_URL and GITLAB_ACCESS_TOKEN are configured properly."
+        ) from err
+
+    log.info(f"Authenticated to {settings.GITLAB_URL}.")
+
+    try:
+        project = gitlab.projects.get(settings.GITLAB_DEFAULT_PROJECT)
+    except GitlabGetError as err:
+        raise RuntimeError(
+            f"Project #{settings.GITLAB_DEFAULT_PROJECT} does not exist. Make sure that GITLAB_DEFAULT_PROJECT is set to an existing Gitlab project."
+        ) from err
+
+    log.info(
+        f"Using '{project.name}' (#{settings.GITLAB_DEFAULT_PROJECT}) as default project for queries."
     )
-    sys.exit(1)
 
-log.info(f"Authenticated to {settings.GITLAB_URL}.")
 
+def configure_hooks():
+    if not hooks.configure(gitlab, workers=settings.GITLAB_PAGE_CONCURRENCY):
+        raise Waiting("configured by another worker")
+
+
+startup = Startup(background=settings.STARTUP_BACKGROUND)
 try:
-    project = gitlab.projects.get(settings.GITLAB_DEFAULT_PROJECT)
-except gitlab_api.GitlabGetError:
-    log.error(
-        f"Project #{settings.GITLAB_DEFAULT_PROJECT} does not exist. Make sure that GITLAB_DEFAULT_PROJECT is set to an existing Gitlab project."
-    )
+    startup.run("gitlab", authenticate)
+    if serving():
+        startup.run("hooks", configure_hooks)
+except Exception as err:
+    log.error(err)
     sys.exit(1)
 
-log.info(
-    f"Using '{project.name}' (#{settings.GITLAB_DEFAULT_PROJECT}) as default project for queries."
+grafana = GrafanaClient(
+    settings.GRAFANA_URL,
+    settings.GRAFANA_ACCESS_TOKEN,
+    connections=settings.GRAFANA_CONNECTIONS,
+    connect_timeout=settings.GRAFANA_CONNECT_TIMEOUT,
+    read_timeout=settings.GRAFANA_READ_TIMEOUT,
+)
+hook_queue = HookQueue(
+    grafana if settings.HOOKS_GRAFANA_ANNOTATIONS else None,
+    workers=settings.HOOKS_WORKERS,
+    batch=settings.HOOKS_BATCH_SIZE,
+    retries=settings.HOOKS_RETRIES,
+    backoff=settings.HOOKS_BACKOFF,
+    retention=settings.HOOKS_RETENTION,
+    annotation_retention=settings.HOOKS_ANNOTATION_RETENTION,
 )
 
-hooks.configure(gitlab)
+datasource = GrafanaJSONDatasource(
+    alignment=settings.DATASOURCE_INTERVAL_ALIGNMENT, format=settings.DATASOURCE_FORMAT
+)
+identities = IdentityMap(ttl=settings.GITLAB_IDENTITY_TTL)
+cache = (
+    RangeCache(
+        settings.GITLAB_CACHE_BUCKET,
+        settings.GITLAB_CACHE_TTL,
+        live_tail=settings.GITLAB_LIVE_TAIL,
+        overlap=settings.GITLAB_LIVE_TAIL_OVERLAP,
+        hooks=settings.GITLAB_CACHE_HOOKS,
+    )
+    if settings.GITLAB_CACHE_BUCKET
+    else None
+)
+mirror = GitLabMirror() if settings.GITLAB_MIRROR else None
+vision_control_metrics_adapter = VisionControlMetricsAdapter(
+    datasource, hook_queue=hook_queue, grafana=grafana
+)
+gitlab_metrics_adapter = GitLabMetricsAdapter(
+    gitlab,
+    cache=cache,
+    authors=CommitAuthors(workers=settings.GITLAB_AUTHOR_WORKERS),
+    directory=GitLabUsers(
+        gitlab,
+        workers=settings.GITLAB_USERS_WORKERS,
+        profile_ttl=settings.GITLAB_USERS_PROFILE_TTL,
+        status_ttl=settings.GITLAB_USERS_STATUS_TTL,
+        identities=identities,
+    ),
+    page_concurrency=settings.GITLAB_PAGE_CONCURRENCY,
+    identities=identities,
+    mirror=mirror,
+)
+gitlab_variables_adapter = GitLabVariablesAdapter(gitlab, identities=identities)
 
-vision_control_metrics_adapter = VisionControlMetricsAdapter()
-gitlab_metrics_adapter = GitLabMetricsAdapter(gitlab)
-gitlab_variables_adapter = GitLabVariablesAdapter(gitlab)
-datasource = GrafanaJSONDatasource()
+gitlab_event.connect(
+    GitLabEvents(cache=cache, identities=identities, mirror=mirror), weak=False
+)
+if serving():
+    hook_queue.start()
 
 datasource.add_metrics(
     "gitlab",
     {
-        "commits": gitlab_metrics_adapter.commits,
+        "commits": Metric(
+            gitlab_metrics_adapter.fetch_commits,
+            gitlab_metrics_adapter.build_commits,
+            shape_keys=["timeseries"],
+        ),
         "users": gitlab_metrics_adapter.users,
         "pipelines": gitlab_metrics_adapter.pipelines,
         "issues": gitlab_metrics_adapter.issues,
         "merge_requests": gitlab_metrics_adapter.merge_requests,
         "milestones": gitlab_metrics_adapter.milestones,
     },
+    workers=settings.GITLAB_QUERY_WORKERS,
+    async_workers=settings.GITLAB_ASYNC_QUERY_WORKERS,
 )
 
 datasource.add_metrics(
-    "vision_control", {"version": vision_control_metrics_adapter.version}
+    "vision_control",
+    {
+        "version": vision_control_metrics_adapter.version,
+        "coalescing": vision_control_metrics_adapter.coalescing,
+        "hooks": vision_control_metrics_adapter.hooks,
+        "grafana": vision_control_metrics_adapter.grafana,
+    },
 )
 
 datasource.add_variables(
@@ -81,3 +174,7 @@ datasource.add_variables(
         "labels": gitlab_variables_adapter.labels,
     },
 )
+
+datasource.add_annotations(
+    "gitlab", {"pipelines": AnnotationsAdapter(settings.ANNOTATIONS_LIMIT).pipelines}
+)
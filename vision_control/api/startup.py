@@ -0,0 +1,160 @@
+from django.conf import settings
+
+import os
+import sys
+import time
+import logging
+import importlib
+import threading
+
+log = logging.getLogger(__name__)
+
+
+def configuration_errors() -> list:
+    """Problems with the settings that can be found without contacting GitLab."""
+    errors = []
+
+    if not settings.GITLAB_URL:
+        errors.append(
+            "GITLAB_URL missing from environment. Make sure it is configured properly."
+        )
+    if not settings.GITLAB_ACCESS_TOKEN:
+        errors.append(
+            "GITLAB_ACCESS_TOKEN missing from environment. Make sure it is configured properly."
+        )
+    if not settings.GITLAB_DEFAULT_PROJECT:
+        errors.append(
+            "GITLAB_DEFAULT_PROJECT missing from environment. Make sure that it is set to an existing GitLab project."
+        )
+    if not settings.GITLAB_SECRET_TOKEN:
+        errors.append(
+            "GITLAB_SECRET_TOKEN missing from environment. Set it, or set SECRET_KEY to derive it from."
+        )
+
+    return errors
+
+
+def serving() -> bool:
+    """Whether this process serves requests. Management commands load the URLs for their system checks,
+    and with them the services, but must not start the work of a server (like configuring the hooks) in a
+    process that is about to exit."""
+    program = os.path.basename(sys.argv[0])
+    if program in ("manage.py", "django-admin") or (
+        program == "__main__.py" and "django" in sys.argv[0]
+    ):
+        return sys.argv[1:2] == ["runserver"]
+
+    return True
+
+
+class Lazy:
+    """Stands in for an object that is created on first use, for example a client whose module is slow
+    to import. Attributes are looked up on the object, which is created once even if several threads use
+    it at the same time."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._object = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._object is None:
+            with self._lock:
+                if self._object is None:
+                    self._object = self._factory()
+
+        return getattr(self._object, name)
+
+
+def gitlab_client():
+    """Creates the GitLab client. python-gitlab is only imported here, since importing it takes a while."""
+    gitlab = importlib.import_module("gitlab")
+
+    return gitlab.Gitlab(
+        url=settings.GITLAB_URL,
+        private_token=settings.GITLAB_ACCESS_TOKEN,
+        per_page=settings.GITLAB_PAGE_SIZE,
+    )
+
+
+class Waiting(Exception):
+    """Raised by a startup check that cannot run yet, for example because another worker is doing the
+    same. The message becomes the state of the check, which is retried like a failed one."""
+
+
+class Startup:
+    """Runs the startup checks that need the network (see services.py), and tracks whether they passed.
+
+    In the background, checks run concurrently and a failing check is retried after retry seconds, twice as
+    long after every further failure up to max_retry seconds, instead of stopping the process. Until every
+    check has passed the middleware is not ready, see the health endpoint. A check that raises Waiting is
+    not ready either, but is not reported as failing.
+    """
+
+    PENDING = "pending"
+    OK = "ok"
+
+    def __init__(
+        self, background: bool = True, retry: float = 5, max_retry: float = 60
+    ):
+        self.background = background
+        self.retry = retry
+        self.max_retry = max_retry
+        self.checks = {}
+        self.started = time.monotonic()
+
+    def run(self, name, check):
+        """Runs check() in the background, or right away (letting it raise) when not in background mode. A
+        check that is waiting is retried in the background in either mode."""
+        self.checks[name] = self.PENDING
+        delay = 0
+
+        if not self.background:
+            try:
+                check()
+            except Waiting as err:
+                self.checks[name] = str(err)
+                delay = self.retry
+            else:
+                self.checks[name] = self.OK
+                return
+
+        # Daemon threads, so that checks that keep failing never hold up the process from exiting.
+        threading.Thread(
+            target=self._run,
+            args=(name, check, delay),
+            name=f"startup-{name}",
+            daemon=True,
+        ).start()
+
+    def _run(self, name, check, delay=0):
+        time.sleep(delay)
+        delay = self.retry
+        while True:
+            try:
+                check()
+            except Waiting as err:
+                self.checks[name] = str(err)
+                log.info(f"Startup check {name} is waiting: {err}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry)
+            except Exception as err:
+                self.checks[name] = str(err) or type(err).__name__
+                log.warning(
+                    f"Startup check {name} failed, retrying in {delay}s: {self.checks[name]}"
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry)
+            else:
+                self.checks[name] = self.OK
+                log.info(
+                    f"Startup check {name} passed after {time.monotonic() - self.started:.1f}s."
+                )
+                return
+
+    @property
+    def ready(self) -> bool:
+        return all(state == self.OK for state in self.checks.values())
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "checks": dict(self.checks)}
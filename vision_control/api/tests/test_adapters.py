@@ -1,4 +1,5 @@
 from django.test import TestCase
+from django.core.cache import cache
 
 from datetime import datetime, timedelta
 from collections import namedtuple
@@ -7,7 +8,13 @@ import pytest
 import gitlab.exceptions
 
 from ..utils import unix_timestamp
-from ..adapters.gitlab import GitLabMetricsAdapter, GitLabVariablesAdapter
+from ..adapters.gitlab import (
+    GitLabUsers,
+    CommitAuthors,
+    GitLabMetricsAdapter,
+    GitLabVariablesAdapter,
+    iterate,
+)
 from ..adapters.vision_control import VisionControlMetricsAdapter
 from ..grafana_json_datasource import Table, TimeSeries, TableColumn, TableColumnType
 from ..grafana_json_datasource.exceptions import *
@@ -15,12 +22,12 @@ from ..grafana_json_datasource.exceptions import *
 # Variables used to mock a GitLab instance.
 
 Project = namedtuple("projects", "get")
-Commit = namedtuple("commit", "authored_date committed_date author_name message")
+Commit = namedtuple("commit", "id authored_date committed_date author_name message")
 User = namedtuple("user", "id name username avatar_url public_email state status")
-Pipeline = namedtuple("pipeline", "ref status id created_at web_url sha")
+Pipeline = namedtuple("pipeline", "ref status id created_at updated_at web_url sha")
 Issue = namedtuple("issue", "id title labels state updated_at")
 MergeRequest = namedtuple(
-    "mergerequest", "state source_branch target_branch author created_at"
+    "mergerequest", "id state source_branch target_branch author created_at updated_at"
 )
 Milestone = namedtuple(
     "milestone", "title iid state description start_date due_date expired"
@@ -353,20 +360,23 @@ class MockGitLab:
                 "commits pipelines mergerequests issues milestones labels branches",
             )(
                 namedtuple("commits", "list get")(
-                    lambda ref_name, all, since, until: [
+                    lambda ref_name, iterator, since, until: [
                         Commit(
+                            "a1b2c3d",
                             date.isoformat() + "+02:00",
                             date.isoformat() + "+02:00",
                             "henak781",
                             "Jag är inte i denna grupp",
                         ),
                         Commit(
+                            "e4f5a6b",
                             date.isoformat() + "+02:00",
                             commit_time.isoformat() + "+02:00",
                             "ernla111",
                             "Add comment to fail pipeline",
                         ),
                         Commit(
+                            "c7d8e9f",
                             date.isoformat() + "+02:00",
                             commit_time2.isoformat() + "+02:00",
                             "huglu892",
@@ -376,12 +386,13 @@ class MockGitLab:
                     lambda *_: namedtuple("author", "author_name")("huglu892"),
                 ),
                 namedtuple("pipelines", "list")(
-                    lambda all, updated_after, updated_before, ref: [
+                    lambda iterator, updated_after, updated_before, ref: [
                         Pipeline(
                             "main",
                             "passed",
                             6001,
                             date.isoformat() + "+02:00",
+                            date.isoformat() + "+02:00",
                             "https://gitlab.se/company/6001",
                             4,
                         ),
@@ -390,34 +401,45 @@ class MockGitLab:
                             "running",
                             6002,
                             date.isoformat() + "+02:00",
+                            date.isoformat() + "+02:00",
                             "https://gitlab.se/company/6002",
                             4,
                         ),
                     ]
                 ),
                 namedtuple("mergerequests", "list")(
-                    lambda state, ref, updated_after, updated_before, all: [
+                    lambda iterator, state, ref, updated_after, updated_before: [
                         MergeRequest(
+                            301,
                             "Open",
                             "testing/adapters",
                             "main",
                             {"name": "isagr354"},
                             date,
+                            date,
                         ),
                         MergeRequest(
+                            302,
                             "Merged",
                             "feature/product",
                             "main",
                             {"name": "huglu892"},
                             date,
+                            date,
                         ),
                         MergeRequest(
-                            "Open", "feature/html", "main", {"name": "adasu264"}, date
+                            303,
+                            "Open",
+                            "feature/html",
+                            "main",
+                            {"name": "adasu264"},
+                            date,
+                            date,
                         ),
                     ]
                 ),
                 namedtuple("issues", "list")(
-                    lambda all, labels, state, updated_after, updated_before: [
+                    lambda iterator, labels, state, updated_after, updated_before: [
                         Issue(23, "Skriva tester", "Doing", "Open", date),
                         Issue(24, "Fika", "Doing", "Open", date),
                         Issue(202, "Sova", "On hold", "Open", date),
@@ -425,7 +447,7 @@ class MockGitLab:
                     ]
                 ),
                 namedtuple("milestones", "list")(
-                    lambda state: [
+                    lambda iterator, state: [
                         Milestone(
                             "Leverans",
                             4,
@@ -459,7 +481,7 @@ class MockGitLab:
                     ]
                 ),
                 namedtuple("labels", "list")(
-                    lambda *_: [
+                    lambda iterator: [
                         Label("Doing"),
                         Label("Backlog"),
                         Label("Sprint Backlog"),
@@ -467,7 +489,7 @@ class MockGitLab:
                     ]
                 ),
                 namedtuple("branches", "list")(
-                    lambda *_: [
+                    lambda iterator: [
                         Branch("main"),
                         Branch("testing/everything"),
                         Branch("feature/visualize"),
@@ -566,6 +588,24 @@ class GitlabMetricsAdapterTests(TestCase):
             assert len(row) == len(function_result.columns)
         assert function_result.rows == PIPELINES_EXPECTED_RESULT.rows
 
+    def test_pipelines_columns_and_limit(self):
+        """
+        Tests that only the requested columns and rows of pipelines are built, and that
+        authors are not looked up when "Triggered by" is not requested.
+        """
+        payload = {"project": 21345, "columns": ["ID", "Status"], "limit": 1}
+        interval = Interval(past, date)
+        resolved = []
+        authors = namedtuple("authors", "resolve")(
+            lambda project, shas: resolved.append(shas) or {}
+        )
+        gitlab_metrics_adapter = GitLabMetricsAdapter(MockGitLab(), authors=authors)
+        function_result = gitlab_metrics_adapter.pipelines(payload, interval)
+
+        assert [column.name for column in function_result.columns] == ["Status", "ID"]
+        assert function_result.rows == [["passed", 6001]]
+        assert resolved == []
+
     def test_issues(self):
         """
         Tests that all issues are retrieved in a table and that the
@@ -612,6 +652,168 @@ class GitlabMetricsAdapterTests(TestCase):
         assert function_result.rows == MILESTONES_EXPECTED_RESULT.rows
 
 
+class MockGitLabUsers:
+    """
+    This class mocks the parts of a GitLab API that are used to list the members of a group.
+    """
+
+    def __init__(self):
+        self.requests = []
+        members = namedtuple("members", "list")(
+            lambda iterator: [namedtuple("member", "id")(i) for i in range(1, 4)]
+        )
+        self.groups = namedtuple("groups", "get")(
+            lambda group_id, lazy: namedtuple("group", "members_all")(members)
+        )
+        self.users = namedtuple("users", "get")(self.user)
+
+    def user(self, user_id, lazy=False):
+        self.requests.append(("status" if lazy else "profile", user_id))
+        status = namedtuple("status", "availability emoji message")(
+            "busy" if user_id == 2 else "not_set", "coffee", f"Status {user_id}"
+        )
+        return User(
+            user_id,
+            f"User {user_id}",
+            f"user{user_id}",
+            f"https://gitlab.se/avatar/{user_id}",
+            "",
+            "active",
+            namedtuple("status", "get")(lambda: status),
+        )
+
+
+class GitLabUsersTests(TestCase):
+    """
+    The purpose of this class is to supply testcases
+    for the users metric and the class GitLabUsers in adapters/gitlab.py
+
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_users_of_group(self):
+        """
+        Tests that the members of a group are listed with their profiles and statuses.
+        """
+        gitlab = MockGitLabUsers()
+        adapter = GitLabMetricsAdapter(gitlab, directory=GitLabUsers(gitlab))
+        result = adapter.users({"group": 5})
+
+        assert [row[0] for row in result.rows] == [1, 2, 3]
+        assert [row[6] for row in result.rows] == [False, True, False]
+        assert result.rows[0][7] == "☕"
+        assert result.rows[2][8] == "Status 3"
+
+    def test_statuses_expire_before_profiles(self):
+        """
+        Tests that statuses are fetched again while profiles are answered from the cache.
+        """
+        gitlab = MockGitLabUsers()
+        adapter = GitLabMetricsAdapter(
+            gitlab, directory=GitLabUsers(gitlab, profile_ttl=3600, status_ttl=0)
+        )
+        adapter.users({"group": 5})
+        gitlab.requests.clear()
+        adapter.users({"group": 5})
+
+        assert sorted(gitlab.requests) == [("status", 1), ("status", 2), ("status", 3)]
+
+
+class MockPagedManager:
+    """
+    This class mocks a GitLab list endpoint with 10 pages of 3 objects each.
+    """
+
+    class Objects(list):
+        total_pages = 10
+        per_page = 3
+
+    def __init__(self, total_pages=10):
+        self.Objects.total_pages = total_pages
+        self.pages = []
+
+    def list(self, iterator=False, page=None, **filters):
+        if iterator:
+            return self.Objects(range(30))
+
+        self.pages.append(page)
+        return list(range((page - 1) * 3, page * 3))
+
+
+class IterateTests(TestCase):
+    """
+    The purpose of this class is to supply testcases
+    for the function iterate in adapters/gitlab.py
+
+    """
+
+    def test_iterate_fetches_pages_concurrently_in_order(self):
+        """
+        Tests that the remaining pages are fetched separately and yielded in order.
+        """
+        manager = MockPagedManager()
+        assert list(iterate(manager, 4)) == list(range(30))
+        assert sorted(manager.pages) == list(range(2, 11))
+
+    def test_iterate_follows_links_without_total_pages(self):
+        """
+        Tests that lists without a known number of pages are iterated sequentially.
+        """
+        manager = MockPagedManager(total_pages=None)
+        assert list(iterate(manager, 4)) == list(range(30))
+        assert manager.pages == []
+
+
+class CommitAuthorsTests(TestCase):
+    """
+    The purpose of this class is to supply testcases
+    for the class CommitAuthors in adapters/gitlab.py
+
+    """
+
+    def test_resolve_fetches_each_commit_once(self):
+        """
+        Tests that authors are fetched once per sha and then answered from memory.
+        """
+        fetched = []
+
+        def get(sha):
+            fetched.append(sha)
+            return namedtuple("author", "author_name")(f"author of {sha}")
+
+        project = namedtuple("project", "commits")(namedtuple("commits", "get")(get))
+        authors = CommitAuthors(workers=2)
+
+        assert authors.resolve(project, ["a", "b", "a"]) == {
+            "a": "author of a",
+            "b": "author of b",
+        }
+        assert authors.resolve(project, ["b", "c"]) == {
+            "b": "author of b",
+            "c": "author of c",
+        }
+        assert sorted(fetched) == ["a", "b", "c"]
+
+    def test_resolve_evicts_least_recently_used(self):
+        """
+        Tests that no more than size authors are kept.
+        """
+        project = namedtuple("project", "commits")(
+            namedtuple("commits", "get")(
+                lambda sha: namedtuple("author", "author_name")(sha)
+            )
+        )
+        authors = CommitAuthors(size=2)
+        authors.resolve(project, ["a"])
+        authors.resolve(project, ["b"])
+        authors.resolve(project, ["a"])
+        authors.resolve(project, ["c"])
+
+        assert list(authors.authors) == ["a", "c"]
+
+
 class GitlabVariablesAdapterTests(TestCase):
     """
     The purpose of this class is to supply testcases
@@ -0,0 +1,93 @@
+from django.test import TestCase
+
+import json
+from datetime import datetime, timedelta, timezone
+
+from hooks.models import Annotation
+
+from ..adapters.annotations import AnnotationsAdapter
+from ..grafana_json_datasource import (
+    GrafanaJSONDatasource,
+    ScopeDoesNotExistError,
+    MetricsQueryInvalidValueError,
+)
+
+
+def at(hour, minute=0):
+    return datetime(2022, 4, 26, hour, minute, tzinfo=timezone.utc)
+
+
+def query(data=None, scope="gitlab", start="2022-04-26T09:00:00.000Z"):
+    return {
+        "annotation": {
+            "query": json.dumps(
+                {"scope": scope, "annotation": "pipelines", "data": data or {}}
+            )
+        },
+        "range": {"from": start, "to": "2022-04-26T12:00:00.000Z"},
+    }
+
+
+class AnnotationsAdapterTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for AnnotationsAdapter in adapters/annotations.py
+    """
+
+    def setUp(self):
+        for pipeline_id, project_id, start, status in [
+            (1, 1, at(8), "success"),
+            (2, 1, at(8, 57), "failed"),
+            (3, 1, at(10), "success"),
+            (4, 2, at(11), "failed"),
+            (5, 1, at(13), "failed"),
+        ]:
+            Annotation.objects.create(
+                project_id=project_id,
+                pipeline_id=pipeline_id,
+                time=start,
+                time_end=start + timedelta(minutes=5),
+                ref="main",
+                status=status,
+                tags=[str(project_id), "project", "pipeline", status, "main"],
+                text="",
+            )
+
+        self.datasource = GrafanaJSONDatasource()
+        self.datasource.add_annotations(
+            "gitlab", {"pipelines": AnnotationsAdapter(limit=10).pipelines}
+        )
+
+    def titles(self, data=None, **kwargs):
+        return [
+            annotation["title"]
+            for annotation in self.datasource.annotations(query(data, **kwargs))
+        ]
+
+    def test_annotations_within_range(self):
+        """
+        Tests that the pipelines running at some point of the range are returned, newest first.
+        """
+        assert self.titles() == ["Pipeline #4", "Pipeline #3", "Pipeline #2"]
+
+        annotation = self.datasource.annotations(query({"project": 2}))[0]
+        assert annotation["time"] == at(11).timestamp() * 1000
+        assert annotation["timeEnd"] == at(11, 5).timestamp() * 1000
+
+    def test_annotations_are_filtered(self):
+        """
+        Tests that annotations are filtered by project, status, tags and limit.
+        """
+        assert self.titles({"project": "1", "status": "success"}) == ["Pipeline #3"]
+        assert self.titles({"status": ["failed"]}) == ["Pipeline #4", "Pipeline #2"]
+        assert self.titles({"tags": ["2", "failed"]}) == ["Pipeline #4"]
+        assert self.titles({"limit": 1}) == ["Pipeline #4"]
+
+    def test_invalid_annotation_queries(self):
+        """
+        Tests that unknown scopes and invalid filters raise errors.
+        """
+        with self.assertRaises(ScopeDoesNotExistError):
+            self.titles(scope="grafana")
+
+        with self.assertRaises(MetricsQueryInvalidValueError):
+            self.titles({"project": "main"})
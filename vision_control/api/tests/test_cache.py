@@ -0,0 +1,351 @@
+from django.test import TestCase
+from django.core.cache import cache
+
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from collections import namedtuple
+
+from freezegun import freeze_time
+
+from ..adapters.cache import RangeCache
+from ..adapters.gitlab import GitLabMetricsAdapter
+
+Record = namedtuple("Record", "id time")
+Interval = namedtuple("interval", "start end")
+
+# One record every ten minutes during a day in the past.
+START = datetime(2022, 4, 16, tzinfo=timezone.utc).timestamp()
+RECORDS = [Record(i, START + i * 600) for i in range(6 * 24)]
+
+
+class MockSource:
+    """Answers fetches from RECORDS and remembers the intervals that were fetched."""
+
+    def __init__(self):
+        self.fetched = []
+
+    def fetch(self, start, end):
+        self.fetched.append((start.timestamp(), end.timestamp()))
+        return [
+            record
+            for record in reversed(RECORDS)
+            if start.timestamp() <= record.time <= end.timestamp()
+        ]
+
+
+def interval(hours_from, hours_to):
+    return Interval(
+        datetime.fromtimestamp(START + hours_from * 3600, tz=timezone.utc),
+        datetime.fromtimestamp(START + hours_to * 3600, tz=timezone.utc),
+    )
+
+
+class RangeCacheTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for RangeCache in adapters/cache.py
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_get_returns_records_within_interval(self):
+        """
+        Tests that the records of an interval are returned newest first and trimmed to the interval.
+        """
+        source = MockSource()
+        result = RangeCache(bucket=3600).get(
+            "commits", interval(1, 2.5), source.fetch, lambda record: record.time
+        )
+
+        assert [record.id for record in result] == list(reversed(range(6, 16)))
+        assert len(source.fetched) == 1
+
+    def test_get_only_fetches_missing_buckets(self):
+        """
+        Tests that a second, wider interval only fetches the buckets that were not cached.
+        """
+        source = MockSource()
+        range_cache = RangeCache(bucket=3600)
+        range_cache.get("commits", interval(2, 4), source.fetch, lambda r: r.time)
+
+        source.fetched.clear()
+        result = range_cache.get(
+            "commits", interval(0, 6), source.fetch, lambda r: r.time
+        )
+
+        assert source.fetched == [
+            (START, START + 2 * 3600),
+            (START + 5 * 3600, START + 7 * 3600),
+        ]
+        assert [record.id for record in result] == list(reversed(range(0, 37)))
+
+    def test_limit_stops_fetching_older_buckets(self):
+        """
+        Tests that with a limit, missing buckets are fetched newest first until enough records are found.
+        """
+        source = MockSource()
+        range_cache = RangeCache(bucket=3600)
+        range_cache.get("commits", interval(3, 4), source.fetch, lambda r: r.time)
+
+        source.fetched.clear()
+        result = range_cache.get(
+            "commits", interval(0, 6), source.fetch, lambda r: r.time, limit=10
+        )
+
+        assert source.fetched == [(START + 5 * 3600, START + 7 * 3600)]
+        assert [record.id for record in result][:10] == list(range(36, 26, -1))
+
+    def test_get_keeps_newest_duplicate(self):
+        """
+        Tests that a record appearing in more than one bucket is only returned once.
+        """
+        moved = Record(0, START + 3 * 3600)
+        range_cache = RangeCache(bucket=3600)
+
+        result = range_cache.get(
+            "pipelines",
+            interval(0, 4),
+            lambda *_: [moved, RECORDS[0]],
+            lambda r: r.time,
+        )
+
+        assert result == [moved]
+
+    def test_live_tail_fetches_after_high_water_mark(self):
+        """
+        Tests that refreshing an interval ending now only fetches records after the
+        time up to which the open bucket was fetched, minus the overlap.
+        """
+        source = MockSource()
+        range_cache = RangeCache(bucket=3600, overlap=60)
+
+        with freeze_time(datetime.fromtimestamp(START + 2.5 * 3600, tz=timezone.utc)):
+            range_cache.get("commits", interval(0, 2.5), source.fetch, lambda r: r.time)
+
+        source.fetched.clear()
+
+        with freeze_time(
+            datetime.fromtimestamp(START + 2.5 * 3600 + 10, tz=timezone.utc)
+        ):
+            result = range_cache.get(
+                "commits", interval(0, 2.5 + 10 / 3600), source.fetch, lambda r: r.time
+            )
+
+        assert source.fetched == [(START + 2.5 * 3600 - 60, START + 3 * 3600)]
+        assert [record.id for record in result] == list(reversed(range(0, 16)))
+
+    def test_without_live_tail_open_buckets_are_refetched(self):
+        """
+        Tests that open buckets are fetched in full again when live tail is disabled.
+        """
+        source = MockSource()
+        range_cache = RangeCache(bucket=3600, live_tail=False)
+
+        with freeze_time(datetime.fromtimestamp(START + 2.5 * 3600, tz=timezone.utc)):
+            range_cache.get("commits", interval(0, 2.5), source.fetch, lambda r: r.time)
+            source.fetched.clear()
+            range_cache.get("commits", interval(0, 2.5), source.fetch, lambda r: r.time)
+
+        assert source.fetched == [(START + 2 * 3600, START + 3 * 3600)]
+
+    def test_live_tail_can_be_turned_off_per_key(self):
+        """
+        Tests that open buckets of a key without live tail are fetched in full again, even when the cache
+        is in live tail mode.
+        """
+        source = MockSource()
+        range_cache = RangeCache(bucket=3600)
+
+        with freeze_time(datetime.fromtimestamp(START + 2.5 * 3600, tz=timezone.utc)):
+            for _ in range(2):
+                source.fetched.clear()
+                range_cache.get(
+                    "commits",
+                    interval(0, 2.5),
+                    source.fetch,
+                    lambda r: r.time,
+                    live_tail=False,
+                )
+
+        assert source.fetched == [(START + 2 * 3600, START + 3 * 3600)]
+
+    def test_invalidate_refetches_from_change(self):
+        """
+        Tests that invalidating a scope fetches the buckets reaching past the change again, from the
+        time of the change, and leaves the others cached.
+        """
+        source = MockSource()
+        range_cache = RangeCache(bucket=3600, overlap=0)
+        range_cache.get(
+            "issues", interval(0, 4), source.fetch, lambda r: r.time, scope="project"
+        )
+
+        source.fetched.clear()
+        range_cache.invalidate("project", since=START + 2.5 * 3600)
+        range_cache.invalidate("other", since=START)
+        result = range_cache.get(
+            "issues", interval(0, 4), source.fetch, lambda r: r.time, scope="project"
+        )
+
+        assert source.fetched == [(START + 2.5 * 3600, START + 5 * 3600)]
+        assert [record.id for record in result] == list(reversed(range(0, 25)))
+
+        source.fetched.clear()
+        range_cache.get(
+            "issues", interval(0, 4), source.fetch, lambda r: r.time, scope="project"
+        )
+
+        assert source.fetched == []
+
+    def test_old_change_is_not_refetched_again_by_later_changes(self):
+        """
+        Tests that once the buckets reaching past an old change have been fetched again, a later change
+        as of now only fetches the open bucket again.
+        """
+        source = MockSource()
+        range_cache = RangeCache(bucket=3600, overlap=0)
+        fetch = lambda: range_cache.get(
+            "pipelines", interval(0, 4.5), source.fetch, lambda r: r.time, scope="p"
+        )
+
+        with freeze_time(
+            datetime.fromtimestamp(START + 4.5 * 3600, tz=timezone.utc)
+        ) as frozen:
+            fetch()
+            frozen.tick(1)
+            range_cache.invalidate("p", since=START + 0.5 * 3600)
+            frozen.tick(1)
+            fetch()
+
+            frozen.tick(900)
+            source.fetched.clear()
+            range_cache.invalidate("p")
+            frozen.tick(1)
+            fetch()
+
+        assert source.fetched == [(START + 4.5 * 3600 + 2, START + 5 * 3600)]
+
+    def test_hooks_only_refetch_open_buckets_after_a_change(self):
+        """
+        Tests that with hooks, the open bucket is only fetched again once its scope is invalidated.
+        """
+        source = MockSource()
+        range_cache = RangeCache(bucket=3600, overlap=0, hooks=True)
+        fetch = lambda: range_cache.get(
+            "pipelines", interval(0, 2.5), source.fetch, lambda r: r.time, scope="p"
+        )
+
+        with freeze_time(datetime.fromtimestamp(START + 2.5 * 3600, tz=timezone.utc)):
+            fetch()
+            source.fetched.clear()
+            fetch()
+            assert source.fetched == []
+
+        with freeze_time(datetime.fromtimestamp(START + 2.75 * 3600, tz=timezone.utc)):
+            range_cache.invalidate("p")
+            fetch()
+
+        assert source.fetched == [(START + 2.5 * 3600, START + 3 * 3600)]
+
+
+class MockIssues:
+    """Answers issue lists from a list of issues, which tests can change in between."""
+
+    def __init__(self, issues):
+        self.issues = issues
+
+    def list(self, iterator=False, updated_after=None, updated_before=None, **_):
+        return [
+            issue
+            for issue in self.issues
+            if updated_after
+            <= datetime.fromisoformat(issue.updated_at)
+            <= updated_before
+        ]
+
+
+class MockPipelines:
+    """Answers pipeline lists from a list of pipelines and remembers the filters they were listed with."""
+
+    def __init__(self, pipelines):
+        self.pipelines = pipelines
+        self.filters = []
+
+    def list(self, iterator=False, updated_after=None, updated_before=None, **filters):
+        self.filters.append((updated_after, updated_before))
+        return [
+            pipeline
+            for pipeline in reversed(self.pipelines)
+            if updated_after
+            <= datetime.fromisoformat(pipeline.updated_at)
+            <= updated_before
+        ]
+
+
+class CachedAdapterTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for GitLabMetricsAdapter with a RangeCache
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pipelines_limit_stops_paging_with_cache(self):
+        """
+        Tests that a limit without sort stops fetching older buckets of pipelines when the cache is on.
+        """
+        updated = [
+            datetime.fromtimestamp(START + i * 600, tz=timezone.utc) for i in range(36)
+        ]
+        pipelines = MockPipelines(
+            [
+                SimpleNamespace(
+                    id=i,
+                    created_at=time.strftime("%Y-%m-%dT%H:%M:%S.000+00:00"),
+                    updated_at=time.strftime("%Y-%m-%dT%H:%M:%S.000+00:00"),
+                    ref="main",
+                    status="success",
+                    sha="a1b2c3d",
+                    user={"name": "henak781"},
+                    web_url="",
+                )
+                for i, time in enumerate(updated)
+            ]
+        )
+        project = SimpleNamespace(pipelines=pipelines)
+        gitlab = SimpleNamespace(projects=SimpleNamespace(get=lambda id: project))
+        adapter = GitLabMetricsAdapter(gitlab, cache=RangeCache(bucket=3600))
+
+        result = adapter.pipelines(
+            {"project": 1, "limit": 3, "columns": ["ID"]}, interval(0, 6)
+        )
+
+        assert result.rows == [[35], [34], [33]]
+        assert len(pipelines.filters) == 1
+
+    def test_issue_that_stops_matching_a_filter_is_not_served(self):
+        """
+        Tests that an issue that was closed after it was cached is no longer returned as open.
+        """
+        issue = SimpleNamespace(
+            id=11,
+            title="Fix the flaky test",
+            labels=["bug"],
+            state="opened",
+            updated_at="2022-04-16T01:00:00.000+00:00",
+        )
+        project = SimpleNamespace(issues=MockIssues([issue]))
+        gitlab = SimpleNamespace(projects=SimpleNamespace(get=lambda id: project))
+        adapter = GitLabMetricsAdapter(gitlab, cache=RangeCache(bucket=3600))
+        payload = {"project": 1, "state": "opened", "labels": ["bug"]}
+
+        with freeze_time(datetime.fromtimestamp(START + 2.5 * 3600, tz=timezone.utc)):
+            assert len(adapter.issues(payload, interval(0, 2.5)).rows) == 1
+
+        issue.state = "closed"
+        issue.updated_at = "2022-04-16T02:40:00.000+00:00"
+
+        with freeze_time(datetime.fromtimestamp(START + 2.75 * 3600, tz=timezone.utc)):
+            assert adapter.issues(payload, interval(0, 2.75)).rows == []
+            closed = adapter.issues(payload | {"state": "closed"}, interval(0, 2.75))
+            assert len(closed.rows) == 1
@@ -1,12 +1,24 @@
 from django.test import TestCase
 
+import json
+import time
+import asyncio
+import threading
 from datetime import datetime
 
 import pytest
 
 from ..utils import unix_timestamp
-from ..grafana_json_datasource.types import Table, TableColumn, TableColumnType
-from ..grafana_json_datasource.datasource import GrafanaJSONDatasource
+from ..grafana_json_datasource.types import (
+    Table,
+    Metric,
+    TimeSeries,
+    Aggregation,
+    TableColumn,
+    TableColumnType,
+)
+from ..grafana_json_datasource.encoder import encode
+from ..grafana_json_datasource.datasource import MAX_DATA_POINTS, GrafanaJSONDatasource
 from ..grafana_json_datasource.exceptions import *
 
 date = datetime.today()
@@ -476,3 +488,621 @@ class GrafanaJSONDataTests(TestCase):
         }
         with pytest.raises(CallbackDoesNotExistError):
             datasource.query(data)
+
+    def test_query_concurrent_targets(self):
+        """
+        Makes a query with several targets in a scope with workers and makes sure that
+        the targets run concurrently and that the results keep the order of the targets.
+        """
+        barrier = threading.Barrier(3, timeout=5)
+
+        def table(name):
+            def callback(*_):
+                barrier.wait()
+                return Table([TableColumn("Name", TableColumnType.STRING)], [[name]])
+
+            return callback
+
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab",
+            {"a": table("a"), "b": table("b"), "c": table("c")},
+            workers=3,
+        )
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {"refId": "A", "target": "gitlab-a"},
+                {"refId": "B", "target": "gitlab-b"},
+                {"refId": "C", "target": "gitlab-c"},
+            ],
+        }
+
+        result = datasource.query(data)
+        assert [item["refId"] for item in result] == ["A", "B", "C"]
+        assert [item["rows"] for item in result] == [[["a"]], [["b"]], [["c"]]]
+
+    def test_aquery_async_and_sync_callbacks(self):
+        """
+        Makes an asynchronous query with both a coroutine callback and a regular callback
+        and makes sure that both are answered in the order of the targets.
+        """
+
+        async def version(*_):
+            await asyncio.sleep(0)
+            return Table([TableColumn("version", TableColumnType.STRING)], [["1.0"]])
+
+        datasource = GrafanaJSONDatasource()
+        mocker = DataMocker()
+        datasource.add_metrics("gitlab", {"commits": mocker.mock_metrics}, workers=2)
+        datasource.add_metrics("vision_control", {"version": version})
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {"refId": "A", "target": "vision_control-version"},
+                {"refId": "B", "target": "gitlab-commits"},
+            ],
+        }
+
+        result = asyncio.run(datasource.aquery(data))
+        assert [item["refId"] for item in result] == ["A", "B"]
+        assert result[0]["rows"] == [["1.0"]]
+        assert len(result[1]["rows"]) == 3
+
+    def test_aquery_uses_async_workers(self):
+        """
+        Tests that asynchronous queries run regular callbacks on the async workers of their scope, which
+        are not limited by the workers of the synchronous datasource.
+        """
+        barrier = threading.Barrier(3, timeout=5)
+        threads = []
+
+        def table(name):
+            def callback(*_):
+                threads.append(threading.current_thread().name)
+                barrier.wait()
+                return Table([TableColumn("Name", TableColumnType.STRING)], [[name]])
+
+            return callback
+
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab",
+            {"a": table("a"), "b": table("b"), "c": table("c")},
+            workers=1,
+            async_workers=3,
+        )
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {"refId": "A", "target": "gitlab-a"},
+                {"refId": "B", "target": "gitlab-b"},
+                {"refId": "C", "target": "gitlab-c"},
+            ],
+        }
+
+        result = asyncio.run(datasource.aquery(data))
+        assert [item["rows"] for item in result] == [[["a"]], [["b"]], [["c"]]]
+        assert all(name.startswith("datasource-async-gitlab") for name in threads)
+
+    def test_avariable(self):
+        """
+        Tests that variables are answered by coroutine callbacks.
+        """
+
+        async def projects(*_):
+            return {"Company Utveckling": 10293}
+
+        datasource = GrafanaJSONDatasource()
+        datasource.add_variables("gitlab", {"projects": projects})
+        data = {"payload": {"target": '{"scope": "gitlab",  "variable": "projects"}'}}
+
+        result = asyncio.run(datasource.avariable(data))
+        assert result == [{"__text": "Company Utveckling", "__value": 10293}]
+
+    def test_query_coalesces_identical_targets(self):
+        """
+        Makes two concurrent queries with identical targets and makes sure that the callback
+        is only called once, with the time range of the first query, and that both queries receive its result.
+        """
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def callback(payload, interval):
+            calls.append(interval)
+            started.set()
+            release.wait(timeout=5)
+            return Table([TableColumn("Name", TableColumnType.STRING)], [["a"]])
+
+        datasource = GrafanaJSONDatasource(alignment=60)
+        datasource.add_metrics("gitlab", {"commits": callback}, workers=2)
+
+        def data(time_end):
+            return {
+                "range": {"from": "2022-04-19T09:22:11.365Z", "to": time_end},
+                "targets": [{"refId": "A", "target": "gitlab-commits"}],
+            }
+
+        results = []
+        first = threading.Thread(
+            target=lambda: results.append(
+                datasource.query(data("2022-04-26T09:22:11.365Z"))
+            )
+        )
+        first.start()
+        started.wait(timeout=5)
+
+        second = threading.Thread(
+            target=lambda: results.append(
+                datasource.query(data("2022-04-26T09:22:13.365Z"))
+            )
+        )
+        second.start()
+
+        while not datasource.coalescer.collapsed:
+            time.sleep(0.01)
+
+        release.set()
+        first.join()
+        second.join()
+
+        assert calls == [
+            (
+                datetime.fromisoformat("2022-04-19T09:22:11.365+00:00"),
+                datetime.fromisoformat("2022-04-26T09:22:11.365+00:00"),
+            )
+        ]
+        assert datasource.coalescer.calls == 1
+        assert datasource.coalescer.collapsed == 1
+        assert results[0] == results[1]
+
+    def test_query_resamples_timeseries(self):
+        """
+        Makes a query with maxDataPoints for a summed timeseries and makes sure that the datapoints
+        are counted per bucket, with empty buckets filled with zeros.
+        """
+        start = int(
+            datetime.fromisoformat("2022-04-26T09:00:00+00:00").timestamp() * 1000
+        )
+        minute = 60 * 1000
+
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab",
+            {
+                "commits": lambda *_: TimeSeries(
+                    [[1, start + 5 * minute], [1, start + 1 * minute], [1, start]],
+                    Aggregation.SUM,
+                )
+            },
+        )
+        data = {
+            "range": {
+                "from": "2022-04-26T09:00:00.000Z",
+                "to": "2022-04-26T09:10:00.000Z",
+            },
+            "intervalMs": 1000,
+            "maxDataPoints": 5,
+            "targets": [{"refId": "A", "target": "gitlab-commits"}],
+        }
+
+        assert datasource.query(data)[0]["datapoints"] == [
+            [2, start],
+            [0, start + 2 * minute],
+            [1, start + 4 * minute],
+            [0, start + 6 * minute],
+            [0, start + 8 * minute],
+            [0, start + 10 * minute],
+        ]
+
+    def test_query_invalid_max_data_points(self):
+        """
+        Makes a query with a maxDataPoints that is not a number and makes sure that the correct error is raised.
+        """
+        datasource = GrafanaJSONDatasource()
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "maxDataPoints": "many",
+            "targets": [],
+        }
+
+        with pytest.raises(MetricsDataInvalidValueError):
+            datasource.query(data)
+
+    def test_query_interval_without_max_data_points(self):
+        """
+        Makes a query with a small intervalMs over a long range without maxDataPoints and makes sure that
+        the timeseries is not resampled into more than MAX_DATA_POINTS buckets.
+        """
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab",
+            {"commits": lambda *_: TimeSeries([[1, 0]], Aggregation.SUM)},
+        )
+        data = {
+            "range": {
+                "from": "2012-04-26T09:00:00.000Z",
+                "to": "2022-04-26T09:00:00.000Z",
+            },
+            "intervalMs": 1,
+            "targets": [{"refId": "A", "target": "gitlab-commits"}],
+        }
+
+        assert len(datasource.query(data)[0]["datapoints"]) <= MAX_DATA_POINTS + 1
+
+    def test_query_negative_interval(self):
+        """
+        Makes a query with a negative intervalMs and makes sure that the correct error is raised.
+        """
+        datasource = GrafanaJSONDatasource()
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "intervalMs": -1,
+            "targets": [],
+        }
+
+        with pytest.raises(MetricsDataInvalidValueError):
+            datasource.query(data)
+
+    def test_resample_mean(self):
+        """
+        Tests that averaged timeseries leave empty buckets as null.
+        """
+        series = TimeSeries([[4, 0], [2, 5], [3, 25]], Aggregation.MEAN)
+        assert series.resample(0, 29, 10).data == [[3, 0], [None, 10], [3, 20]]
+
+    def test_table_rows_and_columns(self):
+        """
+        Tests that tables created from rows can be read by column, and tables created from columns by row.
+        """
+        table = Table(
+            [
+                TableColumn("Time", TableColumnType.TIME),
+                TableColumn("Duration", TableColumnType.NUMERIC),
+                TableColumn("Status", TableColumnType.STRING),
+            ],
+            [[1000, 1.5, "success"], [2000, None, "failed"]],
+        )
+
+        assert table.values[1] == [1.5, None]
+        assert Table.from_columns(table.columns, table.values).rows == [
+            [1000, 1.5, "success"],
+            [2000, None, "failed"],
+        ]
+
+    def test_encode_matches_json(self):
+        """
+        Tests that encoded tables and timeseries are the same as the JSON of their rows.
+        """
+        datasource = GrafanaJSONDatasource()
+        table = Table(
+            [
+                TableColumn("Time", TableColumnType.TIME),
+                TableColumn("Message", TableColumnType.STRING),
+                TableColumn("Labels", TableColumnType.JSON),
+                TableColumn("Passed", TableColumnType.BOOLEAN),
+            ],
+            [[1000, 'Fix "quotes" \u00e9', ["a", "b"], True], [2000, None, [], False]],
+        )
+        results = [
+            datasource._build_result("A", "table", table),
+            datasource._build_result(
+                "B", "series", TimeSeries([[0.5, 1000], [2, 2000]])
+            ),
+        ]
+
+        assert json.loads(encode(results)) == [
+            {
+                "refId": "A",
+                "columns": [
+                    {"text": "Time", "type": "time"},
+                    {"text": "Message", "type": "string"},
+                    {"text": "Labels", "type": "json"},
+                    {"text": "Passed", "type": "bool"},
+                ],
+                "rows": [
+                    [1000, 'Fix "quotes" \u00e9', ["a", "b"], True],
+                    [2000, None, [], False],
+                ],
+                "type": "table",
+            },
+            {
+                "refId": "B",
+                "target": "series",
+                "datapoints": [[0.5, 1000], [2.0, 2000]],
+            },
+        ]
+
+    def test_query_frames(self):
+        """
+        Makes queries that choose the frames format in their payload and makes sure that tables and
+        timeseries are returned as data frames.
+        """
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab",
+            {
+                "pipelines": lambda *_: Table(
+                    [
+                        TableColumn("Time", TableColumnType.TIME),
+                        TableColumn("Status", TableColumnType.STRING),
+                        TableColumn("Labels", TableColumnType.JSON),
+                    ],
+                    [[2000, "failed", ["a"]], [1000, "success", []]],
+                ),
+                "commits": lambda *_: TimeSeries([[1, 2000], [1, 1000]]),
+            },
+        )
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {
+                    "refId": "A",
+                    "target": "gitlab-pipelines",
+                    "payload": {"format": "frames"},
+                },
+                {
+                    "refId": "B",
+                    "target": "gitlab-commits",
+                    "payload": {"format": "frames"},
+                },
+            ],
+        }
+
+        assert json.loads(encode(datasource.query(data))) == [
+            {
+                "schema": {
+                    "refId": "A",
+                    "name": "gitlab-pipelines",
+                    "fields": [
+                        {"name": "Time", "type": "time"},
+                        {"name": "Status", "type": "string"},
+                        {"name": "Labels", "type": "other"},
+                    ],
+                },
+                "data": {"values": [[2000, 1000], ["failed", "success"], [["a"], []]]},
+            },
+            {
+                "schema": {
+                    "refId": "B",
+                    "name": "gitlab-commits",
+                    "fields": [
+                        {"name": "Time", "type": "time"},
+                        {"name": "gitlab-commits", "type": "number"},
+                    ],
+                },
+                "data": {"values": [[2000, 1000], [1, 1]]},
+            },
+        ]
+
+    def test_query_default_format(self):
+        """
+        Tests that the format of the datasource is used when a target does not choose one, and that
+        a target can still choose the legacy format.
+        """
+        datasource = GrafanaJSONDatasource(format="frames")
+        datasource.add_metrics(
+            "gitlab", {"commits": lambda *_: TimeSeries([[1, 1000]])}
+        )
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {"refId": "A", "target": "gitlab-commits"},
+                {
+                    "refId": "B",
+                    "target": "gitlab-commits",
+                    "payload": {"format": "legacy"},
+                },
+            ],
+        }
+
+        frame, legacy = datasource.query(data)
+        assert frame["data"]["values"] == [[1000], [1]]
+        assert legacy["datapoints"] == [[1, 1000]]
+
+    def test_query_invalid_format(self):
+        """
+        Makes a query with an unknown format and makes sure that the correct error is raised.
+        """
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab", {"commits": lambda *_: TimeSeries([[1, 1000]])}
+        )
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {"refId": "A", "target": "gitlab-commits", "payload": {"format": "csv"}}
+            ],
+        }
+
+        with pytest.raises(MetricsQueryInvalidValueError):
+            datasource.query(data)
+
+    def test_query_columns_sort_and_limit(self):
+        """
+        Makes a query with columns, sort, offset and limit in its payload and makes sure that
+        the table is projected, sorted and cut accordingly.
+        """
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab",
+            {
+                "pipelines": lambda *_: Table(
+                    [
+                        TableColumn("ID", TableColumnType.NUMERIC),
+                        TableColumn("Status", TableColumnType.STRING),
+                        TableColumn("Duration", TableColumnType.NUMERIC),
+                    ],
+                    [[1, "failed", 30], [2, "success", None], [3, "success", 10]],
+                )
+            },
+        )
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {
+                    "refId": "A",
+                    "target": "gitlab-pipelines",
+                    "payload": {
+                        "columns": ["Status", "ID"],
+                        "sort": "-Duration",
+                        "offset": 1,
+                        "limit": 2,
+                    },
+                }
+            ],
+        }
+
+        result = datasource.query(data)[0]
+        assert [column["text"] for column in result["columns"]] == ["Status", "ID"]
+        assert result["rows"] == [["failed", 1], ["success", 3]]
+
+    def test_query_invalid_columns(self):
+        """
+        Makes queries with malformed or unknown columns, sort and limit and makes sure that the correct
+        error is raised.
+        """
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab",
+            {
+                "pipelines": lambda *_: Table(
+                    [TableColumn("ID", TableColumnType.NUMERIC)], [[1]]
+                )
+            },
+        )
+
+        for payload in [
+            {"columns": "ID"},
+            {"columns": ["Author"]},
+            {"sort": "-Author"},
+            {"limit": -1},
+            {"offset": "2"},
+        ]:
+            data = {
+                "range": {
+                    "from": "2022-04-19T09:22:11.365Z",
+                    "to": "2022-04-26T09:22:11.365Z",
+                },
+                "targets": [
+                    {"refId": "A", "target": "gitlab-pipelines", "payload": payload}
+                ],
+            }
+
+            with pytest.raises(MetricsQueryInvalidValueError):
+                datasource.query(data)
+
+    def test_query_plans_shared_fetches(self):
+        """
+        Makes a query with a table and a timeseries of the same commits and makes sure that they
+        share one fetch, while targets with other upstream parameters get their own.
+        """
+        fetched = []
+
+        def fetch(payload, _):
+            fetched.append(payload.get("branch"))
+            return [1000, 2000]
+
+        def build(times, payload, _):
+            if payload.get("timeseries"):
+                return TimeSeries([[1, time] for time in times])
+            return Table(
+                [TableColumn("Time", TableColumnType.TIME)], [[t] for t in times]
+            )
+
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab",
+            {"commits": Metric(fetch, build, shape_keys=["timeseries"])},
+            workers=2,
+        )
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {
+                    "refId": "A",
+                    "target": "gitlab-commits",
+                    "payload": {"branch": "main", "timeseries": True},
+                },
+                {
+                    "refId": "B",
+                    "target": "gitlab-commits",
+                    "payload": {"branch": "main", "limit": 1},
+                },
+                {
+                    "refId": "C",
+                    "target": "gitlab-commits",
+                    "payload": {"branch": "develop"},
+                },
+            ],
+        }
+
+        timeseries, table, other = datasource.query(data)
+
+        assert sorted(fetched) == ["develop", "main"]
+        assert timeseries["datapoints"] == [[1, 1000], [1, 2000]]
+        assert table["rows"] == [[1000]]
+        assert other["rows"] == [[1000], [2000]]
+
+    def test_aquery_plans_shared_fetches(self):
+        """
+        Tests that the asynchronous query shares fetches in the same way.
+        """
+        fetched = []
+        metric = Metric(
+            lambda payload, _: fetched.append(1) or [1000],
+            lambda times, payload, _: TimeSeries([[1, time] for time in times]),
+            shape_keys=["timeseries"],
+        )
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics("gitlab", {"commits": metric})
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {"refId": "A", "target": "gitlab-commits"},
+                {
+                    "refId": "B",
+                    "target": "gitlab-commits",
+                    "payload": {"timeseries": True},
+                },
+            ],
+        }
+
+        result = asyncio.run(datasource.aquery(data))
+
+        assert fetched == [1]
+        assert [r["refId"] for r in result] == ["A", "B"]
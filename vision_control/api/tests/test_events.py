@@ -0,0 +1,124 @@
+from django.test import TestCase
+from django.core.cache import cache
+
+from datetime import datetime, timezone
+
+from .. import models
+from ..adapters.cache import RangeCache
+from ..adapters.events import GitLabEvents
+from ..adapters.mirror import GitLabMirror
+from ..adapters.identity import IdentityMap
+
+PROJECT = {"id": 1, "default_branch": "main", "web_url": "https://gitlab.se/company"}
+
+
+def synced(*entities):
+    for entity in entities:
+        models.SyncState.objects.create(
+            project_id=1, entity=entity, synced_at=datetime.now(timezone.utc)
+        )
+
+
+class GitLabEventsTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for GitLabEvents in adapters/events.py
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.cache = RangeCache(bucket=3600)
+        self.identities = IdentityMap(ttl=60)
+        self.events = GitLabEvents(self.cache, self.identities, GitLabMirror())
+
+    def test_push_invalidates_from_oldest_commit_and_mirrors_default_branch(self):
+        """
+        Tests that a push to the default branch marks commits as changed from the oldest pushed
+        commit, forgets the branches of the project and stores the commits in the mirror.
+        """
+        synced("commits")
+        self.identities._share(("branches", 1), ["main"])
+        commit = {
+            "id": "a1b2c3d",
+            "timestamp": "2022-04-26T08:00:00+02:00",
+            "author": {"name": "henak781"},
+            "message": "Add events",
+        }
+
+        self.events(
+            "push",
+            1,
+            {"ref": "refs/heads/main", "project": PROJECT, "commits": [commit]},
+        )
+        self.events(
+            "push",
+            1,
+            {
+                "ref": "refs/heads/dev",
+                "project": PROJECT,
+                "commits": [commit | {"id": "e4f5"}],
+            },
+        )
+
+        [(since, _)] = self.cache._changes(("commits", 1)).values()
+        assert since == datetime(2022, 4, 26, 6, tzinfo=timezone.utc).timestamp()
+        assert self.identities._shared(("branches", 1)) == (False, None)
+        assert list(models.Commit.objects.values_list("sha", flat=True)) == ["a1b2c3d"]
+
+    def test_issue_updates_mirror(self):
+        """
+        Tests that an issue event updates a mirrored issue, with the labels of the event.
+        """
+        synced("issues")
+        data = {
+            "project": PROJECT,
+            "object_attributes": {
+                "id": 11,
+                "title": "Fix the flaky test",
+                "state": "opened",
+                "updated_at": "2022-04-26 10:00:00 UTC",
+            },
+            "labels": [{"title": "bug"}],
+        }
+
+        self.events("issue", 1, data)
+        data["object_attributes"]["state"] = "closed"
+        self.events("issue", 1, data)
+
+        issue = models.Issue.objects.get()
+        assert (issue.state, issue.labels) == ("closed", ["bug"])
+        assert (
+            min(since for since, _ in self.cache._changes(("issues", 1)).values())
+            == datetime(2022, 4, 26, 10, tzinfo=timezone.utc).timestamp()
+        )
+
+    def test_unsynced_projects_and_unknown_events_are_not_mirrored(self):
+        """
+        Tests that events of projects that are not mirrored only invalidate the cache, and that
+        unknown kinds of events are ignored.
+        """
+        data = {
+            "project": PROJECT,
+            "object_attributes": {
+                "id": 6001,
+                "ref": "main",
+                "status": "success",
+                "sha": "a1b2c3d",
+                "created_at": "2022-04-26 09:00:00 UTC",
+            },
+            "user": {"name": "henak781"},
+        }
+
+        self.events("pipeline", 1, data)
+        self.events("wiki_page", 1, data)
+        self.events("store", 1, data)
+
+        assert not models.Pipeline.objects.exists()
+        assert self.cache._changes(("pipelines", 1))
+
+        synced("pipelines")
+        self.events("pipeline", 1, data)
+
+        assert (
+            models.Pipeline.objects.get().url
+            == "https://gitlab.se/company/-/pipelines/6001"
+        )
@@ -0,0 +1,91 @@
+from django.test import TestCase
+
+from freezegun import freeze_time
+
+from ..adapters.identity import IdentityMap
+from ..grafana_json_datasource.types import TimeSeries
+from ..grafana_json_datasource.datasource import GrafanaJSONDatasource
+
+
+class IdentityMapTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for IdentityMap in adapters/identity.py
+    """
+
+    def test_get_fetches_once_per_request(self):
+        """
+        Tests that an object is fetched once within a request and again in the next request.
+        """
+        fetched = []
+        identities = IdentityMap()
+
+        for _ in range(2):
+            with identities.request():
+                for _ in range(3):
+                    identities.get(
+                        ("project", 1), lambda: fetched.append(1) or "project"
+                    )
+
+        assert fetched == [1, 1]
+
+    def test_get_outside_request_always_fetches(self):
+        """
+        Tests that nothing is remembered outside of a request when there is no ttl.
+        """
+        fetched = []
+        identities = IdentityMap()
+
+        identities.get(("project", 1), lambda: fetched.append(1))
+        identities.get(("project", 1), lambda: fetched.append(1))
+
+        assert fetched == [1, 1]
+
+    def test_get_shares_between_requests_within_ttl(self):
+        """
+        Tests that objects are shared between requests until their ttl has passed.
+        """
+        fetched = []
+        identities = IdentityMap(ttl=60)
+
+        with freeze_time("2022-04-26 09:00:00") as frozen:
+            for seconds in (0, 30, 61):
+                frozen.tick(seconds)
+                with identities.request():
+                    identities.get(("user", 7), lambda: fetched.append(7))
+
+        assert fetched == [7, 7]
+
+    def test_datasource_workers_share_request(self):
+        """
+        Tests that targets run by the workers of the datasource use the identity map of their request.
+        """
+        fetched = []
+        identities = IdentityMap()
+        datasource = GrafanaJSONDatasource()
+        datasource.add_metrics(
+            "gitlab",
+            {
+                "issues": lambda *_: identities.get(
+                    ("project", 1), lambda: fetched.append(1) or TimeSeries([])
+                ),
+                "commits": lambda *_: identities.get(
+                    ("project", 1), lambda: fetched.append(1) or TimeSeries([])
+                ),
+            },
+            workers=2,
+        )
+        data = {
+            "range": {
+                "from": "2022-04-19T09:22:11.365Z",
+                "to": "2022-04-26T09:22:11.365Z",
+            },
+            "targets": [
+                {"refId": "A", "target": "gitlab-issues"},
+                {"refId": "B", "target": "gitlab-commits"},
+            ],
+        }
+
+        with identities.request():
+            datasource.query(data)
+
+        assert fetched == [1]
@@ -0,0 +1,196 @@
+from django.test import TestCase
+
+from freezegun import freeze_time
+
+from types import SimpleNamespace
+from datetime import datetime, timezone
+from collections import namedtuple
+
+from .. import models
+from ..adapters.mirror import GitLabMirror
+from ..adapters.gitlab import GitLabMetricsAdapter
+
+Interval = namedtuple("interval", "start end")
+
+
+class MockManager:
+    """
+    This class mocks a GitLab list endpoint and remembers the filters it was listed with.
+    """
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.filters = []
+
+    def list(self, iterator=False, **filters):
+        self.filters.append(filters)
+        return list(self.objects)
+
+
+def mock_gitlab():
+    pipeline = SimpleNamespace(
+        id=6001,
+        created_at="2022-04-26T09:00:00.000+00:00",
+        updated_at="2022-04-26T09:05:00.000+00:00",
+        ref="main",
+        status="success",
+        sha="a1b2c3d",
+        user={"name": "henak781"},
+        web_url="https://gitlab.se/company/6001",
+    )
+    issue = SimpleNamespace(
+        id=11,
+        title="Fix the flaky test",
+        labels=["bug", "ci"],
+        state="opened",
+        updated_at="2022-04-26T10:00:00.000+00:00",
+    )
+    project = SimpleNamespace(
+        commits=MockManager(
+            [
+                SimpleNamespace(
+                    id="a1b2c3d",
+                    committed_date="2022-04-26T08:00:00.000+00:00",
+                    author_name="henak781",
+                    message="Add mirror",
+                )
+            ]
+        ),
+        pipelines=MockManager([pipeline]),
+        issues=MockManager([issue]),
+        mergerequests=MockManager([]),
+        milestones=MockManager([]),
+    )
+
+    return SimpleNamespace(
+        project=project,
+        projects=SimpleNamespace(get=lambda project_id, lazy=False: project),
+    )
+
+
+class GitLabMirrorTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for GitLabMirror in adapters/mirror.py
+    """
+
+    def test_sync_stores_entities_and_high_water_marks(self):
+        """
+        Tests that a sync mirrors the entities of a project and that the next sync only
+        fetches what was updated after the high-water mark, minus the overlap.
+        """
+        gitlab = mock_gitlab()
+        mirror = GitLabMirror(gitlab, overlap=60, commit_window=0)
+
+        mirror.sync(1)
+        mirror.sync(1)
+
+        assert models.Pipeline.objects.count() == 1
+        assert models.Issue.objects.get().labels == ["bug", "ci"]
+        assert gitlab.project.pipelines.filters == [
+            {"updated_after": None},
+            {"updated_after": datetime(2022, 4, 26, 9, 4, tzinfo=timezone.utc)},
+        ]
+        assert gitlab.project.commits.filters[1] == {
+            "since": datetime(2022, 4, 26, 7, 59, tzinfo=timezone.utc)
+        }
+
+    @freeze_time("2022-04-28 08:00:00")
+    def test_sync_lists_recent_commits_again(self):
+        """
+        Tests that commits of the last commit_window seconds are listed on every sync, since they can be
+        pushed long after they were committed.
+        """
+        gitlab = mock_gitlab()
+        mirror = GitLabMirror(gitlab, overlap=60, commit_window=3 * 86400)
+
+        mirror.sync(1)
+        mirror.sync(1)
+
+        assert gitlab.project.commits.filters[1] == {
+            "since": datetime(2022, 4, 25, 8, 0, tzinfo=timezone.utc)
+        }
+
+    def test_adapter_answers_synced_projects_from_mirror(self):
+        """
+        Tests that the metrics adapter answers from the mirror once a project has been synced.
+        """
+        gitlab = mock_gitlab()
+        mirror = GitLabMirror(gitlab)
+        mirror.sync(1)
+
+        adapter = GitLabMetricsAdapter(gitlab, mirror=mirror)
+        interval = Interval(
+            datetime(2022, 4, 26, tzinfo=timezone.utc),
+            datetime(2022, 4, 27, tzinfo=timezone.utc),
+        )
+        listed = len(gitlab.project.pipelines.filters)
+
+        pipelines = adapter.pipelines({"project": 1}, interval)
+        issues = adapter.issues({"project": 1, "labels": ["bug"]}, interval)
+
+        assert len(gitlab.project.pipelines.filters) == listed
+        assert pipelines.rows[0][3:5] == [6001, "henak781"]
+        assert [row[0] for row in issues.rows] == [11]
+        assert adapter.issues({"project": 1, "labels": ["docs"]}, interval).rows == []
+
+    def test_pipelines_without_user_are_mirrored_with_commit_author(self):
+        """
+        Tests that pipelines without a user are mirrored with the author of their commit, taken from the
+        mirrored commits or looked up in GitLab, and that the adapter answers them without GitLab.
+        """
+        gitlab = mock_gitlab()
+        gitlab.project.pipelines.objects[0].user = None
+        gitlab.project.pipelines.objects.append(
+            SimpleNamespace(
+                id=6002,
+                created_at="2022-04-26T09:10:00.000+00:00",
+                updated_at="2022-04-26T09:15:00.000+00:00",
+                ref="feature",
+                status="success",
+                sha="e4f5a6b",
+                user=None,
+                web_url="https://gitlab.se/company/6002",
+            )
+        )
+        fetched = []
+        gitlab.project.commits.get = lambda sha: fetched.append(sha) or SimpleNamespace(
+            author_name="eliol123"
+        )
+        mirror = GitLabMirror(gitlab)
+        mirror.sync(1)
+
+        def resolve(project, shas):
+            raise AssertionError("Authors of mirrored pipelines are looked up")
+
+        adapter = GitLabMetricsAdapter(
+            gitlab,
+            mirror=mirror,
+            authors=SimpleNamespace(resolve=resolve),
+        )
+        interval = Interval(
+            datetime(2022, 4, 26, tzinfo=timezone.utc),
+            datetime(2022, 4, 27, tzinfo=timezone.utc),
+        )
+
+        pipelines = adapter.pipelines({"project": 1}, interval)
+
+        assert fetched == ["e4f5a6b"]
+        assert [row[3:5] for row in pipelines.rows] == [
+            [6002, "eliol123"],
+            [6001, "henak781"],
+        ]
+
+    def test_adapter_uses_gitlab_before_first_sync(self):
+        """
+        Tests that projects that have not been synced are still fetched from GitLab.
+        """
+        gitlab = mock_gitlab()
+        adapter = GitLabMetricsAdapter(gitlab, mirror=GitLabMirror(gitlab))
+        interval = Interval(
+            datetime(2022, 4, 26, tzinfo=timezone.utc),
+            datetime(2022, 4, 27, tzinfo=timezone.utc),
+        )
+
+        adapter.pipelines({"project": 1}, interval)
+
+        assert len(gitlab.project.pipelines.filters) == 1
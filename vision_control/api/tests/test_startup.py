@@ -0,0 +1,137 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from ..startup import Lazy, Startup, Waiting, serving, configuration_errors
+
+
+class StartupTests(SimpleTestCase):
+    """
+    The purpose of this class is to supply test cases for startup.py
+    """
+
+    def wait(self, startup, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not startup.ready and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    @override_settings(
+        GITLAB_URL="",
+        GITLAB_ACCESS_TOKEN="token",
+        GITLAB_DEFAULT_PROJECT=None,
+        GITLAB_SECRET_TOKEN="secret",
+    )
+    def test_configuration_errors(self):
+        """
+        Tests that every missing setting is reported.
+        """
+        errors = configuration_errors()
+
+        assert len(errors) == 2
+        assert errors[0].startswith("GITLAB_URL")
+        assert errors[1].startswith("GITLAB_DEFAULT_PROJECT")
+
+    @override_settings(
+        GITLAB_URL="http://gitlab",
+        GITLAB_ACCESS_TOKEN="token",
+        GITLAB_DEFAULT_PROJECT=1,
+        GITLAB_SECRET_TOKEN="",
+    )
+    def test_configuration_errors_without_secret_token(self):
+        """
+        Tests that the middleware does not start without a hook token, which is the case when it is unset
+        and SECRET_KEY is the default.
+        """
+        errors = configuration_errors()
+
+        assert len(errors) == 1
+        assert errors[0].startswith("GITLAB_SECRET_TOKEN")
+
+    def test_serving(self):
+        """
+        Tests that management commands other than runserver do not count as serving requests.
+        """
+        for argv, expected in [
+            (["/usr/bin/gunicorn", "vision_control.asgi:application"], True),
+            (["manage.py", "runserver", "0.0.0.0:8000"], True),
+            (["manage.py", "migrate"], False),
+            (["/venv/lib/python3.10/site-packages/django/__main__.py", "check"], False),
+        ]:
+            with mock.patch("sys.argv", argv):
+                assert serving() is expected
+
+    def test_lazy_creates_once(self):
+        """
+        Tests that the object behind Lazy is only created when first used, and only once.
+        """
+        created = []
+        lazy = Lazy(lambda: created.append(1) or "value")
+
+        assert created == []
+        assert lazy.upper() == "VALUE"
+        assert lazy.lower() == "value"
+        assert created == [1]
+
+    def test_background_check_is_retried(self):
+        """
+        Tests that a failing check is retried in the background until it passes, and that the middleware
+        is not ready until then.
+        """
+        failures = [RuntimeError("GitLab is unreachable")]
+
+        def check():
+            if failures:
+                raise failures.pop()
+
+        startup = Startup(retry=0.01)
+        startup.run("gitlab", check)
+        self.wait(startup)
+
+        assert startup.status() == {"ready": True, "checks": {"gitlab": "ok"}}
+
+    def test_status_of_pending_check(self):
+        """
+        Tests that a check that has not passed yet keeps the middleware from being ready.
+        """
+        startup = Startup(retry=60)
+        startup.run("ok", lambda: None)
+        startup.run("gitlab", lambda: 1 / 0)
+        self.wait(startup, timeout=0.1)
+
+        status = startup.status()
+        assert status["ready"] is False
+        assert status["checks"]["ok"] == "ok"
+        assert status["checks"]["gitlab"] != "ok"
+
+    def test_waiting_check_is_not_ready(self):
+        """
+        Tests that a check that is waiting reports why, is not ready, and is retried until it passes, also
+        when not running in the background.
+        """
+        waiting = [Waiting("configured by another worker")]
+
+        def check():
+            if waiting:
+                raise waiting.pop()
+
+        startup = Startup(background=False, retry=0.2)
+        startup.run("hooks", check)
+
+        assert startup.status() == {
+            "ready": False,
+            "checks": {"hooks": "configured by another worker"},
+        }
+        self.wait(startup)
+        assert startup.ready
+
+    def test_foreground_check_raises(self):
+        """
+        Tests that a failing check raises right away when not running in the background.
+        """
+        startup = Startup(background=False)
+
+        with self.assertRaises(ZeroDivisionError):
+            startup.run("gitlab", lambda: 1 / 0)
+
+        assert startup.status() == {"ready": False, "checks": {"gitlab": "pending"}}
@@ -4,7 +4,9 @@ from . import views
 
 urlpatterns = [
     path("", views.index),
+    path("health", views.health),
     path("search", views.search),
     path("query", views.query),
     path("variable", views.variable),
+    path("annotations", views.annotations),
 ]
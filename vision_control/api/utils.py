@@ -5,5 +5,35 @@ def unix_timestamp(date: datetime) -> int:
     return date.timestamp() * 1000
 
 
+def parse_datetime(value) -> datetime:
+    """Parses a timestamp from the GitLab API, passing through values that are already datetimes."""
+    if isinstance(value, datetime):
+        return value
+
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+
+
+def parse_hook_datetime(value):
+    """Parses a timestamp from a GitLab webhook. Depending on the event and GitLab version these look
+    like '2022-04-26T09:00:00Z', '2022-04-26 09:00:00 UTC' or '2022-04-26 09:00:00 +0200'."""
+    if not value:
+        return None
+
+    if value.endswith(" UTC"):
+        value = value[:-4] + " +0000"
+
+    for format in (
+        "%Y-%m-%dT%H:%M:%S%z",
+        "%Y-%m-%dT%H:%M:%S.%f%z",
+        "%Y-%m-%d %H:%M:%S %z",
+    ):
+        try:
+            return datetime.strptime(value, format)
+        except ValueError:
+            continue
+
+    raise ValueError(f"Unknown timestamp format: '{value}'")
+
+
 def maybe_pluralize(count: int, singular: str, plural: str):
     return singular if abs(count) == 1 else plural
@@ -6,8 +6,9 @@ import logging
 
 log = logging.getLogger(__name__)
 
-from .services import datasource
+from .services import startup, datasource, identities
 from .grafana_json_datasource import (
+    encode,
     PayloadInvalidError,
     ScopeDoesNotExistError,
     ProjectDoesNotExistError,
@@ -22,17 +23,23 @@ from .grafana_json_datasource import (
 
 
 @csrf_exempt
-def index(_):
+async def index(_):
     return HttpResponse(status=200)
 
 
+async def health(_):
+    """Whether the middleware is ready to answer queries, with the state of each startup check."""
+    status = startup.status()
+    return JsonResponse(status, status=200 if status["ready"] else 503)
+
+
 @csrf_exempt
-def search(_):
+async def search(_):
     return JsonResponse(datasource.search(), safe=False)
 
 
 @csrf_exempt
-def query(request):
+async def query(request):
     if body := request.body.decode("utf-8"):
         try:
             data = json.loads(body)
@@ -40,8 +47,9 @@ def query(request):
             return HttpResponse(err, status=400)
 
         try:
-            result = datasource.query(data)
-            return JsonResponse(result, safe=False)
+            with identities.request():
+                result = await datasource.aquery(data)
+            return HttpResponse(encode(result), content_type="application/json")
 
         except (
             ScopeDoesNotExistError,
@@ -62,10 +70,35 @@ def query(request):
 
 
 @csrf_exempt
-def variable(request):
+async def annotations(request):
+    if body := request.body.decode("utf-8"):
+        try:
+            data = json.loads(body)
+        except ValueError as err:
+            return HttpResponse(err, status=400)
+
+        try:
+            return JsonResponse(await datasource.aannotations(data), safe=False)
+
+        except (
+            ScopeDoesNotExistError,
+            MetricsDataKeyMissingError,
+            MetricsDataInvalidValueError,
+            MetricsQueryInvalidValueError,
+            CallbackDoesNotExistError,
+        ) as err:
+            log.warning(f"Annotation query returned {err.message}.")
+            return HttpResponse(err.message, status=400)
+
+    return JsonResponse([], safe=False)
+
+
+@csrf_exempt
+async def variable(request):
     if body := request.body.decode("utf-8"):
         data = json.loads(body)
-        return JsonResponse(datasource.variable(data), safe=False)
+        with identities.request():
+            return JsonResponse(await datasource.avariable(data), safe=False)
     else:
         log.info("No variables found, returning empty response.")
         return JsonResponse([], safe=False)
@@ -1,29 +1,108 @@
 from django.conf import settings
 
+import json
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 log = logging.getLogger(__name__)
 
-EVENTS = ["pipeline_events"]
+EVENTS = [
+    "pipeline_events",
+    "push_events",
+    "tag_push_events",
+    "merge_requests_events",
+    "issues_events",
+    "milestone_events",
+]
 
 
-def configure(gitlab):
+def configure(gitlab, workers: int = 1) -> bool:
+    """Makes sure that every project in GITLAB_PROJECT_IDS has a webhook to the middleware, configuring up
+    to workers projects at the same time. Returns False if another worker is configuring them.
+
+    Only one of the workers and nodes sharing the database does so at a time, holding a lease for at most
+    HOOKS_CONFIGURE_LEASE seconds, and hooks are only saved when their configuration changed."""
+    from django.db import DatabaseError
+
+    from .lease import acquire, release
+
     url = f"{settings.MIDDLEWARE_URL}/hooks/gitlab/"
+
+    try:
+        if not acquire("hooks.configure", settings.HOOKS_CONFIGURE_LEASE):
+            log.info("Hooks are being configured by another worker.")
+            return False
+    except DatabaseError as err:
+        raise DatabaseError(
+            f"Could not configure hooks, make sure that the database has been migrated: {err}"
+        ) from err
+
+    try:
+        _configure_all(gitlab, workers, url)
+    finally:
+        release("hooks.configure")
+
+    return True
+
+
+def _configure_all(gitlab, workers, url):
     log.info(f"Configuring hooks to {url}.")
 
-    for project_id in settings.GITLAB_PROJECT_IDS:
-        project = gitlab.projects.get(project_id)
-        hooks = project.hooks.list()
-
-        log.debug(f"Configuring hooks for '{project.name}' (#{project_id}).")
-
-        for hook in hooks:
-            if hook.url == url:
-                hook.token = settings.GITLAB_SECRET_TOKEN
-                hook.save()
-                break
-        else:
-            events = {f"{event}": 1 for event in EVENTS}
-            project.hooks.create(
-                {"url": url, "token": settings.GITLAB_SECRET_TOKEN} | events
+    events = {event: True for event in EVENTS}
+    digest = hashlib.sha256(
+        json.dumps(
+            {"url": url, "token": settings.GITLAB_SECRET_TOKEN} | events, sort_keys=True
+        ).encode("utf-8")
+    ).hexdigest()
+
+    if workers <= 1:
+        for project_id in settings.GITLAB_PROJECT_IDS:
+            _configure(gitlab, project_id, url, digest)
+        return
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="hooks") as executor:
+        # Consuming the results raises the first error, if any.
+        list(
+            executor.map(
+                lambda project_id: _configure(gitlab, project_id, url, digest),
+                settings.GITLAB_PROJECT_IDS,
             )
+        )
+
+
+def _configure(gitlab, project_id, url, digest):
+    from .models import ConfiguredHook
+
+    events = {event: True for event in EVENTS}
+    project = gitlab.projects.get(project_id, lazy=True)
+    hook = next(
+        (hook for hook in project.hooks.list(iterator=True) if hook.url == url),
+        None,
+    )
+    configured = ConfiguredHook.objects.filter(project_id=project_id).first()
+
+    if (
+        hook
+        and configured
+        and (configured.hook_id, configured.digest) == (hook.id, digest)
+        and all(getattr(hook, event, False) for event in EVENTS)
+    ):
+        log.debug(f"Hook of project #{project_id} is up to date.")
+        return
+
+    if hook:
+        log.debug(f"Updating hook of project #{project_id}.")
+        hook.token = settings.GITLAB_SECRET_TOKEN
+        for event in EVENTS:
+            setattr(hook, event, True)
+        hook.save()
+    else:
+        log.debug(f"Creating hook of project #{project_id}.")
+        hook = project.hooks.create(
+            {"url": url, "token": settings.GITLAB_SECRET_TOKEN} | events
+        )
+
+    ConfiguredHook.objects.update_or_create(
+        project_id=project_id, defaults={"hook_id": hook.id, "digest": digest}
+    )
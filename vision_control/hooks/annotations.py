@@ -0,0 +1,146 @@
+from django.conf import settings
+
+import inspect
+from datetime import datetime, timezone
+
+from .models import Annotation
+
+
+PIPELINE_STATUS_ALLOWED = ["failed", "canceled", "cancelled", "success"]
+
+PIPELINE_COLORS = {
+    "success": "#28a745",
+    "canceled": "#6c757d",
+    "cancelled": "#6c757d",
+    "failed": "#dc3545",
+}
+
+
+def pipeline_of(data):
+    """Project and pipeline id of a pipeline event."""
+    return data["project"]["id"], data["object_attributes"]["id"]
+
+
+def pipeline_annotation(data):
+    """Returns the Grafana annotation of a finished pipeline event, or None if the event is not one."""
+    try:
+        attributes = data["object_attributes"]
+        pipeline_status = attributes["status"]
+        pipeline_id = attributes["id"]
+
+        pipeline_created_at = attributes["created_at"]
+        if not pipeline_created_at:
+            return None
+
+        pipeline_finished_at = attributes["finished_at"]
+        if not pipeline_finished_at:
+            return None
+
+        try:
+            pipeline_created_at = datetime.strptime(
+                pipeline_created_at, "%Y-%m-%d %H:%M:%S %Z"
+            )
+        except ValueError:
+            return None
+
+        try:
+            pipeline_finished_at = datetime.strptime(
+                pipeline_finished_at, "%Y-%m-%d %H:%M:%S %Z"
+            )
+        except ValueError:
+            return None
+
+        ref = attributes["ref"]
+        project = data["project"]
+        project_id = project["id"]
+        project_web_url = project["web_url"]
+        user = data["user"]
+
+    except KeyError:
+        return None
+
+    user_fullname = user.get("name")
+    user_name = user.get("username")
+    user_avatar_url = user.get("avatar_url")
+    user_profile_url = f"{settings.GITLAB_URL}/{user_name}"
+
+    commit = data.get("commit")
+    commit_id = commit.get("id")
+    commit_title = commit.get("title")
+    committer_author = commit.get("author")
+
+    commit_url = commit.get("url")
+    pipeline_url = f"{project_web_url}/-/pipelines/{pipeline_id}"
+
+    if pipeline_status not in PIPELINE_STATUS_ALLOWED:
+        return None
+
+    html = inspect.cleandoc(
+        f"""
+        <div style="display: flex; margin-bottom: 8px;">
+            <div>
+                <img
+                src="{user_avatar_url}"
+                width="40px"
+                />
+            </div>
+            <div style="text-align: left; margin-left: 10px; width: 100%;">
+                <b>
+                    Pipeline <a target="_blank" href="{pipeline_url}">#{pipeline_id}</a>
+                </b>
+                </br>
+                Triggered by <a target="_blank" href="{user_profile_url}">{user_fullname}</a>
+            </div>
+            <div>
+                <span style="background-color: {PIPELINE_COLORS[pipeline_status]}; padding: 2px 3px; border-radius: 3px; color: white;">{pipeline_status}</span>
+            </div>
+        </div>
+        <div style="margin-bottom: 8px; border-top: 1px solid rgba(204, 204, 220, 0.07); padding-top: 5px;">
+            <b>Commit</b> <a target="_blank" href="{commit_url}">{commit_id}</a> by <a href="mailto:{committer_author.get("email")}">{committer_author.get("name")}</a></br>
+            {commit_title}
+        </div>
+    """
+    )
+
+    return {
+        "time": int(pipeline_created_at.timestamp()) * 1000,
+        "timeEnd": int(pipeline_finished_at.timestamp()) * 1000,
+        "tags": [
+            f"{project_id}",
+            "project",
+            "pipeline",
+            pipeline_status,
+            ref,
+            user_name,
+            user_fullname,
+        ],
+        "text": html,
+    }
+
+
+def store(data, annotation):
+    """Keeps the annotation of a pipeline event locally, replacing the earlier annotation of the pipeline."""
+    project_id, pipeline_id = pipeline_of(data)
+    attributes = data["object_attributes"]
+
+    Annotation.objects.update_or_create(
+        project_id=project_id,
+        pipeline_id=pipeline_id,
+        defaults={
+            "time": datetime.fromtimestamp(annotation["time"] / 1000, timezone.utc),
+            "time_end": datetime.fromtimestamp(
+                annotation["timeEnd"] / 1000, timezone.utc
+            ),
+            "ref": attributes["ref"],
+            "status": attributes["status"],
+            "tags": annotation["tags"],
+            "text": annotation["text"],
+        },
+    )
+
+
+def sent(project_id, pipeline_id):
+    """Records that the annotation of a pipeline has been created or updated in Grafana."""
+    Annotation.objects.filter(project_id=project_id, pipeline_id=pipeline_id).update(
+        sent=datetime.now(timezone.utc)
+    )
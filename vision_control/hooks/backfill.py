@@ -0,0 +1,179 @@
+from django.utils import timezone
+
+import time
+import logging
+import itertools
+from datetime import timedelta, timezone as tz
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+from api.utils import parse_datetime
+from api.adapters.gitlab import iterate
+
+from .models import Annotation, BackfillState, PipelineAnnotation
+from .annotations import sent, store, pipeline_annotation
+
+
+def hook_datetime(value):
+    """Formats a timestamp from the GitLab API the way pipeline webhooks do."""
+    if not value:
+        return None
+
+    return parse_datetime(value).astimezone(tz.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+
+
+class AnnotationBackfill:
+    """Creates the annotations of finished pipelines that were missed, for example while the middleware
+    was down or before a project was added.
+
+    Pipelines are listed newest first, up to page_concurrency pages at a time, and handled in batches of
+    batch pipelines: pipelines that already have an annotation (in Grafana, unless grafana is None) are
+    skipped, the details of the others are fetched by workers threads, and their annotations are kept locally and (unless grafana is None)
+    submitted to Grafana together, at most rate a second.
+
+    After every batch the time up to which pipelines have been backfilled is saved (BackfillState), and an
+    interrupted backfill continues from there.
+    """
+
+    def __init__(
+        self,
+        gitlab,
+        grafana,
+        page_concurrency: int = 4,
+        workers: int = 8,
+        batch: int = 50,
+        rate: float = 20,
+    ):
+        self.gitlab = gitlab
+        self.grafana = grafana
+        self.page_concurrency = page_concurrency
+        self.workers = workers
+        self.batch = batch
+        self.rate = rate
+
+    def run(self, project_id, since, restart: bool = False) -> int:
+        """Backfills the pipelines of a project updated after since and returns how many were annotated."""
+        state, _ = BackfillState.objects.get_or_create(project_id=project_id)
+        if restart:
+            state.updated_before = None
+
+        project = self.gitlab.projects.get(project_id)
+        pipelines = iterate(
+            project.pipelines,
+            self.page_concurrency,
+            scope="finished",
+            order_by="updated_at",
+            sort="desc",
+            updated_after=since,
+            # Pipelines updated in the same second as the checkpoint may not have been reached yet.
+            updated_before=state.updated_before
+            and state.updated_before + timedelta(seconds=1),
+        )
+
+        annotated = 0
+        with ThreadPoolExecutor(
+            self.workers, thread_name_prefix="backfill"
+        ) as executor:
+            while batch := list(itertools.islice(pipelines, self.batch)):
+                started = time.monotonic()
+                count, failed = self._backfill(project_id, project, batch, executor)
+                annotated += count
+
+                if failed:
+                    log.warning(
+                        f"{failed} annotations of project #{project_id} failed, stopping. The backfill "
+                        f"continues from {state.updated_before} when run again."
+                    )
+                    state.save()
+                    return annotated
+
+                state.updated_before = min(parse_datetime(p.updated_at) for p in batch)
+                state.save()
+
+                # Spread the annotations of a batch over at least count / rate seconds.
+                time.sleep(max(0, count / self.rate - (time.monotonic() - started)))
+
+        log.info(f"Backfilled {annotated} annotations of project #{project_id}.")
+        state.updated_before = None
+        state.finished = timezone.now()
+        state.save()
+        return annotated
+
+    def _backfill(self, project_id, project, batch, executor):
+        """Annotates a batch of pipelines and returns how many were annotated and how many failed."""
+        annotated = Annotation.objects.filter(
+            project_id=project_id, pipeline_id__in=[p.id for p in batch]
+        )
+        if self.grafana:
+            annotated = annotated.filter(sent__isnull=False)
+        known = set(annotated.values_list("pipeline_id", flat=True))
+
+        commits = {}
+        payloads = executor.map(
+            lambda pipeline: self._payload(project, pipeline.id, commits),
+            [pipeline for pipeline in batch if pipeline.id not in known],
+        )
+        annotations = {}
+        for payload in payloads:
+            if payload and (annotation := pipeline_annotation(payload)):
+                store(payload, annotation)
+                annotations[payload["object_attributes"]["id"]] = annotation
+
+        if not self.grafana:
+            return len(annotations), 0
+
+        results = self.grafana.annotate_many(list(annotations.values()))
+
+        failed = 0
+        for pipeline_id, result in zip(annotations, results):
+            if isinstance(result, Exception):
+                log.debug(f"Annotating pipeline #{pipeline_id} failed: {result}")
+                failed += 1
+                continue
+
+            PipelineAnnotation.objects.update_or_create(
+                project_id=project_id,
+                pipeline_id=pipeline_id,
+                defaults={"annotation_id": result},
+            )
+            sent(project_id, pipeline_id)
+
+        return len(annotations) - failed, failed
+
+    def _payload(self, project, pipeline_id, commits):
+        """Builds the webhook of a pipeline from the API, so that it is annotated like a live pipeline.
+        Returns None for pipelines that GitLab no longer has the details of."""
+        from gitlab.exceptions import GitlabGetError
+
+        try:
+            pipeline = project.pipelines.get(pipeline_id)
+
+            # Pipelines of the same commit share its details. Workers may fetch a commit twice, which is harmless.
+            if pipeline.sha not in commits:
+                commits[pipeline.sha] = project.commits.get(pipeline.sha)
+        except GitlabGetError as err:
+            # For example a commit that was garbage collected after a force push.
+            log.warning(f"Skipping pipeline #{pipeline_id}: {err}")
+            return None
+        commit = commits[pipeline.sha]
+
+        return {
+            "object_kind": "pipeline",
+            "object_attributes": {
+                "id": pipeline.id,
+                "status": pipeline.status,
+                "ref": pipeline.ref,
+                "created_at": hook_datetime(pipeline.created_at),
+                "finished_at": hook_datetime(pipeline.finished_at),
+            },
+            "project": {"id": project.id, "web_url": project.web_url},
+            # Pipelines that were triggered by a schedule or another pipeline may have no user.
+            "user": pipeline.user or {},
+            "commit": {
+                "id": commit.id,
+                "title": commit.title,
+                "url": commit.web_url,
+                "author": {"name": commit.author_name, "email": commit.author_email},
+            },
+        }
@@ -0,0 +1,125 @@
+import re
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+
+class GrafanaError(Exception):
+    """A request to Grafana failed or was not accepted, with the status Grafana answered with if any."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class GrafanaClient:
+    """Client for the HTTP API of Grafana, shared by everything that writes to Grafana.
+
+    Connections are kept alive in a pool of at most connections connections, which also bounds the number
+    of concurrent requests: further requests wait for a free connection. The client is thread-safe.
+
+    The latency of every endpoint is recorded (see stats), with ids in paths replaced by :id.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        token: str,
+        connections: int = 4,
+        connect_timeout: float = 5,
+        read_timeout: float = 30,
+    ):
+        self.url = url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.connections = connections
+        self.session = requests.Session()
+        self.session.headers.update(
+            {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        )
+        self.session.mount(
+            self.url,
+            HTTPAdapter(pool_connections=1, pool_maxsize=connections, pool_block=True),
+        )
+        self.executor = ThreadPoolExecutor(connections, thread_name_prefix="grafana")
+        self.lock = threading.Lock()
+        self.latencies = {}
+
+    def _record(self, endpoint, seconds, failed):
+        with self.lock:
+            calls, errors, total, longest = self.latencies.get(endpoint, (0, 0, 0, 0))
+            self.latencies[endpoint] = (
+                calls + 1,
+                errors + failed,
+                total + seconds,
+                max(longest, seconds),
+            )
+
+    def request(self, method: str, path: str, body=None):
+        """Makes a request to Grafana and returns the JSON it answered with, raising GrafanaError on failure."""
+        endpoint = f"{method} {re.sub(r'/[0-9]+', '/:id', path)}"
+        started = time.monotonic()
+        try:
+            response = self.session.request(
+                method, f"{self.url}{path}", json=body, timeout=self.timeout
+            )
+            if not response.ok:
+                raise GrafanaError(
+                    f"{endpoint} returned {response.status_code}: {response.text}",
+                    response.status_code,
+                )
+        except requests.RequestException as err:
+            self._record(endpoint, time.monotonic() - started, True)
+            raise GrafanaError(f"{endpoint} failed: {err}") from err
+        except GrafanaError:
+            self._record(endpoint, time.monotonic() - started, True)
+            raise
+
+        self._record(endpoint, time.monotonic() - started, False)
+        return response.json()
+
+    def annotate(self, annotation: dict, id: int = None) -> int:
+        """Creates an annotation, or updates the annotation with the given id, and returns its id. An
+        annotation that no longer exists is created again."""
+        if id:
+            try:
+                self.request("PATCH", f"/api/annotations/{id}", annotation)
+                return id
+            except GrafanaError as err:
+                if err.status != 404:
+                    raise
+
+        return self.request("POST", "/api/annotations", annotation)["id"]
+
+    def annotate_many(self, annotations: list, ids: list = None) -> list:
+        """Creates or updates (where ids has an id) annotations concurrently, over the pooled connections.
+        Returns the id of each annotation, or the GrafanaError it failed with."""
+
+        def annotate(annotation, id):
+            try:
+                return self.annotate(annotation, id)
+            except GrafanaError as err:
+                return err
+
+        return list(
+            self.executor.map(annotate, annotations, ids or [None] * len(annotations))
+        )
+
+    def stats(self) -> list:
+        """Calls, failed calls, mean and max latency in milliseconds of every endpoint that was called."""
+        with self.lock:
+            latencies = dict(self.latencies)
+
+        return [
+            (endpoint, calls, errors, total / calls * 1000, longest * 1000)
+            for endpoint, (calls, errors, total, longest) in sorted(latencies.items())
+        ]
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
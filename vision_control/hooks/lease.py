@@ -0,0 +1,38 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+import os
+import socket
+from datetime import timedelta
+
+from .models import Lease
+
+# Identifies this process among the workers and nodes sharing the database.
+HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire(name: str, ttl: int) -> bool:
+    """Takes the lease of name for ttl seconds, unless another process holds it. Returns whether it was
+    taken. The holder of a lease can take it again, for example to retry the task. A lease that is not
+    released, because its holder stopped, can be taken by others once it expires."""
+    now = timezone.now()
+    expires = now + timedelta(seconds=ttl)
+
+    try:
+        with transaction.atomic():
+            Lease.objects.create(name=name, holder=HOLDER, expires=expires)
+        return True
+    except IntegrityError:
+        pass
+
+    return bool(
+        Lease.objects.filter(Q(expires__lte=now) | Q(holder=HOLDER), name=name).update(
+            holder=HOLDER, expires=expires
+        )
+    )
+
+
+def release(name: str):
+    """Gives up the lease of name, if this process holds it."""
+    Lease.objects.filter(name=name, holder=HOLDER).delete()
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.utils import timezone
+from django.core.management.base import BaseCommand
+
+import logging
+from datetime import timedelta
+
+log = logging.getLogger(__name__)
+
+import gitlab as gitlab_api
+
+from ...grafana import GrafanaClient
+from ...backfill import AnnotationBackfill
+
+
+class Command(BaseCommand):
+    help = "Creates the missing annotations of past pipelines of the projects in GITLAB_PROJECT_IDS."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Backfill pipelines updated within this many days.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of pipelines whose details are fetched concurrently.",
+        )
+        parser.add_argument(
+            "--batch", type=int, default=50, help="Pipelines per batch."
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=20,
+            help="Maximum number of annotations created per second.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Start from the newest pipelines instead of the last checkpoint.",
+        )
+        parser.add_argument(
+            "--project",
+            type=int,
+            action="append",
+            help="Only backfill this project. Can be given more than once.",
+        )
+
+    def handle(self, *args, **options):
+        gitlab = gitlab_api.Gitlab(
+            url=settings.GITLAB_URL,
+            private_token=settings.GITLAB_ACCESS_TOKEN,
+            per_page=settings.GITLAB_PAGE_SIZE,
+        )
+        grafana = GrafanaClient(
+            settings.GRAFANA_URL,
+            settings.GRAFANA_ACCESS_TOKEN,
+            connections=settings.GRAFANA_CONNECTIONS,
+            connect_timeout=settings.GRAFANA_CONNECT_TIMEOUT,
+            read_timeout=settings.GRAFANA_READ_TIMEOUT,
+        )
+        backfill = AnnotationBackfill(
+            gitlab,
+            grafana if settings.HOOKS_GRAFANA_ANNOTATIONS else None,
+            page_concurrency=settings.GITLAB_PAGE_CONCURRENCY,
+            workers=options["workers"],
+            batch=options["batch"],
+            rate=options["rate"],
+        )
+        since = timezone.now() - timedelta(days=options["days"])
+
+        for project_id in options["project"] or settings.GITLAB_PROJECT_IDS:
+            try:
+                backfill.run(project_id, since, restart=options["restart"])
+            except gitlab_api.exceptions.GitlabError as err:
+                log.warning(f"Backfilling project #{project_id} failed: {err}")
+
+        grafana.close()
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+import logging
+
+log = logging.getLogger(__name__)
+
+from ...queue import HookQueue
+
+
+class Command(BaseCommand):
+    help = "Processes queued GitLab webhook events, for when HOOKS_WORKERS=0 in the middleware itself."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.HOOKS_WORKERS or 1,
+            help="Number of workers.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the events that are due and exit instead of waiting for more.",
+        )
+
+    def handle(self, *args, **options):
+        # Connects the receivers of gitlab_event, which update the cache and the mirror.
+        from api import services
+
+        queue = HookQueue(
+            services.grafana if settings.HOOKS_GRAFANA_ANNOTATIONS else None,
+            workers=options["workers"],
+            batch=settings.HOOKS_BATCH_SIZE,
+            retries=settings.HOOKS_RETRIES,
+            backoff=settings.HOOKS_BACKOFF,
+            retention=settings.HOOKS_RETENTION,
+            annotation_retention=settings.HOOKS_ANNOTATION_RETENTION,
+        )
+
+        if options["once"]:
+            while queue.drain():
+                pass
+            return
+
+        queue.start()
+        for thread in queue.threads:
+            thread.join()
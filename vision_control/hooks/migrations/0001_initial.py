@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="HookEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=32)),
+                ("payload", models.JSONField()),
+                ("state", models.CharField(default="pending", max_length=16)),
+                ("received", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.IntegerField(default=0)),
+                ("next_attempt", models.DateTimeField(auto_now_add=True)),
+                ("processed", models.DateTimeField(null=True)),
+                ("error", models.TextField(null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["state", "next_attempt"],
+                        name="hooks_hooke_state_596ebe_idx",
+                    )
+                ],
+            },
+        ),
+    ]
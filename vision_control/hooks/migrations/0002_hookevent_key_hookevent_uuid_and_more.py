@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hooks", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="hookevent",
+            name="key",
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="hookevent",
+            name="uuid",
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name="hookevent",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("state", "failed"), _negated=True),
+                fields=("key",),
+                name="unique_hook_event_key",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hooks", "0002_hookevent_key_hookevent_uuid_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PipelineAnnotation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField()),
+                ("pipeline_id", models.IntegerField()),
+                ("annotation_id", models.IntegerField()),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["updated"], name="hooks_pipel_updated_198d6d_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project_id", "pipeline_id"),
+                        name="unique_pipeline_annotation",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hooks", "0003_pipelineannotation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BackfillState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField(unique=True)),
+                ("updated_before", models.DateTimeField(null=True)),
+                ("finished", models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
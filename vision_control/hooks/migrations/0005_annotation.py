@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hooks", "0004_backfillstate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Annotation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField()),
+                ("pipeline_id", models.IntegerField()),
+                ("time", models.DateTimeField()),
+                ("time_end", models.DateTimeField()),
+                ("ref", models.CharField(max_length=255)),
+                ("status", models.CharField(max_length=32)),
+                ("tags", models.JSONField(default=list)),
+                ("text", models.TextField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["time"], name="hooks_annot_time_fbca30_idx"),
+                    models.Index(
+                        fields=["project_id", "time"],
+                        name="hooks_annot_project_48ccd6_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("project_id", "pipeline_id"), name="unique_annotation"
+                    )
+                ],
+            },
+        ),
+    ]
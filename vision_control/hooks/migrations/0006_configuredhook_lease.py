@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hooks", "0005_annotation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConfiguredHook",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("project_id", models.IntegerField(unique=True)),
+                ("hook_id", models.IntegerField()),
+                ("digest", models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Lease",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=64, unique=True)),
+                ("holder", models.CharField(max_length=255)),
+                ("expires", models.DateTimeField()),
+            ],
+        ),
+    ]
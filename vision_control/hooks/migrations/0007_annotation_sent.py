@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hooks", "0006_configuredhook_lease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="annotation",
+            name="sent",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
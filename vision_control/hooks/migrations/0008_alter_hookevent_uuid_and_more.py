@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hooks", "0007_annotation_sent"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="hookevent",
+            name="uuid",
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="hookevent",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("state", "failed"), _negated=True),
+                fields=("uuid",),
+                name="unique_hook_event_uuid",
+            ),
+        ),
+    ]
@@ -1,3 +1,112 @@
 from django.db import models
 
-# Create your models here.
+
+class HookEvent(models.Model):
+    """GitLab webhook event, queued until it has been processed (see hooks/queue.py).
+
+    Events are kept for a while after they have been processed, so that deliveries of the same event
+    (the same uuid, or the same key, see hooks.queue.idempotency_key) can be recognized and dropped.
+    """
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+    kind = models.CharField(max_length=32)
+    uuid = models.CharField(max_length=64, null=True)
+    key = models.CharField(max_length=255, null=True)
+    payload = models.JSONField()
+    state = models.CharField(max_length=16, default=PENDING)
+    received = models.DateTimeField(auto_now_add=True)
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(auto_now_add=True)
+    processed = models.DateTimeField(null=True)
+    error = models.TextField(null=True)
+
+    class Meta:
+        constraints = [
+            # Events that were given up on do not count, so that GitLab can deliver them again.
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=~models.Q(state="failed"),
+                name="unique_hook_event_key",
+            ),
+            models.UniqueConstraint(
+                fields=["uuid"],
+                condition=~models.Q(state="failed"),
+                name="unique_hook_event_uuid",
+            ),
+        ]
+        indexes = [models.Index(fields=["state", "next_attempt"])]
+
+
+class PipelineAnnotation(models.Model):
+    """Grafana annotation of a pipeline, so that later events of the pipeline update it."""
+
+    project_id = models.IntegerField()
+    pipeline_id = models.IntegerField()
+    annotation_id = models.IntegerField()
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project_id", "pipeline_id"], name="unique_pipeline_annotation"
+            )
+        ]
+        indexes = [models.Index(fields=["updated"])]
+
+
+class BackfillState(models.Model):
+    """Checkpoint of an annotation backfill of a project (see hooks/backfill.py): pipelines updated before
+    updated_before remain to be backfilled. None when no backfill is in progress."""
+
+    project_id = models.IntegerField(unique=True)
+    updated_before = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+
+
+class Annotation(models.Model):
+    """Annotation of a pipeline, kept locally and served by the /annotations endpoint of the datasource.
+
+    sent is when the annotation was last created or updated in Grafana. Unlike PipelineAnnotation, these
+    are never pruned, so they tell which pipelines were ever annotated in Grafana (see hooks/backfill.py).
+    """
+
+    project_id = models.IntegerField()
+    pipeline_id = models.IntegerField()
+    time = models.DateTimeField()
+    time_end = models.DateTimeField()
+    ref = models.CharField(max_length=255)
+    status = models.CharField(max_length=32)
+    tags = models.JSONField(default=list)
+    text = models.TextField()
+    sent = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project_id", "pipeline_id"], name="unique_annotation"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["time"]),
+            models.Index(fields=["project_id", "time"]),
+        ]
+
+
+class Lease(models.Model):
+    """Named lease held by one process (holder) until expires, see hooks/lease.py."""
+
+    name = models.CharField(max_length=64, unique=True)
+    holder = models.CharField(max_length=255)
+    expires = models.DateTimeField()
+
+
+class ConfiguredHook(models.Model):
+    """Webhook that was configured in a project, with a digest of its configuration. GitLab does not
+    return the token of a hook, so this is how a changed token is noticed."""
+
+    project_id = models.IntegerField(unique=True)
+    hook_id = models.IntegerField()
+    digest = models.CharField(max_length=64)
@@ -0,0 +1,261 @@
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+import logging
+import threading
+from datetime import timedelta
+
+log = logging.getLogger(__name__)
+
+from .models import HookEvent, PipelineAnnotation
+from .signals import gitlab_event
+from .annotations import sent, store, pipeline_of, pipeline_annotation
+
+
+def idempotency_key(kind, data):
+    """Identifies events that GitLab sends more than once with different uuids. Pipelines are reported
+    again for every job, so only the first event of each status of a pipeline is kept. A pipeline that is
+    retried finishes again at a later time, so its events are kept even if it ends in the same status."""
+    if kind == "pipeline":
+        try:
+            attributes = data["object_attributes"]
+            return (
+                f"pipeline:{data['project']['id']}:{attributes['id']}:{attributes['status']}:"
+                f"{attributes.get('finished_at')}"
+            )
+        except (KeyError, TypeError):
+            return None
+
+    return None
+
+
+def enqueue(kind, data, uuid=None):
+    """Stores a webhook event until it is processed. Returns None without storing it if the event has
+    already been received, see HookEvent."""
+    try:
+        with transaction.atomic():
+            return HookEvent.objects.create(
+                kind=kind, payload=data, uuid=uuid, key=idempotency_key(kind, data)
+            )
+    except IntegrityError:
+        return None
+
+
+def process(event):
+    """Processes a webhook event: sends it as gitlab_event and returns the Grafana annotation to create for
+    it, if any.
+
+    Receivers of gitlab_event that fail are logged, since retrying cannot fix them."""
+    data = event.payload
+    project_id = data.get("project_id") or (data.get("project") or {}).get("id")
+
+    for receiver, response in gitlab_event.send_robust(
+        sender=event.kind, project_id=project_id, data=data
+    ):
+        if isinstance(response, Exception):
+            log.error(f"Handling {event.kind} event with {receiver} failed: {response}")
+
+    if event.kind == "pipeline":
+        return pipeline_annotation(data)
+
+    return None
+
+
+class HookQueue:
+    """Drains the queue of webhook events (HookEvent) in the background.
+
+    Workers claim batches of due events, process them (see process) and retry failing events after
+    backoff seconds, twice as long after every further failure, until retries attempts have failed. The annotations
+    of a batch are created together, see GrafanaClient.annotate_many.
+
+    Annotations are kept locally (see hooks.models.Annotation) and, unless grafana is None, also created in
+    Grafana. Each pipeline has one annotation, which later events of the pipeline update (see
+    PipelineAnnotation).
+    Only the newest event of a pipeline within a batch is sent to Grafana. Pipelines are remembered for
+    annotation_retention seconds after their last event. Processed events and events that were given up on are kept
+    for retention seconds, to recognize later deliveries of the same event.
+
+    Events are claimed with a lease, so several workers (also in different processes) can drain the
+    same queue. An event whose worker died is processed again once its lease has expired.
+    """
+
+    def __init__(
+        self,
+        grafana,
+        workers: int = 2,
+        batch: int = 20,
+        retries: int = 5,
+        backoff: int = 2,
+        poll: float = 1,
+        lease: int = 300,
+        retention: int = 86400,
+        annotation_retention: int = 604800,
+    ):
+        self.grafana = grafana
+        self.workers = workers
+        self.batch = batch
+        self.retries = retries
+        self.backoff = backoff
+        self.poll = poll
+        self.lease = lease
+        self.retention = retention
+        self.annotation_retention = annotation_retention
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        """Starts the workers as daemon threads."""
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self.run, name=f"hooks-{index}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+        log.info(f"Started {self.workers} hook workers.")
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        """Drains the queue until stopped, waiting poll seconds whenever it is empty."""
+        while not self.stopped.is_set():
+            close_old_connections()
+            try:
+                drained = self.drain()
+            except Exception as err:
+                log.error(f"Draining the hook queue failed: {err}")
+                drained = 0
+
+            if not drained:
+                self.stopped.wait(self.poll)
+
+    def _claim(self):
+        now = timezone.now()
+        due = HookEvent.objects.filter(
+            state=HookEvent.PENDING, next_attempt__lte=now
+        ).order_by("next_attempt", "id")
+
+        claimed = []
+        for event in due[: self.batch]:
+            # Only one worker can move next_attempt on from the value it read.
+            lease = now + timedelta(seconds=self.lease)
+            if HookEvent.objects.filter(
+                id=event.id, next_attempt=event.next_attempt
+            ).update(next_attempt=lease):
+                event.next_attempt = lease
+                claimed.append(event)
+
+        return claimed
+
+    def drain(self) -> int:
+        """Processes one batch of due events and returns how many there were."""
+        events = self._claim()
+        if not events:
+            return 0
+
+        annotations = {}
+        for event in events:
+            event.attempts += 1
+            try:
+                annotation = process(event)
+            except Exception as err:
+                self._failed(event, err)
+                continue
+
+            if not annotation:
+                self._done(event)
+                continue
+
+            # Retried events can be claimed after newer events of the same pipeline.
+            pipeline = pipeline_of(event.payload)
+            latest = annotations.get(pipeline, (event, annotation))
+            if latest[0].id > event.id:
+                self._done(event)
+                continue
+            if latest[0] is not event:
+                self._done(latest[0])
+            annotations[pipeline] = (event, annotation)
+
+        for pipeline, (event, annotation) in list(annotations.items()):
+            try:
+                store(event.payload, annotation)
+            except Exception as err:
+                self._failed(event, err)
+                del annotations[pipeline]
+
+        if self.grafana:
+            self._annotate(annotations)
+        else:
+            for event, _ in annotations.values():
+                self._done(event)
+
+        HookEvent.objects.exclude(state=HookEvent.PENDING).filter(
+            received__lt=timezone.now() - timedelta(seconds=self.retention)
+        ).delete()
+        PipelineAnnotation.objects.filter(
+            updated__lt=timezone.now() - timedelta(seconds=self.annotation_retention)
+        ).delete()
+
+        return len(events)
+
+    def _annotate(self, annotations):
+        """Creates or updates the annotation of each pipeline, given as (project, pipeline) -> (event,
+        annotation)."""
+        known = {
+            (row.project_id, row.pipeline_id): row.annotation_id
+            for row in PipelineAnnotation.objects.filter(
+                pipeline_id__in=[pipeline for _, pipeline in annotations]
+            )
+        }
+
+        results = self.grafana.annotate_many(
+            [annotation for _, annotation in annotations.values()],
+            [known.get(pipeline) for pipeline in annotations],
+        )
+
+        for (pipeline, (event, _)), result in zip(annotations.items(), results):
+            if isinstance(result, Exception):
+                self._failed(event, result)
+                continue
+
+            PipelineAnnotation.objects.update_or_create(
+                project_id=pipeline[0],
+                pipeline_id=pipeline[1],
+                defaults={"annotation_id": result},
+            )
+            sent(*pipeline)
+            self._done(event)
+
+    def _done(self, event):
+        event.state = HookEvent.DONE
+        event.processed = timezone.now()
+        event.error = None
+        event.save()
+
+    def _failed(self, event, err):
+        event.error = str(err)
+        if event.attempts >= self.retries:
+            event.state = HookEvent.FAILED
+            log.error(
+                f"Giving up on {event.kind} event #{event.id} after {event.attempts} attempts: {err}"
+            )
+        else:
+            delay = self.backoff * 2 ** (event.attempts - 1)
+            event.next_attempt = timezone.now() + timedelta(seconds=delay)
+            log.warning(
+                f"Processing {event.kind} event #{event.id} failed, retrying in {delay}s: {err}"
+            )
+
+        event.save()
+
+    def stats(self) -> dict:
+        """Number of queued events, age in seconds of the oldest one and number of failed events."""
+        pending = HookEvent.objects.filter(state=HookEvent.PENDING)
+        oldest = pending.order_by("received").values_list("received", flat=True).first()
+
+        return {
+            "depth": pending.count(),
+            "age": (timezone.now() - oldest).total_seconds() if oldest else 0,
+            "failed": HookEvent.objects.filter(state=HookEvent.FAILED).count(),
+        }
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent for every authenticated GitLab webhook, with the object_kind of the event as sender and the
+# project_id and data (the body of the webhook) as arguments.
+gitlab_event = Signal()
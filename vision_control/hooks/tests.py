@@ -1,3 +1,570 @@
-from django.test import TestCase
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import timezone
 
-# Create your tests here.
+from unittest import mock
+from threading import Barrier
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone as tz
+
+from asgiref.sync import async_to_sync
+from freezegun import freeze_time
+
+from . import views, configure
+
+from .models import Annotation, BackfillState, HookEvent, Lease, PipelineAnnotation
+from .backfill import AnnotationBackfill
+from .queue import HookQueue, enqueue
+from .grafana import GrafanaClient, GrafanaError
+from .signals import gitlab_event
+
+PIPELINE = {
+    "object_kind": "pipeline",
+    "object_attributes": {
+        "id": 6001,
+        "status": "success",
+        "ref": "main",
+        "created_at": "2022-04-26 09:00:00 UTC",
+        "finished_at": "2022-04-26 09:05:00 UTC",
+    },
+    "project": {"id": 1, "web_url": "https://gitlab.se/company"},
+    "user": {"name": "Henrik", "username": "henak781", "avatar_url": ""},
+    "commit": {"id": "a1b2c3d", "title": "Add queue", "url": "", "author": {}},
+}
+
+
+class MockGrafana:
+    """
+    This class mocks GrafanaClient, accepting or failing annotations in turn as given.
+    """
+
+    def __init__(self, *accepted):
+        self.accepted = list(accepted)
+        self.annotations = []
+        self.ids = []
+
+    def annotate_many(self, annotations, ids=None):
+        results = []
+        for annotation, id in zip(annotations, ids or [None] * len(annotations)):
+            self.annotations.append(annotation)
+            self.ids.append(id)
+            accepted = self.accepted.pop(0)
+            results.append(
+                (id or len(self.annotations)) if accepted else GrafanaError("500")
+            )
+
+        return results
+
+
+def response(status_code, body=None):
+    return SimpleNamespace(
+        ok=status_code < 400, status_code=status_code, text="", json=lambda: body
+    )
+
+
+@override_settings(GITLAB_SECRET_TOKEN="secret", GRAFANA_URL="http://grafana")
+class HookQueueTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for the webhook queue in hooks/queue.py
+    """
+
+    def test_view_queues_events(self):
+        """
+        Tests that the webhook view only queues events, without processing them.
+        """
+        received = []
+        receiver = lambda sender, **kwargs: received.append(sender)
+        gitlab_event.connect(receiver)
+        request = RequestFactory().post(
+            "/hooks/gitlab/",
+            PIPELINE,
+            content_type="application/json",
+            HTTP_X_GITLAB_TOKEN="secret",
+        )
+
+        response = async_to_sync(views.gitlab)(request)
+
+        assert response.status_code == 200
+        assert HookEvent.objects.get().kind == "pipeline"
+        assert received == []
+        gitlab_event.disconnect(receiver)
+
+    def test_duplicate_events_are_dropped(self):
+        """
+        Tests that events with a known uuid, and pipeline events of a known pipeline and status, are
+        dropped, unless the earlier event was given up on.
+        """
+        running = PIPELINE | {
+            "object_attributes": PIPELINE["object_attributes"] | {"status": "running"}
+        }
+        request = lambda data, uuid: RequestFactory().post(
+            "/hooks/gitlab/",
+            data,
+            content_type="application/json",
+            HTTP_X_GITLAB_TOKEN="secret",
+            HTTP_X_GITLAB_EVENT_UUID=uuid,
+        )
+
+        for data, uuid in [
+            (running, "a"),
+            (running, "a"),
+            (PIPELINE, "b"),
+            (PIPELINE, "c"),
+            (running, "d"),
+        ]:
+            assert async_to_sync(views.gitlab)(request(data, uuid)).status_code == 200
+
+        assert list(HookEvent.objects.values_list("uuid", flat=True)) == ["a", "b"]
+
+        HookEvent.objects.filter(uuid="b").update(state=HookEvent.FAILED)
+        assert enqueue("pipeline", PIPELINE, "e")
+        assert not enqueue("push", {}, "e")
+
+    def test_failed_event_is_delivered_again(self):
+        """
+        Tests that an event that was given up on is stored again when GitLab redelivers it with the same
+        uuid.
+        """
+        assert enqueue("push", {}, "a")
+        HookEvent.objects.filter(uuid="a").update(state=HookEvent.FAILED)
+
+        assert enqueue("push", {}, "a")
+        assert not enqueue("push", {}, "a")
+        assert HookEvent.objects.filter(uuid="a").count() == 2
+
+    def test_rerun_pipeline_with_same_status_is_kept(self):
+        """
+        Tests that a pipeline that is retried and ends in the same status again is not dropped as a
+        duplicate, and that its annotation is updated with the new end time.
+        """
+        rerun = PIPELINE | {
+            "object_attributes": PIPELINE["object_attributes"]
+            | {"finished_at": "2022-04-26 10:30:00 UTC"}
+        }
+        grafana = MockGrafana(True, True)
+        queue = HookQueue(grafana)
+
+        assert enqueue("pipeline", PIPELINE, "a")
+        queue.drain()
+        assert not enqueue("pipeline", PIPELINE, "b")
+        assert enqueue("pipeline", rerun, "c")
+        queue.drain()
+
+        assert grafana.ids == [None, 1]
+        assert grafana.annotations[1]["timeEnd"] == int(
+            datetime(2022, 4, 26, 10, 30, tzinfo=tz.utc).timestamp() * 1000
+        )
+
+    def test_drain_annotates_and_sends_events(self):
+        """
+        Tests that draining the queue sends events as gitlab_event and annotates pipelines in Grafana.
+        """
+        received = []
+        receiver = lambda sender, **kwargs: received.append(sender)
+        gitlab_event.connect(receiver)
+        grafana = MockGrafana(True)
+        enqueue("pipeline", PIPELINE)
+        enqueue("push", {"project_id": 1})
+
+        assert HookQueue(grafana).drain() == 2
+        assert HookQueue(grafana).drain() == 0
+
+        assert received == ["pipeline", "push"]
+        assert grafana.annotations[0]["tags"][:3] == ["1", "project", "pipeline"]
+        assert HookEvent.objects.filter(state=HookEvent.DONE).count() == 2
+        gitlab_event.disconnect(receiver)
+
+    def test_later_events_update_the_annotation_of_a_pipeline(self):
+        """
+        Tests that only the newest event of a pipeline in a batch is annotated, and that events of a
+        pipeline in later batches update its annotation.
+        """
+        failed = PIPELINE | {
+            "object_attributes": PIPELINE["object_attributes"] | {"status": "failed"}
+        }
+        canceled = PIPELINE | {
+            "object_attributes": PIPELINE["object_attributes"] | {"status": "canceled"}
+        }
+        grafana = MockGrafana(True, True)
+        queue = HookQueue(grafana)
+
+        enqueue("pipeline", failed)
+        enqueue("pipeline", PIPELINE)
+        queue.drain()
+        enqueue("pipeline", canceled)
+        queue.drain()
+
+        assert [annotation["tags"][3] for annotation in grafana.annotations] == [
+            "success",
+            "canceled",
+        ]
+        assert grafana.ids == [None, 1]
+        assert PipelineAnnotation.objects.get().annotation_id == 1
+        assert HookEvent.objects.filter(state=HookEvent.DONE).count() == 3
+
+    def test_annotations_are_kept_locally(self):
+        """
+        Tests that annotations are kept locally, and only kept locally when there is no Grafana client.
+        """
+        enqueue("pipeline", PIPELINE)
+
+        assert HookQueue(None).drain() == 1
+
+        annotation = Annotation.objects.get()
+        assert (annotation.pipeline_id, annotation.status) == (6001, "success")
+        assert annotation.time_end - annotation.time == timedelta(minutes=5)
+        assert HookEvent.objects.get().state == HookEvent.DONE
+        assert not PipelineAnnotation.objects.exists()
+
+    def test_failures_are_retried_with_backoff(self):
+        """
+        Tests that events are retried after backoff seconds, doubled after every failure, and given up on
+        after retries attempts.
+        """
+        queue = HookQueue(MockGrafana(False, False, False), retries=3, backoff=10)
+        enqueue("pipeline", PIPELINE)
+
+        with freeze_time(timezone.now()) as frozen:
+            assert queue.drain() == 1
+            assert queue.drain() == 0
+            assert queue.stats()["depth"] == 1
+
+            frozen.tick(timedelta(seconds=10))
+            assert queue.drain() == 1
+
+            frozen.tick(timedelta(seconds=10))
+            assert queue.drain() == 0
+
+            frozen.tick(timedelta(seconds=10))
+            assert queue.drain() == 1
+
+        event = HookEvent.objects.get()
+        assert (event.state, event.attempts) == (HookEvent.FAILED, 3)
+        assert not PipelineAnnotation.objects.exists()
+        assert queue.stats() == {"depth": 0, "age": 0, "failed": 1}
+
+
+class GrafanaClientTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for GrafanaClient in hooks/grafana.py
+    """
+
+    def test_request_records_latency_per_endpoint(self):
+        """
+        Tests that requests are recorded per endpoint, with ids left out, and that failures raise
+        GrafanaError.
+        """
+        client = GrafanaClient("http://grafana/", "token")
+        answers = [response(200, {"id": 1}), response(200, {}), response(500)]
+
+        with mock.patch.object(
+            client.session, "request", side_effect=lambda *_, **__: answers.pop(0)
+        ) as request:
+            assert client.annotate({"text": "a"}) == 1
+            client.request("PATCH", "/api/annotations/1", {"text": "b"})
+            with self.assertRaises(GrafanaError):
+                client.request("PATCH", "/api/annotations/2", {"text": "c"})
+
+        assert request.call_args_list[0] == mock.call(
+            "POST",
+            "http://grafana/api/annotations",
+            json={"text": "a"},
+            timeout=(5, 30),
+        )
+        assert [stats[:3] for stats in client.stats()] == [
+            ("PATCH /api/annotations/:id", 2, 1),
+            ("POST /api/annotations", 1, 0),
+        ]
+
+    def test_annotate_updates_or_recreates_annotations(self):
+        """
+        Tests that annotations with an id are updated, and created again if Grafana no longer has them.
+        """
+        client = GrafanaClient("http://grafana", "token")
+        answers = [response(200, {}), response(404), response(200, {"id": 8})]
+
+        with mock.patch.object(
+            client.session, "request", side_effect=lambda *_, **__: answers.pop(0)
+        ) as request:
+            assert client.annotate({"text": "a"}, 7) == 7
+            assert client.annotate({"text": "a"}, 7) == 8
+
+        assert [call.args for call in request.call_args_list] == [
+            ("PATCH", "http://grafana/api/annotations/7"),
+            ("PATCH", "http://grafana/api/annotations/7"),
+            ("POST", "http://grafana/api/annotations"),
+        ]
+
+    def test_annotate_many_is_concurrent_and_returns_errors(self):
+        """
+        Tests that annotations are created concurrently, over at most connections connections, and that
+        failed annotations are returned as errors instead of raised.
+        """
+        client = GrafanaClient("http://grafana", "token", connections=2)
+        barrier = Barrier(2, timeout=5)
+
+        def request(method, url, json, timeout):
+            barrier.wait()
+            return response(200 if json["ok"] else 500, {"id": json["id"]})
+
+        with mock.patch.object(client.session, "request", side_effect=request):
+            results = client.annotate_many(
+                [{"id": 1, "ok": True}, {"id": 2, "ok": False}]
+            )
+
+        assert results[0] == 1
+        assert isinstance(results[1], GrafanaError)
+        client.close()
+
+
+class MockPipelines:
+    """
+    This class mocks the pipelines of a GitLab project and remembers the filters they were listed with.
+    """
+
+    def __init__(self, count):
+        self.pipelines = {
+            id: SimpleNamespace(
+                id=id,
+                status="success",
+                ref="main",
+                sha="a1b2c3d",
+                created_at=f"2022-04-26T09:{id:02}:00.000+00:00",
+                updated_at=f"2022-04-26T10:{id:02}:00.000+00:00",
+                finished_at=f"2022-04-26T10:{id:02}:00.000+00:00",
+                user={"name": "Henrik", "username": "henak781", "avatar_url": ""},
+            )
+            for id in range(count, 0, -1)
+        }
+        self.filters = []
+
+    def list(self, iterator=False, **filters):
+        self.filters.append(filters)
+        return list(self.pipelines.values())
+
+    def get(self, id):
+        return self.pipelines[id]
+
+
+class AnnotationBackfillTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for AnnotationBackfill in hooks/backfill.py
+    """
+
+    def test_backfill_is_resumable_and_skips_annotated_pipelines(self):
+        """
+        Tests that a backfill stops at a failed batch, keeps a checkpoint, and continues from it
+        without annotating pipelines again.
+        """
+        commit = SimpleNamespace(
+            id="a1b2c3d",
+            title="Add backfill",
+            web_url="",
+            author_name="Henrik",
+            author_email="",
+        )
+        project = SimpleNamespace(
+            id=1,
+            web_url="https://gitlab.se/company",
+            pipelines=MockPipelines(5),
+            commits=SimpleNamespace(get=lambda sha: commit),
+        )
+        gitlab = SimpleNamespace(
+            projects=SimpleNamespace(get=lambda project_id: project)
+        )
+        grafana = MockGrafana(True, True, False, True, True, True)
+        backfill = AnnotationBackfill(gitlab, grafana, batch=2, rate=1000)
+        since = datetime(2022, 4, 1, tzinfo=tz.utc)
+
+        assert backfill.run(1, since) == 3
+        assert BackfillState.objects.get().updated_before == datetime(
+            2022, 4, 26, 10, 4, tzinfo=tz.utc
+        )
+
+        assert backfill.run(1, since) == 2
+        assert project.pipelines.filters[1]["updated_before"] == datetime(
+            2022, 4, 26, 10, 4, 1, tzinfo=tz.utc
+        )
+        assert sorted(
+            PipelineAnnotation.objects.values_list("pipeline_id", flat=True)
+        ) == [1, 2, 3, 4, 5]
+        assert grafana.annotations[0]["time"] == int(
+            datetime(2022, 4, 26, 9, 5).timestamp() * 1000
+        )
+        assert BackfillState.objects.get().updated_before is None
+
+    def test_backfill_skips_pruned_and_missing_pipelines(self):
+        """
+        Tests that pipelines annotated in Grafana are skipped after their PipelineAnnotation was pruned,
+        and that pipelines whose commit GitLab no longer has are skipped instead of stopping the backfill.
+        """
+        from gitlab.exceptions import GitlabGetError
+
+        commit = SimpleNamespace(
+            id="a1b2c3d",
+            title="Add backfill",
+            web_url="",
+            author_name="Henrik",
+            author_email="",
+        )
+
+        def get_commit(sha):
+            if sha != commit.id:
+                raise GitlabGetError("404 Commit Not Found", 404)
+            return commit
+
+        project = SimpleNamespace(
+            id=1,
+            web_url="https://gitlab.se/company",
+            pipelines=MockPipelines(3),
+            commits=SimpleNamespace(get=get_commit),
+        )
+        project.pipelines.pipelines[2].sha = "e4f5a6b"
+        gitlab = SimpleNamespace(
+            projects=SimpleNamespace(get=lambda project_id: project)
+        )
+        Annotation.objects.create(
+            project_id=1,
+            pipeline_id=3,
+            time=timezone.now(),
+            time_end=timezone.now(),
+            ref="main",
+            status="success",
+            text="",
+            sent=timezone.now(),
+        )
+        grafana = MockGrafana(True)
+
+        backfill = AnnotationBackfill(gitlab, grafana, rate=1000)
+
+        assert backfill.run(1, datetime(2022, 4, 1, tzinfo=tz.utc)) == 1
+        assert list(
+            PipelineAnnotation.objects.values_list("pipeline_id", flat=True)
+        ) == [1]
+        assert Annotation.objects.get(pipeline_id=1).sent is not None
+
+    def test_backfill_pipeline_without_user(self):
+        """
+        Tests that pipelines without a user are annotated.
+        """
+        commit = SimpleNamespace(
+            id="a1b2c3d",
+            title="Add backfill",
+            web_url="",
+            author_name="Henrik",
+            author_email="",
+        )
+        project = SimpleNamespace(
+            id=1,
+            web_url="https://gitlab.se/company",
+            pipelines=MockPipelines(1),
+            commits=SimpleNamespace(get=lambda sha: commit),
+        )
+        project.pipelines.pipelines[1].user = None
+        gitlab = SimpleNamespace(
+            projects=SimpleNamespace(get=lambda project_id: project)
+        )
+        grafana = MockGrafana(True)
+
+        backfill = AnnotationBackfill(gitlab, grafana, rate=1000)
+
+        assert backfill.run(1, datetime(2022, 4, 1, tzinfo=tz.utc)) == 1
+        assert len(grafana.annotations) == 1
+
+
+class MockHooks:
+    """
+    This class mocks the hooks of a GitLab project and counts how often they are saved.
+    """
+
+    def __init__(self):
+        self.hooks = []
+        self.saved = 0
+
+    def list(self, iterator=False):
+        return list(self.hooks)
+
+    def create(self, data):
+        hook = SimpleNamespace(id=len(self.hooks) + 1, save=self.save, **data)
+        self.hooks.append(hook)
+        self.saved += 1
+        return hook
+
+    def save(self):
+        self.saved += 1
+
+
+@override_settings(
+    GITLAB_PROJECT_IDS=[1],
+    MIDDLEWARE_URL="http://middleware",
+    GITLAB_SECRET_TOKEN="secret",
+    HOOKS_CONFIGURE_LEASE=300,
+)
+class ConfigureTests(TestCase):
+    """
+    The purpose of this class is to supply test cases for configure in hooks/__init__.py
+    """
+
+    def test_configure_only_saves_changes(self):
+        """
+        Tests that hooks are only saved again when their configuration changed.
+        """
+        hooks = MockHooks()
+        project = SimpleNamespace(hooks=hooks)
+        gitlab = SimpleNamespace(
+            projects=SimpleNamespace(get=lambda project_id, lazy=False: project)
+        )
+
+        with freeze_time(timezone.now()) as frozen:
+            configure(gitlab)
+            configure(gitlab)
+            assert hooks.saved == 1
+            assert hooks.hooks[0].url == "http://middleware/hooks/gitlab/"
+
+            frozen.tick(timedelta(seconds=300))
+            configure(gitlab)
+            assert hooks.saved == 1
+
+            frozen.tick(timedelta(seconds=300))
+            with override_settings(GITLAB_SECRET_TOKEN="rotated"):
+                configure(gitlab)
+
+        assert hooks.saved == 2
+        assert hooks.hooks[0].token == "rotated"
+        assert len(hooks.hooks) == 1
+
+    def test_configure_raises_database_errors(self):
+        """
+        Tests that configure fails, so that it is retried, when the lease cannot be taken.
+        """
+        from django.db import DatabaseError
+
+        with mock.patch(
+            "hooks.lease.acquire", side_effect=DatabaseError("no such table")
+        ):
+            with self.assertRaises(DatabaseError):
+                configure(SimpleNamespace())
+
+    def test_configure_waits_for_other_worker_and_releases_lease(self):
+        """
+        Tests that hooks are not configured while another worker holds the lease, and that the lease is
+        released once they have been configured.
+        """
+        hooks = MockHooks()
+        project = SimpleNamespace(hooks=hooks)
+        gitlab = SimpleNamespace(
+            projects=SimpleNamespace(get=lambda project_id, lazy=False: project)
+        )
+        Lease.objects.create(
+            name="hooks.configure",
+            holder="other:1",
+            expires=timezone.now() + timedelta(seconds=300),
+        )
+
+        assert configure(gitlab) is False
+        assert hooks.saved == 0
+
+        Lease.objects.all().delete()
+
+        assert configure(gitlab) is True
+        assert hooks.saved == 1
+        assert not Lease.objects.exists()
@@ -10,11 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import hmac
 import enum
-import uuid
 from pathlib import Path
 
-import git
 import environ
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -23,19 +22,27 @@ BASE_DIR = Path(__file__).resolve().parent.parent.parent
 environment = environ.Env()
 environ.Env.read_env(BASE_DIR / ".env")
 
+# The revision is stamped into REVISION at build time (git describe --always --tags --dirty > REVISION).
+# Without a stamp it is read from the repository, which is slower.
 GIT_REVISION = environment.str("GIT_REVISION", default=None)
 if not GIT_REVISION:
     try:
-        repository = git.repo.Repo(BASE_DIR.parent)
-        GIT_REVISION = repository.git.describe("--always", "--tags", "--dirty")
-    except git.exc.InvalidGitRepositoryError:
-        GIT_REVISION = "(unknown)"
+        GIT_REVISION = (BASE_DIR / "REVISION").read_text().strip()
+    except OSError:
+        import git
+
+        try:
+            repository = git.repo.Repo(BASE_DIR.parent)
+            GIT_REVISION = repository.git.describe("--always", "--tags", "--dirty")
+        except git.exc.InvalidGitRepositoryError:
+            GIT_REVISION = "(unknown)"
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = environment.str(
-    "SECRET_KEY",
-    default="django-insecure-(19l&*=hkp8pbfiqh1%s839xzv+5y60=n7de&f*0zx=0!%%#fy",
+# Committed to the repository, so nothing secret may be derived from it.
+INSECURE_SECRET_KEY = (
+    "django-insecure-(19l&*=hkp8pbfiqh1%s839xzv+5y60=n7de&f*0zx=0!%%#fy"
 )
+SECRET_KEY = environment.str("SECRET_KEY", default=INSECURE_SECRET_KEY)
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = environment.bool("DEBUG", default=True)
@@ -94,6 +101,12 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {"default": environment.cache("CACHE_URL", default="locmemcache://")}
+CACHES["default"].setdefault("OPTIONS", {}).setdefault("MAX_ENTRIES", 100000)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -198,6 +211,53 @@ MIDDLEWARE_URL = environment("MIDDLEWARE_URL", default="")
 GITLAB_ACCESS_TOKEN = environment("GITLAB_ACCESS_TOKEN", default="")
 GITLAB_PROJECT_IDS = environment.list("GITLAB_PROJECT_IDS", default="", cast=int)
 GITLAB_DEFAULT_PROJECT = environment.int("GITLAB_DEFAULT_PROJECT", default=0)
+GITLAB_PAGE_SIZE = environment.int("GITLAB_PAGE_SIZE", default=100)
+GITLAB_PAGE_CONCURRENCY = environment.int("GITLAB_PAGE_CONCURRENCY", default=4)
+GITLAB_QUERY_WORKERS = environment.int("GITLAB_QUERY_WORKERS", default=6)
+GITLAB_ASYNC_QUERY_WORKERS = environment.int("GITLAB_ASYNC_QUERY_WORKERS", default=32)
+DATASOURCE_INTERVAL_ALIGNMENT = environment.int(
+    "DATASOURCE_INTERVAL_ALIGNMENT", default=10
+)
+DATASOURCE_FORMAT = environment.str("DATASOURCE_FORMAT", default="legacy")
+GITLAB_CACHE_BUCKET = environment.int("GITLAB_CACHE_BUCKET", default=3600)
+GITLAB_CACHE_TTL = environment.int("GITLAB_CACHE_TTL", default=86400)
+GITLAB_CACHE_HOOKS = environment.bool("GITLAB_CACHE_HOOKS", default=False)
+GITLAB_AUTHOR_WORKERS = environment.int("GITLAB_AUTHOR_WORKERS", default=8)
+GITLAB_USERS_GROUP = environment.int("GITLAB_USERS_GROUP", default=0)
+GITLAB_USERS_WORKERS = environment.int("GITLAB_USERS_WORKERS", default=16)
+GITLAB_USERS_PROFILE_TTL = environment.int("GITLAB_USERS_PROFILE_TTL", default=3600)
+GITLAB_USERS_STATUS_TTL = environment.int("GITLAB_USERS_STATUS_TTL", default=60)
+GITLAB_IDENTITY_TTL = environment.int("GITLAB_IDENTITY_TTL", default=0)
+GITLAB_MIRROR = environment.bool("GITLAB_MIRROR", default=False)
+GITLAB_MIRROR_INTERVAL = environment.int("GITLAB_MIRROR_INTERVAL", default=60)
+GITLAB_MIRROR_OVERLAP = environment.int("GITLAB_MIRROR_OVERLAP", default=60)
+GITLAB_MIRROR_COMMIT_WINDOW = environment.int(
+    "GITLAB_MIRROR_COMMIT_WINDOW", default=86400
+)
+GITLAB_LIVE_TAIL = environment.bool("GITLAB_LIVE_TAIL", default=True)
+GITLAB_LIVE_TAIL_OVERLAP = environment.int("GITLAB_LIVE_TAIL_OVERLAP", default=60)
 GRAFANA_URL = environment("GRAFANA_URL", default="")
 GRAFANA_ACCESS_TOKEN = environment("GRAFANA_ACCESS_TOKEN", default="")
-GITLAB_SECRET_TOKEN = str(uuid.uuid4())
+GRAFANA_CONNECTIONS = environment.int("GRAFANA_CONNECTIONS", default=4)
+GRAFANA_CONNECT_TIMEOUT = environment.float("GRAFANA_CONNECT_TIMEOUT", default=5)
+GRAFANA_READ_TIMEOUT = environment.float("GRAFANA_READ_TIMEOUT", default=30)
+# Shared by every worker and node, so that each of them accepts the hooks that any of them configured.
+# Left empty (and every hook refused) when there is no secret to derive it from, see api/startup.py.
+GITLAB_SECRET_TOKEN = environment.str("GITLAB_SECRET_TOKEN", default="") or (
+    hmac.new(SECRET_KEY.encode("utf-8"), b"gitlab-hooks", "sha256").hexdigest()
+    if SECRET_KEY != INSECURE_SECRET_KEY
+    else ""
+)
+
+STARTUP_BACKGROUND = environment.bool("STARTUP_BACKGROUND", default=True)
+HOOKS_CONFIGURE_LEASE = environment.int("HOOKS_CONFIGURE_LEASE", default=300)
+HOOKS_GRAFANA_ANNOTATIONS = environment.bool("HOOKS_GRAFANA_ANNOTATIONS", default=True)
+ANNOTATIONS_LIMIT = environment.int("ANNOTATIONS_LIMIT", default=1000)
+HOOKS_WORKERS = environment.int("HOOKS_WORKERS", default=2)
+HOOKS_BATCH_SIZE = environment.int("HOOKS_BATCH_SIZE", default=20)
+HOOKS_RETRIES = environment.int("HOOKS_RETRIES", default=5)
+HOOKS_BACKOFF = environment.int("HOOKS_BACKOFF", default=2)
+HOOKS_RETENTION = environment.int("HOOKS_RETENTION", default=86400)
+HOOKS_ANNOTATION_RETENTION = environment.int(
+    "HOOKS_ANNOTATION_RETENTION", default=604800
+)